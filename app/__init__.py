@@ -1,19 +1,37 @@
 import importlib #For plugin import
 import pkgutil # for plugin import
-import os, sys
+import asyncio
+import os, re, sys, time
+from contextlib import nullcontext
 
 import logging as log, logging.config 
 
 from dotenv import load_dotenv
 
 from app.Colorizer import Colorizer
-from commands import CommandHandler, Command
+from app.session import Session
+from commands import CommandHandler, Command, set_interactive, use_renderer
 import numpy as np
 import pandas as pd
 import data_store
+from plugins.history.storage import (Autosaver, BinaryHistory, ChunkedCSV, SQLiteHistory, Tombstones,
+                                     compact_rows, file_lock)
+from plugins.calc.calculator import Calculator, Calculations, ENGINES, get_scale, set_scale
+from plugins.calc.calculator.fixed import DEFAULT_SCALE
 
 import readline
 
+SESSION_NAME = re.compile(r'[A-Za-z0-9_-]+$')
+
+class ErrorCounter(logging.Handler):
+    # Counts error records while a script runs: commands report failures only through log.error
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
 class App: 
     def __init__(self):
         #Env Vars 
@@ -98,9 +116,15 @@ class App:
             except TypeError:
                 continue  # Ignore if not class
 
-    def manage_history(self):
+    def manage_history(self, session_name=None):
         #get name of file from env
-        hist_file_name = self.env_settings.get('HIST_FILE_NAME', 'calc_history.csv')
+        hist_file_format = self.env_settings.get('HIST_FILE_FORMAT', 'CSV').lower()
+        default_file_name = {'binary': 'calc_history.bin', 'sqlite': 'calc_history.db'}.get(hist_file_format, 'calc_history.csv')
+        hist_file_name = self.env_settings.get('HIST_FILE_NAME', default_file_name)
+        if session_name is not None:
+            # each session has its own file next to the app's: calc_history-<session>.csv
+            root, extension = os.path.splitext(hist_file_name)
+            hist_file_name = f"{root}-{session_name}{extension}"
         path_rel_hist_folder = self.env_settings.get('HIST_FILE_PATH', '/')
         path_abs_hist_folder = os.path.abspath(path_rel_hist_folder)
         path_abs_hist_file = os.path.join(path_abs_hist_folder, hist_file_name)
@@ -109,37 +133,145 @@ class App:
         
         # history file needs to be created and/or retrieved from storage
         columns = ['num1', 'operand', 'num2', 'result']
-        if os.path.exists(path_abs_hist_file):
-            try:
-                myDF = pd.read_csv(path_abs_hist_file)
-    
-                # Check if file has no columns
-                if myDF.columns.empty:
-                    raise pd.errors.EmptyDataError
-    
-                log.info("Loaded existing history file")
-            except pd.errors.EmptyDataError:
-                log.error("History File: The file exists but is empty, initializing with columns")
-                myDF = pd.DataFrame(columns=columns)
-                myDF.to_csv(path_abs_hist_file, index=False)
-                log.info("History File: Columns added and saved to " + path_abs_hist_file)
-        else:
+        data_store.hist_tombstones = Tombstones()
+
+        # Shared mode: several apps use the same file, so it is only ever appended to (never rewritten
+        # whole) and only touched while holding <history file>.lock
+        shared = self.env_settings.get('HIST_SHARED', 'OFF').upper() in ['ON', 'TRUE', '1']
+        with file_lock(path_abs_hist_file + '.lock') if shared else nullcontext():
+            return self.open_cold_history(self.open_engine(hist_file_format, path_abs_hist_file), columns, shared)
+
+    def open_engine(self, hist_file_format, path_abs_hist_file):
+        # Storage engine for the history file, see plugins.history.storage.engine
+        if hist_file_format == 'binary':
+            return BinaryHistory(path_abs_hist_file)
+        if hist_file_format == 'sqlite':
+            return SQLiteHistory(path_abs_hist_file)
+
+        # csv: every row resident unless HIST_RESIDENT_ROWS streams it, keeping only the most recent ones
+        if not os.path.exists(path_abs_hist_file):
             log.error("History File: Could not locate pre-existing file, making new file")
-            myDF = pd.DataFrame(columns=columns)
-            myDF.to_csv(path_abs_hist_file, index=False)
-            log.info("History File: New history file created at " + path_abs_hist_file)
-            
-        
-        return myDF            
+        resident_rows = self.env_settings.get('HIST_RESIDENT_ROWS')
+        chunksize = int(self.env_settings.get('HIST_LOAD_CHUNKSIZE', 100000))
+        return ChunkedCSV(path_abs_hist_file, int(resident_rows) if resident_rows else None, chunksize)
 
-    def start(self): 
+    def open_cold_history(self, history_file, columns, shared=False):
+        # csv, binary (memory-mapped) or sqlite history: rows are read through the engine, see storage.table
+        data_store.hist_cold = history_file
+        history_file.shared = shared
+        history_file.fsync = self.env_settings.get('HIST_FSYNC', 'OFF').upper() in ['ON', 'TRUE', '1']
+        if shared:
+            log.info("History File: Shared mode, appends from other processes are picked up as they happen")
+        # the file is append-only, deletes are kept in a sidecar until compaction rewrites it
+        data_store.hist_tombstones = Tombstones(history_file.path + '.deleted')
+        log.info(f"History File: Opened {type(history_file).__name__} history file with {len(history_file)} rows"
+                 f" ({len(data_store.hist_tombstones)} deleted)")
+
+        # resident table only holds rows that are not in the file yet
+        return pd.DataFrame(columns=columns)
+
+    def setup_autosave(self):
+        # Write-behind autosave policy for the history file, read from env
+        policy = self.env_settings.get('HIST_AUTOSAVE', 'SYNC').lower()
+        fsync = self.env_settings.get('HIST_FSYNC', 'OFF').upper() in ['ON', 'TRUE', '1']
+        if policy == 'sync' and not fsync:
+            return  # mutations keep saving inline, each appends its rows
+
+        try:
+            data_store.autosaver = Autosaver(
+                policy=policy,
+                every_ops=int(self.env_settings.get('HIST_AUTOSAVE_OPS', 100)),
+                every_ms=int(self.env_settings.get('HIST_AUTOSAVE_MS', 1000)),
+                fsync=fsync)
+            log.info(f"History File: Autosave policy '{policy}' (fsync={fsync})")
+        except ValueError as e:
+            log.error(f"History File: {e}, falling back to inline saves")
+
+    def calculation_log(self):
+        # In-memory calculation log: every calculation, or only the CALC_HISTORY_SIZE most recent when set;
+        # older ones are then dropped or, with CALC_HISTORY_EVICT=spill, written to the history file
+        capacity = int(self.env_settings.get('CALC_HISTORY_SIZE', 0))
+        eviction = self.env_settings.get('CALC_HISTORY_EVICT', 'DROP').lower()
+        spill = None
+        if eviction == 'spill':
+            from plugins.history import HistoryCommand
+            spill = HistoryCommand().add_calculations
+        return capacity or None, eviction, spill
+
+    def setup_calculations(self, calculations=Calculations):
+        capacity, eviction, spill = self.calculation_log()
+        try:
+            calculations.configure(capacity, eviction, spill)
+            log.info(f"Calculations: keeping {capacity or 'all'} calculations in memory, "
+                     f"evicted ones are {'spilled to the history file' if spill else 'dropped'}")
+        except ValueError as e:
+            log.error(f"Calculations: {e}, keeping the defaults")
+        if calculations is not Calculations:
+            return  # the rest are process-wide settings
+
+        # CALC_CACHE_SIZE > 0 caches that many recent operation results (off by default)
+        cache_size = int(self.env_settings.get('CALC_CACHE_SIZE', 0))
+        if cache_size > 0:
+            Calculator.enable_cache(cache_size)
+            log.info(f"Calculations: caching the {cache_size} most recently used results")
+
+        # CALC_ENGINE picks the batch engine calc file / calc expr use by default (decimal, float or
+        # fixed); CALC_FIXED_SCALE the decimals the fixed engine keeps
+        engine = self.env_settings.get('CALC_ENGINE', 'decimal').lower()
+        if engine in ENGINES:
+            Calculator.engine = engine
+        else:
+            log.error(f"Calculations: unknown CALC_ENGINE '{engine}', expected one of {ENGINES}")
+        try:
+            set_scale(int(self.env_settings.get('CALC_FIXED_SCALE', DEFAULT_SCALE)))
+        except ValueError as e:
+            log.error(f"Calculations: bad CALC_FIXED_SCALE ({e}), keeping {get_scale()}")
+
+    def close_history(self):
+        # Flushes the write-behind autosaver, then compacts deleted rows away so the file holds live rows only
+        if data_store.autosaver is not None:
+            data_store.autosaver.close()
+            data_store.autosaver = None
+        if len(data_store.hist_tombstones):
+            compact_rows()
+        data_store.hist_cold.close()
+
+    def open_session(self, name: str, renderer='silent') -> Session:
+        # A session with its own history file, set up like the app's (format, autosave, calculation
+        # log settings). Run its commands with command_handler.submit(session, line), see app.session
+        if not SESSION_NAME.match(name):
+            # the name becomes part of the file name, so nothing that could leave HIST_FILE_PATH
+            raise ValueError(f"Invalid session name '{name}', expected letters, digits, _ and -")
+        session = Session(name, renderer=renderer)
+        with session.activate():
+            data_store.hist_df = self.manage_history(name)
+            self.setup_autosave()
+            self.setup_calculations(session.calculations)
+        log.info(f"Session: '{name}' opened, history in {session.store.hist_path}")
+        return session
+
+    def close_session(self, session: Session):
+        # Saves and closes the session's history like close_history does for the app's
+        with session.activate():
+            self.close_history()
+        log.info(f"Session: '{session.name}' closed")
+
+    def setup(self):
+        # Plugins, history file and settings; everything a command needs before the first one runs
         self.fetch_plugins()
         log.info("All plugins loaded!")
 
-        #Start repl menu
         data_store.hist_df = self.manage_history()
+        data_store.hist_buffer.clear()
+        self.setup_autosave()
+        self.setup_calculations()
         log.info("History file ready!")
 
+    def start(self): 
+        self.setup()
+        set_interactive(True)  # only the REPL's commands may prompt for more input
+
+        #Start repl menu
         print()
         print("Welcome to the Calculator App")
         try: 
@@ -151,4 +283,72 @@ class App:
             log.error("App interrupted via keyboard. Exiting gracefully.")
             sys.exit(0)
         finally: 
-            log.info("App terminated gracefully")
\ No newline at end of file
+            set_interactive(False)
+            self.close_history()
+            log.info("App terminated gracefully")
+
+    def run_script(self, lines, fail_fast=False, quiet=False):
+        # Batch mode: runs each line of a script file or piped stdin as a command, without prompts.
+        # Blank lines and lines starting with # are skipped, 'exit' ends the script early.
+        # fail_fast stops at the first command that logs an error; quiet renders results silently (they
+        # are never formatted) and drops console logs below ERROR. Returns (commands, errors, seconds), the summary is printed to stderr
+        root_logger = logging.getLogger()
+        consoles = [handler for handler in root_logger.handlers
+                    if isinstance(handler, logging.StreamHandler) and getattr(handler, 'stream', None) is sys.stderr]
+        levels = [handler.level for handler in consoles]
+        if quiet:
+            for handler in consoles:
+                handler.setLevel(max(handler.level, logging.ERROR))
+        self.setup()
+        counter = ErrorCounter()
+        root_logger.addHandler(counter)
+        commands = errors = 0
+        start = time.perf_counter()
+        try:
+            with use_renderer('silent') if quiet else nullcontext():
+                for number, line in enumerate(lines, 1):
+                    command_input = line.strip()
+                    if not command_input or command_input.startswith('#'):
+                        continue
+                    commands += 1
+                    logged = counter.count
+                    try:
+                        self.command_handler.execute_command(command_input)
+                    except SystemExit:
+                        break  # the exit command
+                    except Exception as e:
+                        log.error(f"Error: '{command_input}' failed: {e}")
+                    if counter.count > logged:
+                        errors += 1
+                        if fail_fast:
+                            log.error(f"Error: stopping at line {number} ('{command_input}'), --fail-fast is on")
+                            break
+        except KeyboardInterrupt:
+            log.error("Script interrupted via keyboard, stopping.")
+        finally:
+            seconds = time.perf_counter() - start
+            root_logger.removeHandler(counter)
+            for handler, level in zip(consoles, levels):
+                handler.setLevel(level)
+            self.close_history()
+
+        summary = (f"Ran {commands} commands, {errors} errors in {seconds:.2f}s"
+                   f" ({commands / seconds if seconds else 0:.0f} commands/s)")
+        print(summary, file=sys.stderr)
+        log.info(summary)
+        return commands, errors, seconds
+
+    def serve(self, address):
+        # Server mode: serves the commands as JSON lines on a Unix socket path or a localhost TCP port,
+        # see app.server. Runs until interrupted; False when it could not start
+        from app.server import CommandServer
+        self.setup()
+        server = CommandServer(self.command_handler)
+        try:
+            return asyncio.run(server.serve_forever(address))
+        except KeyboardInterrupt:
+            log.info(f"Server: stopped after {server.requests} requests")
+            return True
+        finally:
+            server.close()
+            self.close_history()
@@ -0,0 +1,142 @@
+# Server mode: the registered commands served to many clients over a Unix socket or localhost TCP.
+# Requests and replies are JSON lines, one object per line:
+#   -> {"id": 1, "command": "calc", "args": ["add", "1", "2"]}     ("command": "calc add 1 2" works too)
+#   <- {"id": 1, "ok": true, "results": [{"kind": "calculation", "data": {"operation": "add", "a": "1", "b": "2",
+#       "result": "3"}}, ...], "output": [], "errors": [], "ms": 0.41}
+# results are the command's Result objects (commands.results), never formatted as text; output is
+# anything it printed directly, errors what it logged at ERROR (or the exception it raised).
+# asyncio reads every connection concurrently, but commands run one at a time on a single worker
+# thread, so history mutations (hist_df, the append buffer, the history file) never interleave.
+# Each connection gets its replies in the order of its requests.
+import asyncio
+import io
+import json
+import logging as log, logging
+import os
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+from app import ErrorCounter
+from commands import CommandHandler, use_renderer
+from commands.results import CollectingRenderer
+
+HOST = '127.0.0.1'  # TCP mode only listens on localhost
+
+
+class ErrorRecorder(ErrorCounter):
+    # ERROR records logged on the command thread, kept for the reply
+    def __init__(self):
+        super().__init__()
+        self.thread = None
+        self.messages = []
+
+    def emit(self, record):
+        if record.thread == self.thread:
+            self.count += 1
+            self.messages.append(record.getMessage())
+
+
+def parse_address(address: str):
+    """'8765' -> (HOST, 8765) for TCP, anything else is a Unix socket path"""
+    address = str(address)
+    return (HOST, int(address)) if address.isdigit() else address
+
+
+def is_socket(path: str) -> bool:
+    return stat.S_ISSOCK(os.stat(path).st_mode)
+
+
+class CommandServer:
+    def __init__(self, command_handler: CommandHandler):
+        self.command_handler = command_handler
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='command')
+        self.recorder = ErrorRecorder()
+        self.requests = 0
+
+    async def start(self, address):
+        """Starts listening on address (see parse_address) and returns the asyncio server, None if it cannot"""
+        address = parse_address(address)
+        if not isinstance(address, tuple) and os.path.exists(address):
+            if not is_socket(address):
+                log.error(f"Error: {address} exists and is not a socket, not serving on it")
+                return None
+            os.unlink(address)  # stale socket from a server that did not shut down
+        logging.getLogger().addHandler(self.recorder)
+        if isinstance(address, tuple):
+            return await asyncio.start_server(self.handle_client, *address)
+        return await asyncio.start_unix_server(self.handle_client, address)
+
+    async def serve_forever(self, address) -> bool:
+        """Serves until cancelled; False when the server could not start"""
+        server = await self.start(address)
+        if server is None:
+            return False
+        listening = ', '.join(str(socket.getsockname()) for socket in server.sockets)
+        print(f"Serving commands on {listening}, Ctrl+C to stop")
+        log.info(f"Server: listening on {listening}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            address = parse_address(address)
+            if not isinstance(address, tuple) and os.path.exists(address) and is_socket(address):
+                os.unlink(address)
+        return True
+
+    async def handle_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while line := await reader.readline():
+                reply = await loop.run_in_executor(self.executor, self.handle_line, line)
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+            log.error(f"Error: Server connection dropped: {e}")
+        finally:
+            writer.close()
+
+    def handle_line(self, line: bytes) -> dict:
+        """Runs one request line on the command thread and returns its reply"""
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            command_line = request['command']
+            if not isinstance(command_line, str):
+                raise ValueError("'command' must be a string")
+            args = request.get('args', [])
+            if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+                raise ValueError("'args' must be a list of strings")
+            command_line = ' '.join([command_line] + args)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            message = f"missing {e}" if isinstance(e, KeyError) else str(e)
+            return {'id': request_id, 'ok': False, 'results': [], 'output': [], 'errors': [f"Invalid request: {message}"],
+                    'ms': 0.0}
+        return {'id': request_id, **self.run_command(command_line)}
+
+    def run_command(self, command_line: str) -> dict:
+        start = time.perf_counter()
+        self.requests += 1
+        self.recorder.thread = threading.get_ident()
+        self.recorder.messages = []
+        output = io.StringIO()
+        collector = CollectingRenderer()
+        try:
+            with redirect_stdout(output), use_renderer(collector):
+                self.command_handler.execute_command(command_line)
+        except SystemExit:
+            log.error(f"Error: '{command_line.split()[0]}' ends the app, stop the server instead")
+        except Exception as e:
+            log.error(f"Error: '{command_line}' failed: {e}")
+        errors = self.recorder.messages
+        self.recorder.thread = None
+        return {'ok': not errors, 'results': [result.to_dict() for result in collector.results],
+                'output': output.getvalue().splitlines(), 'errors': errors,
+                'ms': round((time.perf_counter() - start) * 1e3, 3)}
+
+    def close(self):
+        logging.getLogger().removeHandler(self.recorder)
+        self.executor.shutdown()
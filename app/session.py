@@ -0,0 +1,36 @@
+# Sessions: independent users of one process. A Session owns a history store (data_store.HistoryStore),
+# a calculation log (Calculations.new_log) and a set of cells (Cells.new_sheet). Inside
+# session.activate() the usual data_store.<name>, calculator and calc set / let code works on the
+# session's own state, on whatever thread it runs; outside it they work on the process-wide defaults
+# the REPL uses. CommandHandler.submit(session, line) runs commands of many sessions on a thread pool.
+# App.open_session gives a session its own history file and the app's history and calculation settings.
+import contextlib
+
+import pandas as pd
+
+from commands import use_renderer
+from commands.results import make_renderer
+from data_store import HistoryStore, use_store
+from plugins.calc.calculator import Calculations, use_log
+from plugins.calc.calculator.cells import Cells, use_sheet
+from plugins.history.storage import COLUMNS, ChunkedCSV
+
+
+class Session:
+    def __init__(self, name: str, hist_path: str = "", renderer='silent'):
+        self.name = name
+        self.store = HistoryStore(hist_path, pd.DataFrame(columns=COLUMNS))
+        if hist_path:
+            self.store.hist_cold = ChunkedCSV(hist_path)  # App.open_session opens the configured format instead
+        self.calculations = Calculations.new_log()
+        self.cells = Cells.new_sheet()
+        self.renderer = make_renderer(renderer)  # commands return their Result either way
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Commands inside the with block read and write this session's state only"""
+        with use_store(self.store), use_log(self.calculations), use_sheet(self.cells), use_renderer(self.renderer):
+            yield self
+
+    def __repr__(self):
+        return f"Session({self.name!r})"
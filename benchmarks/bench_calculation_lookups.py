@@ -0,0 +1,57 @@
+# Benchmarks Calculations lookups through the secondary indexes against scanning the whole history,
+# at growing history sizes (the history is made unbounded for this)
+# usage:  python -m benchmarks.bench_calculation_lookups [max entries]
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from plugins.calc.calculator import Calculations
+from plugins.calc.calculator.operations import add, subtract, multiply, divide
+
+
+def time_it(function, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def scan_by_operation(name):
+    # what find_by_operation used to do
+    return [calc for calc in Calculations.history if calc.operation.__name__ == name]
+
+
+def main(max_entries):
+    rng = np.random.default_rng(0)
+    Calculations.configure(None)
+    Calculations.clear_history()
+    sizes = []
+    size = 10_000
+    while size <= max_entries:
+        sizes.append(size)
+        size *= 10
+    for size in sizes:
+        missing = size - len(Calculations.history)
+        for operation in (add, subtract, multiply, divide):
+            a_values = [Decimal(int(value)) for value in rng.integers(0, 100_000, missing // 4)]
+            b_values = [Decimal(int(value)) for value in rng.integers(1, 100_000, missing // 4)]
+            Calculations.add_many(a_values, b_values, operation)
+        merge = time_it(lambda: Calculations.find_by_result(0, 0), repeat=1)  # first result query sorts
+
+        results = {
+            'scan for one operation': time_it(lambda: scan_by_operation('divide'), repeat=3),
+            'find_by_operation': time_it(lambda: Calculations.find_by_operation('divide'), repeat=3),
+            'find_by_operand': time_it(lambda: Calculations.find_by_operand('4242')),
+            'get_latest(divide, 10)': time_it(lambda: Calculations.get_latest('divide', 10)),
+            'find_by_result(100..110)': time_it(lambda: Calculations.find_by_result(100, 110)),
+        }
+        print(f"{len(Calculations.history)} calculations (result index built in {merge * 1e3:.0f} ms)")
+        for name, seconds in results.items():
+            print(f"{name:>26} {seconds * 1e6:>12.1f} us")
+    Calculations.configure()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,40 @@
+# Benchmarks changing one input cell as the number of cells grows: the recalculation only walks the
+# changed cell's descendants, so the time per change should stay flat
+# usage:  python -m benchmarks.bench_cells [max cells]
+import sys
+import time
+
+from plugins.calc.calculator import Calculations
+from plugins.calc.calculator.cells import Cells
+
+CHAIN = 10  # formula cells below each input
+
+
+def build(inputs):
+    Cells.clear()
+    for index in range(inputs):
+        Cells.set(f'x{index}', index)
+        Cells.let(f'c{index}_0', f'x{index} * 2')
+        for step in range(1, CHAIN):
+            Cells.let(f'c{index}_{step}', f'c{index}_{step - 1} + x{index}')
+
+
+def main(max_cells):
+    cells = 1_000
+    while cells <= max_cells:
+        inputs = cells // (CHAIN + 1)
+        build(inputs)
+        Calculations.clear_history()
+        changes = 1_000
+        start = time.perf_counter()
+        for change in range(changes):
+            Cells.set(f'x{change % inputs}', inputs + change)  # never the value it holds
+        seconds = time.perf_counter() - start
+        print(f"{len(Cells.values):>8} cells: {seconds / changes * 1e6:>8.1f} us per change "
+              f"({CHAIN} formulas recomputed each)")
+        cells *= 10
+    Cells.clear()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,53 @@
+# Benchmarks the per-command cost of CommandHandler.execute_command: the same command lines run
+# over and over with output silenced and history kept in memory (saved only on exit), so what is
+# left is dispatch, argument parsing and the command itself. Best of REPEATS rounds, the box is noisy
+# usage:  python -m benchmarks.bench_dispatch [runs]
+import logging
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import data_store
+from commands import CommandHandler, use_renderer
+from plugins.calc import CalcCommand
+from plugins.calc.calculator import Calculations
+from plugins.hello import HelloCommand
+from plugins.history import HistoryCommand
+from plugins.history.storage import Autosaver, ChunkedCSV, COLUMNS
+
+LINES = ['hello', 'history head 0', 'history show 0 0', 'history delete x', 'calc set x 5', 'calc add 1 2',
+         'calc bogus 1']
+REPEATS = 5
+
+
+def main(runs):
+    logging.disable(logging.CRITICAL)
+    handler = CommandHandler()
+    handler.register_command('hello', HelloCommand())
+    handler.register_command('calc', CalcCommand())
+    handler.register_command('history', HistoryCommand())
+
+    with tempfile.TemporaryDirectory() as folder, use_renderer('silent'):
+        data_store.hist_path = f"{folder}/calc_history.csv"
+        data_store.hist_cold = ChunkedCSV(data_store.hist_path)
+        data_store.autosaver = Autosaver(policy='exit', flush=lambda fsync=False: None)
+        print(f"{'command':>18} {'us/command':>11}")
+        for line in LINES:
+            best = float('inf')
+            for _ in range(REPEATS):
+                data_store.hist_df = pd.DataFrame(columns=COLUMNS)
+                data_store.hist_buffer.clear()
+                Calculations.clear_history()
+                start = time.perf_counter()
+                for _ in range(runs):
+                    handler.execute_command(line)
+                best = min(best, time.perf_counter() - start)
+            print(f"{line:>18} {best / runs * 1e6:>11.2f}")
+        data_store.autosaver = None
+        data_store.hist_cold = None
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
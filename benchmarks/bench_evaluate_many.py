@@ -0,0 +1,48 @@
+# Benchmarks Calculator.evaluate_many engines against calling Calculator.divide once per pair
+# usage:  python -m benchmarks.bench_evaluate_many [pairs]
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from plugins.calc.calculator import Calculator, Calculations
+
+
+def time_it(function):
+    Calculations.clear_history()
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def scalar_path(a_values, b_values):
+    for a, b in zip(a_values, b_values):
+        try:
+            Calculator.divide(a, b)
+        except ValueError:
+            pass
+
+
+def main(pairs):
+    rng = np.random.default_rng(0)
+    a_ints = rng.integers(-1000, 1000, pairs)
+    b_ints = rng.integers(0, 100, pairs)  # about 1% divide by zero
+    a_values = [Decimal(int(value)) for value in a_ints]
+    b_values = [Decimal(int(value)) for value in b_ints]
+
+    results = {
+        'scalar Calculator.divide': time_it(lambda: scalar_path(a_values, b_values)),
+        'evaluate_many decimal': time_it(lambda: Calculator.evaluate_many('divide', a_values, b_values)),
+        'evaluate_many float': time_it(lambda: Calculator.evaluate_many('divide', a_ints, b_ints, engine='float')),
+        'decimal, no history': time_it(lambda: Calculator.evaluate_many('divide', a_values, b_values, record=False)),
+        'float, no history': time_it(
+            lambda: Calculator.evaluate_many('divide', a_ints, b_ints, engine='float', record=False)),
+    }
+    print(f"{pairs} divides")
+    for name, seconds in results.items():
+        print(f"{name:>26} {seconds * 1e3:>10.1f} ms {pairs / seconds / 1e6:>8.2f} M pairs/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,47 @@
+# Benchmarks evaluating one formula over many inputs: parsing it every time, reusing the cached
+# compiled expression, and evaluating it over all inputs in one batch
+# usage:  python -m benchmarks.bench_expression [inputs]
+import sys
+import time
+from decimal import Decimal
+
+from plugins.calc.calculator import Calculations
+from plugins.calc.calculator.expression import compile_expression
+
+SOURCE = '(a + 2) * sqrt(b) / (a - b)'
+
+
+def time_it(function):
+    Calculations.clear_history()
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def parse_every_time(a_values, b_values):
+    for a, b in zip(a_values, b_values):
+        compile_expression.cache_clear()
+        compile_expression(SOURCE).evaluate(a=a, b=b)
+
+
+def cached(a_values, b_values):
+    for a, b in zip(a_values, b_values):
+        compile_expression(SOURCE).evaluate(a=a, b=b)
+
+
+def main(inputs):
+    a_values = [Decimal(value) for value in range(inputs)]
+    b_values = [Decimal(value) for value in range(inputs, 2 * inputs)]
+
+    results = {
+        'parse every time': time_it(lambda: parse_every_time(a_values, b_values)),
+        'cached compile': time_it(lambda: cached(a_values, b_values)),
+        'evaluate_many decimal': time_it(lambda: compile_expression(SOURCE).evaluate_many({'a': a_values, 'b': b_values})),
+    }
+    print(f"{SOURCE} over {inputs} inputs")
+    for name, seconds in results.items():
+        print(f"{name:>22} {seconds * 1e3:>10.1f} ms {seconds / inputs * 1e6:>8.2f} us/input")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
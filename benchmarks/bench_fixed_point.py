@@ -0,0 +1,39 @@
+# Benchmarks the fixed-point engine against the decimal (and float) engines of Calculator.evaluate_many,
+# from csv-style string operands and from integer arrays. 'fixed+display' includes converting the
+# results back to Decimal with as_decimal(), which the fixed engine leaves until display/history
+# usage:  python -m benchmarks.bench_fixed_point [pairs]
+import sys
+import time
+
+import numpy as np
+
+from plugins.calc.calculator import Calculator
+
+
+def time_it(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main(pairs):
+    rng = np.random.default_rng(0)
+    a_ints = rng.integers(-1_000_000, 1_000_000, pairs)
+    b_ints = rng.integers(1, 1_000_000, pairs)
+    a_texts = [f'{value / 1000:.3f}' for value in a_ints.tolist()]
+    b_texts = [f'{value / 1000:.3f}' for value in b_ints.tolist()]
+
+    print(f"{pairs} pairs, fixed scale 6")
+    for name in ('add', 'multiply', 'divide'):
+        for label, a_values, b_values in (('str', a_texts, b_texts), ('int', a_ints, b_ints)):
+            times = {engine: time_it(lambda engine=engine: Calculator.evaluate_many(name, a_values, b_values, engine,
+                                                                                    record=False))
+                     for engine in ('decimal', 'fixed', 'float')}
+            times['fixed+display'] = time_it(lambda: Calculator.evaluate_many(name, a_values, b_values, 'fixed',
+                                                                              record=False).as_decimal())
+            print(f"{name:>9} {label}: " + "  ".join(f"{engine} {seconds * 1e3:8.1f} ms" for engine, seconds in times.items())
+                  + f"  fixed/decimal {times['fixed'] / times['decimal']:.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
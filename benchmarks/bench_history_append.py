@@ -0,0 +1,47 @@
+# Benchmarks history appends: hist_df.loc[len(hist_df)] = row versus the columnar HistoryBuffer
+# usage:  python -m benchmarks.bench_history_append [max_rows]
+import sys
+import time
+
+import pandas as pd
+
+from plugins.history.storage import HistoryBuffer, COLUMNS
+
+ROW = {'num1': '5', 'operand': '*', 'num2': '4', 'result': '20'}
+BATCH = 1000  # appends timed at every checkpoint
+
+
+def time_loc_appends(df, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        df.loc[len(df)] = ROW
+    return time.perf_counter() - start
+
+
+def time_buffer_appends(buffer, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        buffer.append(ROW)
+    return time.perf_counter() - start
+
+
+def main(max_rows):
+    print(f"{'rows':>10} {'loc us/append':>15} {'buffer us/append':>18}")
+    checkpoints = [10 ** exponent for exponent in range(3, 8) if 10 ** exponent <= max_rows]
+
+    df = pd.DataFrame(columns=COLUMNS)
+    buffer = HistoryBuffer()
+    for rows in checkpoints:
+        # grow both stores to the checkpoint size, then time one batch of appends
+        df_fill = pd.DataFrame([ROW] * (rows - len(df)), columns=COLUMNS)
+        df = pd.concat([df, df_fill], ignore_index=True) if len(df) else df_fill
+        for _ in range(rows - len(buffer)):
+            buffer.append(ROW)
+
+        loc_time = time_loc_appends(df.copy(), BATCH)
+        buffer_time = time_buffer_appends(buffer, BATCH)
+        print(f"{rows:>10} {loc_time / BATCH * 1e6:>15.1f} {buffer_time / BATCH * 1e6:>18.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
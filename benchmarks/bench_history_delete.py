@@ -0,0 +1,51 @@
+# Benchmarks history deletes: drop + reset_index versus tombstones, then one compaction
+# usage:  python -m benchmarks.bench_history_delete [rows] [deletes]
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import data_store
+from plugins.history.storage import ChunkedCSV, Tombstones, COLUMNS, delete_row, compact_rows
+
+
+def make_table(rows):
+    values = [str(i) for i in range(rows)]
+    return pd.DataFrame({'num1': values, 'operand': ['+'] * rows, 'num2': values, 'result': values}, columns=COLUMNS)
+
+
+def main(rows, deletes):
+    # the original delete: drop the row and renumber everything after it
+    df = make_table(rows)
+    start = time.perf_counter()
+    for _ in range(deletes):
+        df.drop(index=0, inplace=True)
+        df.reset_index(drop=True, inplace=True)
+    drop_time = time.perf_counter() - start
+
+    # the table not saved yet, on top of an empty csv
+    with tempfile.TemporaryDirectory() as folder:
+        data_store.hist_cold = ChunkedCSV(os.path.join(folder, 'calc_history.csv'))
+        data_store.hist_df = make_table(rows)
+        data_store.hist_tombstones = Tombstones()
+        start = time.perf_counter()
+        for row in range(deletes):
+            delete_row(row)
+        tombstone_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        compact_rows()
+        compact_time = time.perf_counter() - start
+        data_store.hist_cold = None
+
+    print(f"{rows} rows, {deletes} deletes")
+    print(f"  drop + reset_index  {drop_time / deletes * 1e6:>10.1f} us/delete")
+    print(f"  tombstone           {tombstone_time / deletes * 1e6:>10.1f} us/delete")
+    print(f"  one compaction      {compact_time * 1e3:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
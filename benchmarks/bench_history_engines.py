@@ -0,0 +1,64 @@
+# Benchmarks the history storage engines on a table of N rows:
+# saving one new row, and looking up one row in the middle of the table
+# usage:  python -m benchmarks.bench_history_engines [rows]
+import os
+import sys
+import time
+import tempfile
+
+import pandas as pd
+
+from plugins.history.storage import BinaryHistory, ChunkedCSV, SQLiteHistory, COLUMNS, write_snapshot
+
+ROW = pd.DataFrame([{'num1': '5', 'operand': '*', 'num2': '4', 'result': '20'}], columns=COLUMNS)
+REPEAT = 20
+
+
+def make_table(rows):
+    values = [str(i) for i in range(rows)]
+    return pd.DataFrame({'num1': values, 'operand': ['+'] * rows, 'num2': values, 'result': values}, columns=COLUMNS)
+
+
+def per_call(function):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        function()
+    return (time.perf_counter() - start) / REPEAT
+
+
+def bench_rewrite(folder, table):
+    # the original model: the whole table is resident and every save rewrites the csv, kept for comparison
+    path = os.path.join(folder, 'full.csv')
+    middle = len(table) // 2
+    save = per_call(lambda: write_snapshot(pd.concat([table, ROW], ignore_index=True), path))
+    lookup = per_call(lambda: table.iloc[middle:middle + 1])
+    return save, lookup
+
+
+def bench_engine(engine, table):
+    engine.append_frame(table)
+    middle = len(table) // 2
+    save = per_call(lambda: engine.append_frame(ROW))
+    lookup = per_call(lambda: engine.rows(middle, middle + 1))
+    engine.close()
+    return save, lookup
+
+
+def main(rows):
+    table = make_table(rows)
+    with tempfile.TemporaryDirectory() as folder:
+        results = {
+            'csv rewrite': bench_rewrite(folder, table),
+            'csv': bench_engine(ChunkedCSV(os.path.join(folder, 'history.csv')), table),
+            'csv stream': bench_engine(ChunkedCSV(os.path.join(folder, 'stream.csv'), window=100_000), table),
+            'binary': bench_engine(BinaryHistory(os.path.join(folder, 'history.bin')), table),
+            'sqlite': bench_engine(SQLiteHistory(os.path.join(folder, 'history.db')), table),
+        }
+    print(f"{rows} rows")
+    print(f"{'engine':>12} {'save ms/row':>12} {'lookup ms':>10}")
+    for name, (save, lookup) in results.items():
+        print(f"{name:>12} {save * 1e3:>12.3f} {lookup * 1e3:>10.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,44 @@
+# Benchmarks high-precision Decimal divides with the serial decimal engine versus the process pool
+# at 1, 2, 4, ... workers up to the machine's core count
+# usage:  python -m benchmarks.bench_parallel_decimal [pairs] [precision]
+import os
+import sys
+import time
+import decimal
+from decimal import Decimal
+
+import numpy as np
+
+from plugins.calc.calculator import Calculator
+
+
+def time_it(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main(pairs, precision):
+    rng = np.random.default_rng(0)
+    a_values = [Decimal(int(value)) for value in rng.integers(1, 10**6, pairs)]
+    b_values = [Decimal(int(value)) for value in rng.integers(1, 10**6, pairs)]
+    cores = os.cpu_count()
+
+    with decimal.localcontext(prec=precision):
+        serial = time_it(lambda: Calculator.evaluate_many('divide', a_values, b_values, record=False))
+        print(f"{pairs} divides at {precision} digits, {cores} cores")
+        print(f"{'serial':>12} {serial * 1e3:>10.1f} ms")
+        workers = 1
+        while True:
+            with Calculator.make_pool(workers) as pool:
+                Calculator.evaluate_many('add', ['1'] * workers, ['1'] * workers, record=False, pool=pool)  # start workers
+                seconds = time_it(lambda: Calculator.evaluate_many('divide', a_values, b_values, record=False, pool=pool))
+            print(f"{workers:>4} workers {seconds * 1e3:>10.1f} ms {serial / seconds:>6.2f}x")
+            if workers >= cores:
+                break
+            workers = min(workers * 2, cores)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 100)
@@ -0,0 +1,88 @@
+# Benchmarks CommandHandler.submit: 1, 2, 4 ... sessions each running the same number of calc and
+# history commands on the handler's thread pool (one worker per session), against the same commands
+# run one after another on the main thread. With autosave=sync every calc appends to the session's
+# history file, so threads can overlap on the disk writes; with exit it is all Python and the GIL.
+# Afterwards every session's history and calculation log is checked to hold its own rows only.
+# Best of REPEATS rounds, the box is noisy
+# usage:  python -m benchmarks.bench_sessions [commands per session] [max sessions] [sync|exit]
+import logging
+import sys
+import tempfile
+import time
+
+from app.session import Session
+from commands import CommandHandler
+from plugins.calc import CalcCommand
+from plugins.history import HistoryCommand
+from plugins.history.storage import Autosaver, full_frame
+
+REPEATS = 3
+
+
+def session_lines(number, commands):
+    # mostly calculations, a history read every 4th command; session number is num1 of all its rows
+    return [f'history head 1' if step % 4 == 3 else f'calc add {number} {step}' for step in range(commands)]
+
+
+def make_sessions(count, folder, autosave):
+    sessions = [Session(f's{number}', f"{folder}/calc_history-s{number}.csv") for number in range(count)]
+    for session in sessions:
+        if autosave == 'exit':
+            session.store.autosaver = Autosaver(policy='exit', flush=lambda fsync=False: None)
+    return sessions
+
+
+def check(sessions, commands):
+    # no row or calculation of one session may show up in another
+    for number, session in enumerate(sessions):
+        expected = [str(step) for step in range(commands) if step % 4 != 3]
+        with session.activate():
+            rows = full_frame()
+        if rows['num1'].tolist() != [str(number)] * len(expected) or rows['num2'].tolist() != expected \
+                or len(session.calculations.get_history()) != len(expected):
+            raise AssertionError(f"session {session.name} holds rows or calculations of another session")
+
+
+def run(count, commands, folder, autosave, threaded):
+    best = float('inf')
+    for _ in range(REPEATS):
+        sessions = make_sessions(count, tempfile.mkdtemp(dir=folder), autosave)  # new files every round
+        handler = CommandHandler(workers=count)
+        handler.register_command('calc', CalcCommand())
+        handler.register_command('history', HistoryCommand())
+        lines = [session_lines(number, commands) for number in range(count)]
+        start = time.perf_counter()
+        if threaded:
+            futures = [handler.submit(session, line) for session, session_commands in zip(sessions, lines)
+                       for line in session_commands]
+            for future in futures:
+                future.result()
+        else:
+            for session, session_commands in zip(sessions, lines):
+                with session.activate():
+                    for line in session_commands:
+                        handler.execute_command(line)
+        best = min(best, time.perf_counter() - start)
+        handler.shutdown()
+        check(sessions, commands)
+    return count * commands / best
+
+
+def main(commands, max_sessions, autosave):
+    logging.disable(logging.CRITICAL)
+    print(f"autosave={autosave}, {commands} commands per session")
+    print(f"{'sessions':>8} {'serial cmd/s':>13} {'pool cmd/s':>11} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as folder:
+        count = 1
+        while count <= max_sessions:
+            serial = run(count, commands, folder, autosave, threaded=False)
+            pooled = run(count, commands, folder, autosave, threaded=True)
+            print(f"{count:>8} {serial:>13.0f} {pooled:>11.0f} {pooled / serial:>7.2f}x")
+            count *= 2
+    print("no cross-session rows or calculations")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 400,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+         sys.argv[3] if len(sys.argv) > 3 else 'sync')
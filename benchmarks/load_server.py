@@ -0,0 +1,87 @@
+# Load test for server mode (main.py --serve): C concurrent clients each send R requests, one at a time,
+# and the per-request round trip is timed. Starts its own server on a temporary Unix socket (with a
+# temporary history file) unless an address of a running server is given.
+# usage:  python -m benchmarks.load_server [clients] [requests per client] [socket path|port] [command]
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.server import parse_address
+
+COMMAND = 'calc add {client} {request}'
+
+
+async def open_connection(address):
+    address = parse_address(address)
+    if isinstance(address, tuple):
+        return await asyncio.open_connection(*address)
+    return await asyncio.open_unix_connection(address)
+
+
+async def client(address, client_id, requests, command, latencies, failures):
+    reader, writer = await open_connection(address)
+    for request in range(requests):
+        line = json.dumps({'id': request, 'command': command.format(client=client_id, request=request)})
+        start = time.perf_counter()
+        writer.write(line.encode() + b'\n')
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        if not reply['ok']:
+            failures.append(reply['errors'])
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load(address, clients, requests, command):
+    latencies, failures = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(address, client_id, requests, command, latencies, failures)
+                           for client_id in range(clients)))
+    return time.perf_counter() - start, np.array(latencies), failures
+
+
+def start_server(folder):
+    # the app in server mode with its history in folder, saved only on exit, and quiet logs
+    path = os.path.join(folder, 'calc.sock')
+    env = dict(os.environ, HIST_FILE_PATH=folder, HIST_AUTOSAVE='exit', LOG_LEVEL='ERROR')
+    server = subprocess.Popen([sys.executable, 'main.py', '--serve', path], env=env, stdout=subprocess.DEVNULL)
+    while not os.path.exists(path):
+        if server.poll() is not None:
+            raise RuntimeError("Server exited before listening")
+        time.sleep(0.05)
+    return server, path
+
+
+def main(clients, requests, address=None, command=COMMAND):
+    with tempfile.TemporaryDirectory() as folder:
+        server = None
+        if address is None:
+            server, address = start_server(folder)
+        try:
+            elapsed, latencies, failures = asyncio.run(load(address, clients, requests, command))
+        finally:
+            if server is not None:
+                server.send_signal(signal.SIGINT)
+                server.wait()
+
+    total = clients * requests
+    print(f"{clients} clients x {requests} requests ('{command}') in {elapsed:.2f}s: {total / elapsed:.0f} requests/s")
+    print(f"  latency p50 {np.percentile(latencies, 50) * 1e3:.2f} ms, p99 {np.percentile(latencies, 99) * 1e3:.2f} ms, "
+          f"max {latencies.max() * 1e3:.2f} ms; {len(failures)} failed")
+    if failures:
+        print(f"  first failure: {failures[0]}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 1000,
+         sys.argv[3] if len(sys.argv) > 3 else None,
+         sys.argv[4] if len(sys.argv) > 4 else COMMAND)
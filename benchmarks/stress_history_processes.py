@@ -0,0 +1,71 @@
+# Stress test for a history file shared by several processes (HIST_SHARED=on):
+# N processes each run `calc add` M times against the same file, then every row is checked
+# usage:  python -m benchmarks.stress_history_processes [processes] [ops] [csv|binary|sqlite]
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import data_store
+from plugins.calc import CalcCommand
+from plugins.history.storage import (ChunkedCSV, BinaryHistory, SQLiteHistory, Tombstones, COLUMNS,
+                                     file_lock, full_frame)
+
+ENGINES = {'csv': ('calc_history.csv', ChunkedCSV), 'binary': ('calc_history.bin', BinaryHistory),
+           'sqlite': ('calc_history.db', SQLiteHistory)}
+
+
+def open_shared(folder, file_format):
+    # what App.manage_history does with HIST_SHARED=on
+    file_name, engine = ENGINES[file_format]
+    path = os.path.join(folder, file_name)
+    with file_lock(path + '.lock'):
+        data_store.hist_cold = engine(path)
+        data_store.hist_cold.shared = True
+        data_store.hist_tombstones = Tombstones(path + '.deleted')
+    data_store.hist_df = pd.DataFrame(columns=COLUMNS)
+    data_store.hist_buffer.clear()
+
+
+def worker(folder, file_format, worker_id, ops):
+    logging.disable(logging.CRITICAL)
+    open_shared(folder, file_format)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(ops):
+            CalcCommand().execute('add', str(worker_id), str(i))
+    data_store.hist_cold.close()
+
+
+def main(processes, ops, file_format):
+    with tempfile.TemporaryDirectory() as folder:
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=worker, args=(folder, file_format, worker_id, ops))
+                   for worker_id in range(processes)]
+        start = time.perf_counter()
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        open_shared(folder, file_format)
+        df = full_frame()
+        expected = {(str(worker_id), str(i)) for worker_id in range(processes) for i in range(ops)}
+        found = set(zip(df['num1'], df['num2']))
+        data_store.hist_cold.close()
+
+    print(f"{file_format}: {processes} processes x {ops} ops in {elapsed:.2f}s "
+          f"({processes * ops / elapsed:.0f} ops/s)")
+    print(f"  rows {len(df)} of {len(expected)}, missing {len(expected - found)}, duplicated {len(df) - len(found)}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 2000,
+         sys.argv[3] if len(sys.argv) > 3 else 'csv')
@@ -1,21 +1,68 @@
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 import logging
+import threading
+
+from commands.results import Result, emit, get_renderer, set_renderer, use_renderer, RENDERERS
+from commands.schema import Arg, ArgumentError, Subcommand, compile_schema, index, positive
+
+
+# Whether commands may prompt on stdin (history page). Only the REPL turns it on: batch scripts would
+# have their next lines read as answers, and in server mode or on the session pool the prompt would
+# block the worker thread every client waits on
+_interactive = False
+
+
+def set_interactive(interactive: bool):
+    global _interactive
+    _interactive = interactive
+
+
+def is_interactive() -> bool:
+    return _interactive
 
 
 class Command(ABC):
+    subcommands = None  # {name: Subcommand} for commands with subcommands, see commands.schema
+
     @abstractmethod
     def execute(self):
         pass
 
+    def dispatch(self, args, schema=None):
+        '''Runs args through the compiled subcommand table: typed arguments straight to the method'''
+        try:
+            method, values = (schema or compile_schema(type(self))).parse(list(args))
+        except ArgumentError as e:
+            logging.error(str(e))
+            return None
+        return self.call(method, values)
+
+    def call(self, method, values):
+        # hook for commands that wrap every subcommand (e.g. in a lock)
+        return method(self, *values)
+
 
 class CommandHandler:
-    def __init__(self):
+    def __init__(self, workers: int = 4):
         self.commands = {} # Stores Dictionary of commands that are registered
+        self.schemas = {} # compiled subcommand tables of the commands that declare one
+        # thread pool for submit(), started on first use; queues holds the commands of each session
+        # a worker is running, so one session's commands never run at the same time or out of order
+        self.workers = workers
+        self.pool = None
+        self.queues = {}
+        self.queues_lock = threading.Lock()
 
     def register_command(self, command_name: str, command: Command):
         ''' Any new Command_Name and Command-type command are passed in, 
         Register them into self.commands Dictonary such that key = command_name and command is the value'''
         self.commands[command_name] = command
+        self.schemas.pop(command_name, None)
+        schema = compile_schema(type(command))
+        if schema is not None:
+            self.schemas[command_name] = schema
         
     def execute_command(self, command_line):
         '''Executes command while safely handling parameters where needed'''
@@ -36,9 +83,59 @@ class CommandHandler:
             #get arguments if exists
             args = parts[1:]
 
-            # Execute command with args as potential parameter
-            result = command.execute(*args)
-            if result is not None: 
-                print(result)
+            # Execute command with args as potential parameter; Results were rendered as they were emitted
+            schema = self.schemas.get(command_name)
+            if schema is None:
+                result = command.execute(*args)
+            else:
+                # precompiled subcommand table: typed arguments straight to the method
+                try:
+                    method, values = schema.parse(args)
+                except ArgumentError as e:
+                    logging.error(str(e))
+                    return
+                result = command.call(method, values)
+            if result is not None and not isinstance(result, Result): 
+                result = emit('message', result)
+            return result
         else:
             logging.error(f"Command '{command_name}' not found.")
+
+    def submit(self, session, command_line) -> Future:
+        '''Runs command_line in session (anything with an activate() context, see app.session) on the thread pool.
+        Returns a Future of the command's Result; a session's commands run one at a time, in submission order'''
+        future = Future()
+        with self.queues_lock:
+            queue = self.queues.get(session)
+            if queue is not None:
+                # a worker is already running this session's commands, it picks this one up too
+                queue.append((command_line, future))
+                return future
+            self.queues[session] = deque([(command_line, future)])
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix='command')
+        self.pool.submit(self.run_session, session)
+        return future
+
+    def run_session(self, session):
+        # worker: runs the session's queued commands until there are none left
+        with session.activate():
+            while True:
+                with self.queues_lock:
+                    queue = self.queues[session]
+                    if not queue:
+                        del self.queues[session]
+                        return
+                    command_line, future = queue.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(self.execute_command(command_line))
+                except (Exception, SystemExit) as e:
+                    future.set_exception(e)
+
+    def shutdown(self):
+        '''Waits for the submitted commands and stops the thread pool'''
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,110 @@
+# Structured command output. Commands emit Result objects (a kind, plain data, and a function that
+# formats the data as text) instead of printing, and return them. The current renderer decides what
+# happens to each one: 'text' prints the human output, 'json' prints one JSON object per result,
+# 'silent' drops it, 'collect' keeps it in a list (server mode). Text is only formatted by the text
+# renderer, so silent and json runs never pay for it.
+# set_renderer changes the renderer for every thread; use_renderer(r) for a with block only.
+import contextlib
+import json
+from contextvars import ContextVar
+from decimal import Decimal
+
+import pandas as pd
+
+
+class Result:
+    __slots__ = ('kind', 'data', 'formatter')
+
+    def __init__(self, kind: str, data=None, formatter=None):
+        self.kind = kind
+        self.data = data
+        self.formatter = formatter  # data -> text; None prints str(data)
+
+    def text(self) -> str:
+        return self.formatter(self.data) if self.formatter is not None else str(self.data)
+
+    def to_dict(self) -> dict:
+        return {'kind': self.kind, 'data': jsonable(self.data)}
+
+    def __repr__(self):
+        return f"Result({self.kind!r}, {self.data!r})"
+
+
+def jsonable(data):
+    """data with frames, series and Decimals turned into JSON types"""
+    if isinstance(data, pd.DataFrame):
+        return [{'row': row, **values} for row, values in zip(data.index.tolist(), jsonable(data.to_dict('records')))]
+    if isinstance(data, pd.Series):
+        return jsonable(data.to_dict())
+    if isinstance(data, dict):
+        return {str(key): jsonable(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [jsonable(value) for value in data]
+    if isinstance(data, Decimal) or hasattr(data, 'item'):  # Decimal, numpy scalars
+        return str(data) if isinstance(data, Decimal) else data.item()
+    return data
+
+
+class TextRenderer:
+    def render(self, result: Result):
+        print(result.text())
+
+
+class JsonRenderer:
+    def render(self, result: Result):
+        print(json.dumps(result.to_dict(), default=str))
+
+
+class SilentRenderer:
+    def render(self, result: Result):
+        pass
+
+
+class CollectingRenderer:
+    def __init__(self):
+        self.results = []
+
+    def render(self, result: Result):
+        self.results.append(result)
+
+
+RENDERERS = {'text': TextRenderer, 'json': JsonRenderer, 'silent': SilentRenderer}
+
+_default_renderer = TextRenderer()  # every thread's renderer outside use_renderer blocks
+_renderer = ContextVar('renderer', default=None)
+
+
+def get_renderer():
+    renderer = _renderer.get()
+    return _default_renderer if renderer is None else renderer
+
+
+def set_renderer(renderer):
+    """Sets the renderer for every thread: a renderer object or a name from RENDERERS"""
+    global _default_renderer
+    _default_renderer = make_renderer(renderer)
+
+
+@contextlib.contextmanager
+def use_renderer(renderer):
+    """Renders with renderer (object or name) inside the with block only"""
+    token = _renderer.set(make_renderer(renderer))
+    try:
+        yield
+    finally:
+        _renderer.reset(token)
+
+
+def make_renderer(renderer):
+    if isinstance(renderer, str):
+        if renderer not in RENDERERS:
+            raise ValueError(f"Unknown output format '{renderer}', expected one of {list(RENDERERS)}")
+        return RENDERERS[renderer]()
+    return renderer
+
+
+def emit(kind: str, data=None, formatter=None) -> Result:
+    """Hands a result to the current renderer and returns it"""
+    result = Result(kind, data, formatter)
+    get_renderer().render(result)
+    return result
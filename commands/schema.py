@@ -0,0 +1,105 @@
+# Argument schemas for commands with subcommands. A command declares its subcommands once, as a class
+# attribute:
+#     subcommands = {'show': Subcommand('show', (Arg('start', index, optional=True), ...), usage="...")}
+# compile_schema turns that into a dispatch table the first time the class is seen (CommandHandler
+# does it at registration): for each subcommand the method to call, the argument count it takes and
+# one converter per argument (int, Decimal, index, ...). A command line then costs one dict lookup and
+# the conversions before the method runs with typed arguments. Missing optional arguments are left
+# to the method's own defaults. The '' subcommand handles no arguments; a fallback subcommand gets
+# the whole argument list, subcommand name included, for names it does not know.
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+
+class Arg(NamedTuple):
+    name: str
+    convert: Callable = str
+    optional: bool = False
+    rest: bool = False  # takes every remaining argument, as str (last Arg only)
+    error: str = None  # logged when convert fails, may use {value}; the subcommand's usage otherwise
+
+
+class Subcommand(NamedTuple):
+    method: str  # name of the command method that runs it
+    args: Tuple[Arg, ...] = ()
+    usage: str = ''  # logged when the argument count is wrong
+
+
+class ArgumentError(ValueError):
+    pass
+
+
+def index(value) -> int:
+    """Row numbers and counts: whole numbers from 0 up"""
+    number = int(value)
+    if number < 0:
+        raise ValueError(f"{value} is negative")
+    return number
+
+
+def positive(value) -> int:
+    """Sizes that must hold something: whole numbers from 1 up"""
+    number = int(value)
+    if number < 1:
+        raise ValueError(f"{value} is not positive")
+    return number
+
+
+class _Compiled(NamedTuple):
+    method: Callable
+    typed: Tuple[Tuple[int, Callable, str], ...]  # (position, converter, error) of the arguments that are not str
+    required: int
+    maximum: float  # inf when the last Arg takes the rest
+    usage: str
+
+
+class Schema:
+    def __init__(self, table: Dict[str, _Compiled], fallback: Optional[_Compiled]):
+        self.table = table
+        self.fallback = fallback
+
+    def parse(self, args: list) -> Tuple[Callable, list]:
+        """(unbound method, converted arguments) for an argument list, converted in place; raises ArgumentError"""
+        entry = self.table.get(args[0] if args else '')
+        if entry is None:
+            if self.fallback is None:
+                raise ArgumentError(f"Unknown subcommand: {args[0]}")
+            entry, values = self.fallback, args
+        else:
+            values = args[1:]
+        method, typed, required, maximum, usage = entry
+        count = len(values)
+        if not required <= count <= maximum:
+            raise ArgumentError(usage)
+        # str arguments are passed as they came; only the typed ones are converted
+        for position, convert, error in typed:
+            if position < count:
+                try:
+                    values[position] = convert(values[position])
+                except (ValueError, ArithmeticError):
+                    raise ArgumentError(error.format(value=values[position]) if error else usage) from None
+        return method, values
+
+
+_schemas: Dict[type, Schema] = {}
+
+
+def compile_schema(command_class) -> Optional[Schema]:
+    """The class's compiled subcommand table (None for commands without subcommands), built once"""
+    schema = _schemas.get(command_class)
+    if schema is None and getattr(command_class, 'subcommands', None):
+        subcommands = dict(command_class.subcommands)
+        fallback = subcommands.pop(None, None)
+        schema = _schemas[command_class] = Schema({name: _compile(command_class, subcommand) for name, subcommand in subcommands.items()},
+                                                  _compile(command_class, fallback) if fallback is not None else None)
+    return schema
+
+
+def _compile(command_class, subcommand: Subcommand) -> _Compiled:
+    method = getattr(command_class, subcommand.method)  # fails at registration, not at first use
+    args = subcommand.args
+    if any(arg.rest for arg in args[:-1]) or any(arg.rest and arg.convert is not str for arg in args):
+        raise ValueError(f"{subcommand.method}: only the last argument can take the rest, as str")
+    takes_rest = bool(args) and args[-1].rest
+    return _Compiled(method, tuple((position, arg.convert, arg.error) for position, arg in enumerate(args) if arg.convert is not str),
+                     sum(1 for arg in args if not arg.optional and not arg.rest),
+                     float('inf') if takes_rest else len(args), subcommand.usage)
@@ -2,4 +2,21 @@
 import sys
 import os
 
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
\ No newline at end of file
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import data_store
+from plugins.history.storage import ChunkedCSV, Tombstones
+
+
+@pytest.fixture(autouse=True)
+def isolated_history(tmp_path_factory, monkeypatch):
+    '''Keeps every test's history in its own empty csv file with an empty append buffer and no deleted rows'''
+    path = str(tmp_path_factory.mktemp('history') / 'calc_history.csv')
+    monkeypatch.setattr(data_store, 'hist_path', path)
+    monkeypatch.setattr(data_store, 'hist_cold', ChunkedCSV(path))
+    monkeypatch.setattr(data_store, 'hist_tombstones', Tombstones())
+    data_store.hist_buffer.clear()
+    yield
+    data_store.hist_buffer.clear()
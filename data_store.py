@@ -1,4 +1,71 @@
 #Singleton to fetch dataframe globally
+# Every name below is an attribute of the current session's HistoryStore: reading or assigning
+# data_store.hist_df goes to the store of the session active in this thread (see app.session), or to
+# default_store outside sessions, which is the one the REPL uses. One process can so hold many
+# independent histories while the history code keeps using data_store.<name>.
+import contextlib
+import sys
+import threading
+import types
+from contextvars import ContextVar
 
-hist_df = None
-hist_path = ""
\ No newline at end of file
+from plugins.history.storage.buffer import HistoryBuffer
+from plugins.history.storage.tombstones import Tombstones
+
+
+class HistoryStore:
+    def __init__(self, hist_path: str = "", hist_df=None):
+        self.hist_df = hist_df
+        self.hist_path = hist_path
+
+        # Rows appended since hist_df was last materialized, see storage.table.current_frame
+        self.hist_buffer = HistoryBuffer()
+
+        # Row numbers deleted but not yet compacted away
+        self.hist_tombstones = Tombstones()
+
+        # Rows already in the history file, read through its storage.engine.HistoryEngine; None until one is opened
+        self.hist_cold = None
+
+        # Write-behind autosaver, None means every mutation is saved (appended) inline
+        self.autosaver = None
+
+        # Guards the history state between the commands and the autosave thread
+        self.lock = threading.RLock()
+
+
+FIELDS = tuple(vars(HistoryStore()))
+
+default_store = HistoryStore()
+_store = ContextVar('history_store', default=default_store)
+
+
+def current_store() -> HistoryStore:
+    return _store.get()
+
+
+@contextlib.contextmanager
+def use_store(store: HistoryStore):
+    """Makes store the current one inside the with block only"""
+    token = _store.set(store)
+    try:
+        yield store
+    finally:
+        _store.reset(token)
+
+
+def _field(name):
+    # del data_store.<name> (mock.patch restoring a value) unsets it until it is assigned again
+    return property(lambda module: getattr(_store.get(), name),
+                    lambda module, value: setattr(_store.get(), name, value),
+                    lambda module: delattr(_store.get(), name))
+
+
+class _StoreModule(types.ModuleType):
+    pass
+
+
+for _name in FIELDS:
+    setattr(_StoreModule, _name, _field(_name))
+
+sys.modules[__name__].__class__ = _StoreModule
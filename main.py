@@ -1,4 +1,48 @@
+import argparse
+import sys
+
 from app import App
+from commands import RENDERERS, set_renderer
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Calculator app. Runs the interactive prompt; with a script "
+                                                 "file or piped stdin runs one command per line without prompts; "
+                                                 "with --serve serves commands to clients")
+    parser.add_argument('script', nargs='?', help="file of commands, one per line ('-' reads stdin)")
+    errors = parser.add_mutually_exclusive_group()
+    errors.add_argument('--fail-fast', action='store_true', help="stop at the first command that fails")
+    errors.add_argument('--continue-on-error', dest='fail_fast', action='store_false',
+                        help="keep going after a failed command (default)")
+    parser.add_argument('-q', '--quiet', action='store_true', help="hide command output, show only errors and the summary")
+    parser.add_argument('--output', choices=list(RENDERERS), default='text',
+                        help="how command results are shown: text (default), json (one object per line) or silent")
+    parser.add_argument('--serve', metavar='SOCKET|PORT',
+                        help="serve commands as JSON lines on a Unix socket path or a localhost TCP port")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    app = App()  # Instantiate an instance of App
+    set_renderer(args.output)
+    if args.serve:
+        return 0 if app.serve(args.serve) else 1
+    if args.script is None and sys.stdin.isatty():
+        app.start()
+        return 0
+    if args.script in (None, '-'):
+        _, errors, _ = app.run_script(sys.stdin, args.fail_fast, args.quiet)
+    else:
+        try:
+            script = open(args.script, encoding='utf-8')
+        except OSError as e:
+            print(f"Error: cannot read script: {e}", file=sys.stderr)
+            return 2
+        with script:
+            _, errors, _ = app.run_script(script, args.fail_fast, args.quiet)
+    return 1 if errors else 0
+
 
 if __name__ == "__main__":
-    app = App().start()  # Instantiate an instance of App
\ No newline at end of file
+    sys.exit(main())
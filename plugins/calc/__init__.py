@@ -1,61 +1,68 @@
 from decimal import Decimal, InvalidOperation
+import contextlib
+import decimal
 import os
 import sys
+import time
 
+import numpy as np
 import pandas as pd
 
-from commands import Command
+from commands import Command, emit, Arg, Subcommand
 
 from decimal import Decimal, InvalidOperation
 
-from plugins.calc.calculator import Calculator
+from plugins.calc.calculator import Calculator, ENGINES, current_log, get_operation, operations
+from plugins.calc.calculator.expression import compile_expression
+from plugins.calc.calculator.cells import Cells, current_sheet
+from plugins.calc.calculator.fixed import local_scale
 import logging as log
 
+FILE_CHUNK_ROWS = 100_000  # rows 'calc file' holds in memory at a time
+NAN_OPERAND = r'\s*[+-]?s?nan\d*\s*'  # the NaN spellings Decimal accepts, case aside
 
+BUILTIN_OPERATIONS = ['add', 'subtract', 'multiply', 'divide', 'sqrt']  # described in the usage message
 
-class CalcCommand(Command): 
 
-    def run_calculations(self, a:Decimal, b:Decimal, operation_name:str):
-        # uses functions imported from calc.operations to randomly generate one of the ops
-        operation_maps = {
-            'add': Calculator.add,
-            'subtract': Calculator.subtract,
-            'multiply': Calculator.multiply,
-            'divide': Calculator.divide
-        }
-
-        sign_maps = {
-            'add': '+',
-            'subtract': '-',
-            'multiply': '*',
-            'divide': '/'
-        }
-
-        #Works
-        if operation_name not in operation_maps:
-            log.error(f"Unknown operation: {operation_name}")
-            return
-        
-        # Convert inputs to Decimal and validate
-        try:
-            a_decimal = Decimal(a)
-            b_decimal = Decimal(b)
-        except InvalidOperation as e:
-            log.error(f"Invalid number input: {e}")
-            return
 
+class CalcCommand(Command): 
+    # subcommand -> method and typed arguments, compiled once (commands.schema); any other name is an operation
+    subcommands = {
+        '': Subcommand('defaultMessage'),
+        'file': Subcommand('run_file', (Arg('args', rest=True),)),
+        'cache': Subcommand('cache_stats', (Arg('args', rest=True),)),
+        'expr': Subcommand('run_expression', (Arg('args', rest=True),)),
+        'set': Subcommand('set_cell', (Arg('name'), Arg('value', Decimal, error="Invalid number input: {value}")),
+                          "Error: Usage calc set <name> <number>"),
+        'let': Subcommand('let_cell', (Arg('args', rest=True),)),
+        'cells': Subcommand('list_cells'),
+        None: Subcommand('run_operation', (Arg('operation'), Arg('a', Decimal, error="Invalid number input: {value}"),
+                                           Arg('b', Decimal, optional=True, error="Invalid number input: {value}")),
+                         "Error: Incorrect number of arguments for calc"),
+    }
+
+    def calculate(self, operation, operation_name, a: Decimal, b: Decimal):
         try: 
             # Perform the calculation
-            curr_operation_func = operation_maps[operation_name]
-            curr_operation_sign = sign_maps[operation_name]
-            result = curr_operation_func(a_decimal, b_decimal)
+            result = Calculator.calculate(operation, a, b)
 
-            print(f"Result: {a} {operation_name} {b} = {result}")
-            self.save_operation("add",a, curr_operation_sign, b, result)            
-        except ValueError: 
-            log.error("An error occurred: Cannot divide by zero")
+            calculation = emit('calculation', {'operation': operation_name, 'a': a, 'b': b, 'result': result},
+                               self.format_calculation)
+            # history keeps an empty num2 for one operand operations
+            self.save_operation("add", str(a), operation.symbol, '' if b is None else str(b), result)            
+            # already in the history file, so a spilling Calculations must not write it again
+            current_log().get_latest_calc().saved = True
+            return calculation
+        except ValueError as e: 
+            log.error(f"An error occurred: {str(e).rstrip('.')}")
 
 
+    @staticmethod
+    def format_calculation(data):
+        if data['b'] is None:
+            return f"Result: {data['operation']} {data['a']} = {data['result']}"
+        return f"Result: {data['a']} {data['operation']} {data['b']} = {data['result']}"
+
     def defaultMessage(self, *args): 
         message = (
             'Usage: \n'
@@ -65,31 +72,295 @@ class CalcCommand(Command):
             '    add <num1> <num2>       adds two numbers (num1+num2)\n'
             '    subtract <num1> <num2>  subtract num2 from num1 (num1-num2)\n'
             '    multiply <num1> <num2>  multiplies two numbers (num1*num2)\n'
-            '    divide <num1> <num2>    divide num1 by num2 (num1/num2)'
+            '    divide <num1> <num2>    divide num1 by num2 (num1/num2)\n'
+            '    sqrt <num1>             square root of num1\n'
+            f'{self.plugin_operations()}'
+            '    file <in.csv> <out.csv> [history] [float|decimal|fixed] [parallel[=N]] [prec=N]\n'
+            '         [scale=N] [chunk rows]\n'
+            '                            runs every operation,num1,num2 row of in.csv, writing the\n'
+            '                            results to out.csv; history appends them to history in one save,\n'
+            '                            parallel spreads the decimal math over N processes, fixed uses\n'
+            '                            scaled integers with scale=N decimals\n'
+            '    cache [clear]           shows (or resets) the result cache counters\n'
+            '    expr "<expression>" [name=value ...]\n'
+            '                            evaluates e.g. "(a + 2) * sqrt(b)", a name=1,2,3 list evaluates\n'
+            '                            it once per value; other names read cells\n'
+            '    set <name> <number>     sets a cell, recomputing the cells that depend on it\n'
+            '    let <name> = <expression>\n'
+            '                            a cell computed from other cells, kept up to date\n'
+            '    cells                   lists the cells'
         )
-        print(message)
+        return emit('usage', message)
         
+    @staticmethod
+    def plugin_operations():
+        # usage lines for operations other plugins registered
+        lines = ''
+        for operation in operations():
+            if operation.name not in BUILTIN_OPERATIONS:
+                usage = f"{operation.name} <num1>{' <num2>' if operation.arity == 2 else ''}"
+                lines += f"    {usage:<24}{operation.symbol} (added by a plugin)\n"
+        return lines
+
     def save_operation(self, *args):
         from plugins.history import HistoryCommand as histComm
         hist_instance = histComm()
-        hist_instance.add(*args)
+        return hist_instance.execute(*args)
 
-    def execute(self, *args): 
-        if len(args) == 0: 
-            self.defaultMessage(*args)
+    def cache_stats(self, *args):
+        # the result cache counters; 'calc cache clear' empties it and resets them
+        cache = Calculator.cache
+        if cache is None:
+            return emit('message', "Result cache is off (set CALC_CACHE_SIZE to turn it on)")
+        if args and args[0] == 'clear':
+            cache.clear()
+        return emit('cache', cache.stats()._asdict(), self.format_cache)
+
+    @staticmethod
+    def format_cache(stats):
+        lookups = stats['hits'] + stats['misses']
+        return (f"Result cache: {stats['size']}/{stats['maxsize']} entries, {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hits'] / lookups if lookups else 0:.0%} hit rate), {stats['evictions']} evictions")
+
+    def run_expression(self, *args):
+        # calc expr "<expression>" [name=value ...]; name=1,2,3 evaluates it once per value, in one batch
+        variables = dict(arg.split('=', 1) for arg in args if '=' in arg)
+        # the command line arrives split on spaces, quotes included
+        source = ' '.join(arg for arg in args if '=' not in arg).strip().strip('"\'')
+        if not source:
+            log.error('Error: Usage calc expr "<expression>" [name=value ...]')
             return
-        elif not  2 < len(args) < 4:
+        try:
+            expression = compile_expression(source)  # parsed once per distinct source text
+            cells = current_sheet().values
+            for name in expression.variables:
+                if name not in variables and name in cells and cells[name] is not None:
+                    variables[name] = str(cells[name])  # cells from calc set / let
+            values = {name: value.split(',') for name, value in variables.items()}
+            if all(len(column) == 1 for column in values.values()):
+                result = expression.evaluate({name: column[0] for name, column in values.items()})
+                return emit('expression', {'source': source, 'result': result},
+                            lambda data: f"Result: {data['source']} = {data['result']}")
+            rows = max(len(column) for column in values.values())
+            values = {name: column * rows if len(column) == 1 else column for name, column in values.items()}
+            batch = expression.evaluate_many(values, Calculator.engine)
+        except InvalidOperation as e:
+            log.error(f"Invalid number input: {e}")
+            return
+        except ValueError as e:
+            log.error(f"An error occurred: {str(e).rstrip('.')}")
+            return
+        except ArithmeticError as e:
+            # Decimal signals such as Overflow, reported like a failing cell
+            log.error(f"An error occurred: invalid arithmetic: {type(e).__name__}")
+            return
+
+        results = [None if failed else result for result, failed in zip(batch.results.tolist(), batch.errors.tolist())]
+        return emit('expression_batch', {'source': source, 'values': values, 'results': results}, self.format_batch)
+
+    @staticmethod
+    def format_batch(data):
+        lines = []
+        for row, result in enumerate(data['results']):
+            bound = ', '.join(f"{name}={column[row]}" for name, column in data['values'].items())
+            lines.append(f"Result: {data['source']} with {bound} = {'error' if result is None else result}")
+        return '\n'.join(lines)
+
+    def list_cells(self):
+        # calc cells
+        cells = current_sheet()
+        return emit('cells', [cells.state(name) for name in cells.values], self.format_cells)
+
+    def set_cell(self, name, value: Decimal):
+        # calc set x 5; emits every cell the change recomputed
+        cells = current_sheet()
+        try:
+            changed = cells.set(name, value)
+        except ValueError as e:
+            log.error(f"An error occurred: {str(e).rstrip('.')}")
+            return
+        return emit('cells', [cells.state(name) for name, _ in changed], self.format_cells)
+
+    def let_cell(self, *args):
+        # calc let y = x * 3; 'y = x * 3' arrives split on spaces, 'y=x*3' in one piece
+        name, _, source = ' '.join(args).partition('=')
+        if not name.strip() or not source.strip():
+            log.error("Error: Usage calc let <name> = <expression>")
+            return
+        cells = current_sheet()
+        try:
+            changed = cells.let(name.strip(), source.strip().strip('"\''))
+        except InvalidOperation as e:
+            log.error(f"Invalid number input: {e}")
+            return
+        except ValueError as e:
+            log.error(f"An error occurred: {str(e).rstrip('.')}")
+            return
+        return emit('cells', [cells.state(name) for name, _ in changed], self.format_cells)
+
+    @staticmethod
+    def format_cells(cells):
+        return '\n'.join(Cells.format_state(cell) for cell in cells)
+
+    def run_file(self, *args):
+        # Streams in.csv through the calculator a chunk at a time, so memory stays bounded
+        if len(args) < 2:
+            log.error("Error: Usage calc file <in.csv> <out.csv> [history] [float|decimal|fixed] [parallel[=N]] "
+                      "[prec=N] [scale=N] [chunk rows]")
+            return
+        in_path, out_path, options = args[0], args[1], args[2:]
+        engine = next((option for option in options if option in ENGINES), Calculator.engine)
+        chunk_rows = next((int(option) for option in options if option.isdigit()), FILE_CHUNK_ROWS)
+        settings = dict(option.split('=', 1) for option in options if '=' in option)
+        parallel = 'parallel' in options or 'parallel' in settings
+        try:
+            workers = int(settings.get('parallel', 0)) or None
+            precision = int(settings.get('prec', 0)) or decimal.getcontext().prec
+            scale = int(settings['scale']) if 'scale' in settings else None
+            if scale is not None and scale < 0:
+                raise ValueError
+        except ValueError:
+            log.error(f"Error: parallel, prec and scale take a whole number, got {settings}")
+            return
+        if parallel and engine != 'decimal':
+            log.error("Error: parallel only runs the decimal engine")
+            return
+
+        # workers copy the Decimal context they are started in, so the pool starts inside localcontext
+        with decimal.localcontext(prec=precision), local_scale(scale):
+            with Calculator.make_pool(workers) if parallel else contextlib.nullcontext() as pool:
+                return self.stream_file(in_path, out_path, engine, chunk_rows, 'history' in options, pool)
+
+    def stream_file(self, in_path, out_path, engine, chunk_rows, to_history, pool=None):
+        hist_instance = None
+        if to_history:
+            from plugins.history import HistoryCommand as histComm
+            hist_instance = histComm()
+
+        rows = failed = 0
+        start = time.perf_counter()
+        try:
+            reader = pd.read_csv(in_path, dtype=str, chunksize=chunk_rows, usecols=['operation', 'num1', 'num2'])
+            with open(out_path, 'w', newline='', encoding='utf-8') as out_file:
+                for chunk in reader:
+                    chunk, chunk_operations = self.calculate_chunk(chunk, engine, pool)
+                    chunk.to_csv(out_file, header=rows == 0, index=False)
+                    rows += len(chunk)
+                    failed += int(chunk['error'].notna().sum())
+                    if hist_instance is not None:
+                        # appended to the history file chunk by chunk, so the buffer never holds more than one
+                        hist_instance.add_frame(self.history_rows(chunk, chunk_operations), save=True)
+                if rows == 0:
+                    pd.DataFrame(columns=['operation', 'num1', 'num2', 'result', 'error']).to_csv(out_file, index=False)
+        except (OSError, ValueError, ArithmeticError) as e:
+            # the chunks done so far are in out.csv and, with history, already saved there too
+            log.error(f"Error: calc file could not process {in_path}: {e} (stopped after {rows} rows)")
+            return
+
+        elapsed = time.perf_counter() - start
+        log.info(f"calc file: {rows} rows ({failed} failed) from {in_path} written to {out_path}")
+        return emit('file', {'rows': rows, 'failed': failed, 'seconds': elapsed, 'out_path': out_path}, self.format_file)
+
+    @staticmethod
+    def format_file(data):
+        return (f"Processed {data['rows']} rows ({data['failed']} failed) in {data['seconds']:.2f}s, "
+                f"{data['rows'] / data['seconds'] if data['seconds'] else 0:,.0f} rows/s, written to {data['out_path']}")
+
+    def calculate_chunk(self, chunk, engine, pool=None):
+        # one evaluate_many call per operation in the chunk instead of one dispatch per row
+        chunk = chunk.reset_index(drop=True)
+        num1 = chunk['num1'].to_numpy(dtype=object)
+        num2 = chunk['num2'].to_numpy(dtype=object)
+        results = np.full(len(chunk), None, dtype=object)
+        errors = np.full(len(chunk), None, dtype=object)
+        # the operation column may hold names or symbols of any registered operation
+        names = {key: operation.name for operation in operations() for key in (operation.name, operation.symbol)}
+        chunk_operations = chunk['operation'].str.strip().str.lower().map(names)
+        errors[chunk_operations.isna().to_numpy()] = 'Unknown operation'
+        # a missing or NaN operand fails its row in every engine (float and decimal would carry NaN along)
+        bad1, bad2 = (self.missing_operands(chunk[column]) for column in ('num1', 'num2'))
+
+        for operation_name, rows in chunk_operations.groupby(chunk_operations).indices.items():
+            operation = get_operation(operation_name)
+            second = None if operation.arity == 1 else num2
+            bad = bad1[rows] if second is None else bad1[rows] | bad2[rows]
+            errors[rows[bad]] = 'Invalid number'
+            rows = rows[~bad]
+            if not len(rows):
+                continue
+            try:
+                batch = Calculator.evaluate_many(operation, num1[rows], second if second is None else second[rows],
+                                                 engine, record=False, pool=pool)
+            except (ArithmeticError, ValueError, TypeError):
+                # some operand in the group is not a number, or overflows: find which rows row by row, in this process
+                for row in rows:
+                    try:
+                        batch = Calculator.evaluate_many(operation, num1[row:row + 1],
+                                                         second if second is None else second[row:row + 1],
+                                                         engine, record=False)
+                        results[row] = batch.as_decimal()[0]
+                        errors[row] = self.failure(operation, num1[row], second) if batch.errors[0] else None
+                    except (InvalidOperation, ValueError, TypeError):
+                        errors[row] = 'Invalid number'
+                    except ArithmeticError as e:
+                        errors[row] = f'invalid arithmetic: {type(e).__name__}'
+                continue
+            results[rows] = batch.as_decimal()
+            if batch.errors.any():
+                failed = rows[batch.errors]
+                errors[failed] = self.failure(operation, num1[failed[0]], second if second is None else second[failed[0]])
+
+        results[pd.notna(errors)] = None
+        chunk['result'] = results
+        chunk['error'] = errors
+        return chunk, chunk_operations
+
+    @staticmethod
+    def missing_operands(column):
+        # bool mask of the empty or NaN operands in a str column
+        return (column.isna() | column.str.fullmatch(NAN_OPERAND, case=False).fillna(False)).to_numpy(dtype=bool)
+
+    @staticmethod
+    def failure(operation, a, b):
+        # the scalar function's own message for operands the batch flagged ('Cannot divide by zero', ...)
+        try:
+            operation.scalar(Decimal(a)) if b is None else operation.scalar(Decimal(a), Decimal(b))
+        except ValueError as e:
+            return str(e).rstrip('.')
+        return 'Invalid operands'
+
+    @staticmethod
+    def history_rows(chunk, chunk_operations):
+        # successful rows in the history table's layout
+        done = chunk['error'].isna().to_numpy()
+        symbols = {operation.name: operation.symbol for operation in operations()}
+        unary = [operation.name for operation in operations() if operation.arity == 1]
+        num2 = chunk['num2'].where(~chunk_operations.isin(unary), '')  # one operand rows keep an empty num2
+        return pd.DataFrame({
+            'num1': chunk['num1'].to_numpy()[done],
+            'operand': chunk_operations.map(symbols).to_numpy()[done],
+            'num2': num2.to_numpy()[done],
+            'result': chunk['result'].astype(str).to_numpy()[done],
+        })
+
+    def execute(self, *args): 
+        return self.dispatch(args)
+
+    def run_operation(self, operation_name, a: Decimal, b: Decimal = None):
+        # calc <operation> <num1> [num2], operands already parsed by the schema;
+        # an unknown operation is checked as if it took two operands, then reported below
+        operation = get_operation(operation_name)
+        arity = operation.arity if operation is not None else 2
+        if (b is None) != (arity == 1):
             log.error("Error: Incorrect number of arguments for calc")
             return
-        
+        if operation is None:
+            log.error(f"Unknown operation: {operation_name}")
+            return
 
         try: 
-            operation = args[0]
-            a = args[1]
-            b = b = args[2]
-
             #Take system args and run as a function
-            self.run_calculations(a, b, operation)
+            return self.calculate(operation, operation_name, a, b)
         except Exception as e:
             # Catch-all for any unexpected errors
             log.error(f"An unexpected error occurred: {e}")
\ No newline at end of file
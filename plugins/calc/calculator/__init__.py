@@ -1,22 +1,57 @@
 from typing import Callable
 from plugins.calc.calculator.calculation import Calculation
-from plugins.calc.calculator.calculations import Calculations
-from plugins.calc.calculator.operations import add, subtract, multiply, divide #, sqrt
+from plugins.calc.calculator.calculations import Calculations, current_log, use_log
+from plugins.calc.calculator.operations import add, subtract, multiply, divide, sqrt
+from plugins.calc.calculator.registry import Operation, register_operation, unregister_operation, get_operation, operations
+from plugins.calc.calculator.batch import BatchResult, ENGINES, evaluate
+from plugins.calc.calculator.fixed import get_scale, set_scale, local_scale
+from plugins.calc.calculator.parallel import evaluate_parallel, make_pool
+from plugins.calc.calculator.cache import ResultCache, CacheStats
 from decimal import Decimal # Importing Decimal to typeforce 
 
 
+def _as_list(values):
+    # numpy arrays become python scalars in one call instead of one numpy scalar per item
+    return values.tolist() if hasattr(values, 'tolist') else values
+
+
 # Main calculator class
 class Calculator:
+    # opt-in result cache (see calculator.cache), None = every call is computed
+    cache: ResultCache = None
+    # batch engine evaluate_many, calc file and calc expr use when none is named (CALC_ENGINE)
+    engine: str = 'decimal'
 
 
+    @staticmethod
+    def calculate(op, a: Decimal, b: Decimal = None) -> Decimal:
+        # Runs any registered operation by name, symbol or function: one registry lookup
+        operation = get_operation(op)
+        if operation is None:
+            raise ValueError(f"Unknown operation: {op}")
+        return Calculator._perform_operation(a, b, operation.scalar)
+
     @staticmethod
     def _perform_operation(a: Decimal, b: Decimal, operation: Callable[[Decimal, Decimal], Decimal]) -> Decimal:
         # create instance of a single calculation
         myCalculation = Calculation.create(a,b, operation)
 
-        #using Calculation class itself bc we are doing it for the entire class
-        Calculations.add_to_history(myCalculation)
-        return myCalculation.perform()
+        #using Calculation class itself bc we are doing it for the entire class (or the session's, see current_log)
+        # -- recorded whether or not the result comes from the cache, so history is the same either way
+        current_log().add_to_history(myCalculation)
+        if Calculator.cache is None:
+            return myCalculation.perform()
+        return Calculator.cache.perform(operation, a, b)
+
+    @staticmethod
+    def enable_cache(maxsize: int = 1024) -> ResultCache:
+        # keeps the maxsize most recently used results
+        Calculator.cache = ResultCache(maxsize)
+        return Calculator.cache
+
+    @staticmethod
+    def disable_cache():
+        Calculator.cache = None
 
 
     # @staticmethod = GLOBALLY accessible, does NOT have access to outside values/instance varibales
@@ -46,7 +81,37 @@ class Calculator:
         # Call current class's owon _perform_operation on divide operation
         return Calculator._perform_operation(a,b, divide)
     
-    # @staticmethod
-    # def sqrt(a: Decimal) -> Decimal:
-    #     # Call current class's owon _perform_operation on sqrt operation
-    #     return Calculator._perform_operation(a, sqrt)
+    @staticmethod
+    def evaluate_many(op, a_array, b_array=None, engine: str = None, record: bool = True,
+                      workers: int = None, pool=None) -> BatchResult:
+        # Runs one operation over whole arrays of operands, see calculator.batch for the engines
+        # op is a registered operation's name, symbol or function (add, divide, ...)
+        # workers/pool shard the decimal engine across processes, see calculator.parallel
+        operation = get_operation(op)
+        if operation is None:
+            raise ValueError(f"Unknown operation: {getattr(op, '__name__', op)}")
+        if operation.arity == 1:
+            b_array = None
+        engine = engine or Calculator.engine
+        if workers or pool is not None:
+            if engine != 'decimal':
+                raise ValueError(f"Parallel mode runs the decimal engine, not '{engine}'")
+            result = evaluate_parallel(operation, _as_list(a_array), _as_list(b_array), workers, pool=pool)
+        else:
+            result = evaluate(operation, a_array, b_array, engine)
+
+        # history is recorded in bulk, failed divides included like the scalar path does;
+        # record=False skips it when only the results are wanted
+        if record:
+            current_log().add_many(_as_list(a_array), b_array if b_array is None else _as_list(b_array), operation.scalar)
+        return result
+
+    @staticmethod
+    def make_pool(workers: int = None):
+        # process pool for evaluate_many(pool=...), reused across calls; workers copy the current Decimal context
+        return make_pool(workers)
+
+    @staticmethod
+    def sqrt(a: Decimal) -> Decimal:
+        # Call current class's owon _perform_operation on sqrt operation
+        return Calculator._perform_operation(a, None, sqrt)
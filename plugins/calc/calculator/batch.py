@@ -0,0 +1,81 @@
+# Batch engines behind Calculator.evaluate_many: one operation applied to whole arrays of operands.
+# 'float'   = numpy float64 ufuncs, fastest, results rounded to binary floating point
+# 'decimal' = exact Decimal results; numpy object arrays run the Decimal arithmetic in numpy's
+#             C loop, so there is no Python-level call or Calculation object per pair
+# 'fixed'   = exact fixed-point: operands as scaled integers in int64 arrays, see calculator.fixed;
+#             operations without an integer version run on Decimal and are rounded to the scale
+# Operations come from calculator.registry. Dividing by zero (or any operand the operation's
+# invalid check rejects) does not raise here: those pairs are flagged in BatchResult.errors instead.
+
+from decimal import Decimal
+from typing import NamedTuple
+
+import numpy as np
+
+from plugins.calc.calculator import fixed
+from plugins.calc.calculator.registry import get_operation
+
+ENGINES = ['float', 'decimal', 'fixed']
+
+
+class BatchResult(NamedTuple):
+    results: np.ndarray  # float64, object array of Decimal, or scaled integers (fixed engine); NaN / None / 0 where errors is True
+    errors: np.ndarray  # bool mask of operands the operation failed on (divide by zero, ...)
+    scale: int = None  # fixed engine only: results count 10**-scale units
+
+    def as_decimal(self) -> np.ndarray:
+        """Fixed engine results as Decimal (None where errors is True), for display and history;
+        the other engines' results as they are"""
+        if self.scale is None:
+            return self.results
+        return fixed.to_decimal_array(self.results, self.errors, self.scale)
+
+
+def evaluate(operation, a_values, b_values=None, engine: str = 'decimal') -> BatchResult:
+    """Applies operation element-wise to a_values (and b_values) with the chosen engine.
+    operation is a registered operation, its name, symbol or scalar function"""
+    spec = get_operation(operation)
+    if spec is None:
+        raise ValueError(f"Unknown operation: {getattr(operation, '__name__', operation)}")
+    if engine == 'fixed':
+        if spec.name in fixed.OPERATIONS:
+            return BatchResult(*fixed.evaluate(spec.name, a_values, b_values), fixed.get_scale())
+        results, errors, _ = evaluate(spec, a_values, b_values, 'decimal')
+        return BatchResult(fixed.from_decimal_array(results, errors), errors, fixed.get_scale())
+    if engine == 'float':
+        convert = _float_array
+    elif engine == 'decimal':
+        convert = _decimal_array
+    else:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+    arrays = [convert(a_values)] if spec.arity == 1 else [convert(a_values), convert(b_values)]
+    if arrays[0].shape != arrays[-1].shape:
+        raise ValueError(f"Operand arrays differ in length: {len(arrays[0])} and {len(arrays[-1])}")
+
+    # operations without a numpy version fall back to calling the scalar function per element
+    vectorized = spec.vectorized or np.frompyfunc(spec.scalar, spec.arity, 1)
+    if spec.invalid is None:
+        return BatchResult(vectorized(*arrays), np.zeros(len(arrays[0]), dtype=bool))
+
+    # operands the scalar function would raise on (divide by zero, ...) are masked out instead
+    errors = np.asarray(spec.invalid(*arrays), dtype=bool)
+    if not errors.any():
+        return BatchResult(vectorized(*arrays), errors)
+    if engine == 'float':
+        results = np.full(len(arrays[0]), np.nan)
+    else:
+        results = np.full(len(arrays[0]), None, dtype=object)
+    valid = ~errors
+    results[valid] = vectorized(*[array[valid] for array in arrays])
+    return BatchResult(results, errors)
+
+
+def _float_array(values) -> np.ndarray:
+    return np.asarray(values, dtype=np.float64)
+
+
+def _decimal_array(values) -> np.ndarray:
+    # operands the scalar path would accept (str, int, Decimal) as an object array of Decimal
+    if isinstance(values, np.ndarray):
+        values = values.tolist()  # python ints/floats convert to Decimal much faster than numpy scalars
+    return np.fromiter(map(Decimal, values), dtype=object, count=len(values))
@@ -0,0 +1,78 @@
+# Opt-in LRU cache of operation results for Calculator's scalar path.
+# Keys are (operation, a, b, Decimal context): operands are keyed by their exact Decimal text, so
+# Decimal('2.0') and Decimal('2'), which give differently written results, are separate entries,
+# and the same operands under another precision or rounding mode are a separate entry too.
+# Failures (divide by zero, Decimal signals) are cached like results and raised again on a hit.
+
+import decimal
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Callable, NamedTuple
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+
+class ResultCache:
+    def __init__(self, maxsize: int = 1024):
+        if maxsize < 1:
+            raise ValueError("Cache size must be at least 1")
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # least recently used first
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+
+    def perform(self, operation: Callable, a, b):
+        """operation(a, b) (operation(a) when b is None), from the cache when the same call was made before"""
+        key = (operation, str(Decimal(a)), b if b is None else str(Decimal(b)), context_key(decimal.getcontext()))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        if entry is None:
+            entry = self._compute(operation, a, b)
+            with self.lock:
+                self.misses += 1
+                self.entries[key] = entry
+                if len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        succeeded, value = entry
+        if succeeded:
+            return value
+        raise value[0](*value[1])  # a fresh exception each time, not one shared traceback
+
+    @staticmethod
+    def _compute(operation: Callable, a, b):
+        try:
+            return True, operation(a) if b is None else operation(a, b)
+        except (ValueError, ArithmeticError) as e:
+            return False, (type(e), e.args)
+
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses, self.evictions, len(self.entries), self.maxsize)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+# every signal whose trap setting can turn a result into an exception
+SIGNALS = (decimal.Clamped, decimal.DivisionByZero, decimal.Inexact, decimal.InvalidOperation,
+           decimal.Overflow, decimal.Rounded, decimal.Subnormal, decimal.Underflow, decimal.FloatOperation)
+
+
+def context_key(context: decimal.Context) -> tuple:
+    # everything in a context that can change a result or whether it raises
+    # (indexing traps per signal is several times cheaper than iterating it)
+    traps = context.traps
+    return (context.prec, context.rounding, context.Emin, context.Emax, context.clamp,
+            tuple([traps[signal] for signal in SIGNALS]))
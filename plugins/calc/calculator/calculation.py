@@ -5,12 +5,17 @@ from typing import Callable # Allows hinting to operation variable that its a ca
 
 
 class Calculation: 
+    # __slots__ = fixed attributes and no per-instance __dict__, so each record is a few pointers
+    # -- matters when Calculations holds thousands of them
+    __slots__ = ('a', 'b', 'operation', 'saved')
+
     # Callable [input params types, output param type]; since you need two inputs, its [decimal,decimal]
     def __init__ (self,a: Decimal,b: Decimal, operation: Callable[[Decimal, Decimal], Decimal]):
          # Instance variables
         self.a = a
         self.b = b
         self.operation = operation # This allows any operation function to be triggered by calculation
+        self.saved = False # True once the calculation is in the history file, so it is not spilled there again
 
     # Wraps the Constructor of this class for an alternative way 
     # Allows use without instantiating the class directly
@@ -24,6 +29,9 @@ class Calculation:
         # Calls the stored operation function AS operation() and uses a,b on it
         # -- basically renames operations into a singular function since 
         # -- all 4 use same number and type of parameters
+        # -- one operand operations (sqrt) are stored with b = None
+        if self.b is None:
+            return self.operation(self.a)
         return self.operation(self.a, self.b)
     
     #returns a string representation of the specific Calculation instance
@@ -1,12 +1,136 @@
+import contextlib
+from bisect import bisect_left, bisect_right
+from collections import deque
+from contextvars import ContextVar
 from decimal import Decimal
-from typing import Callable, List
+from heapq import merge
+from itertools import islice, repeat
+from operator import itemgetter
+from typing import Callable, Deque, Dict, Iterable, List
 
 from plugins.calc.calculator.calculation import Calculation
 
+DEFAULT_CAPACITY = None  # keep every calculation; configure (CALC_HISTORY_SIZE) sets a bound
+MERGE_MIN = 1024  # the result index's unmerged run is folded into the main run past this size ...
+MERGE_FRACTION = 32  # ... or past 1/32 of the main run, whichever is larger
+EVICTIONS = ['drop', 'spill']  # what happens to an evicted calculation
+
 class Calculations: 
-    #Stores all 'Calculation's performed
-    #history is typeforced to be of type List, and each element will be of Calculation type
-    history: List[Calculation] = [] 
+    #Stores all 'Calculation's performed, or the most recent ones once configure sets a capacity
+    #history is a deque: with a maxlen it is a ring buffer where each new calculation evicts the
+    #oldest, so a long running process does not keep every calculation alive
+    history: Deque[Calculation] = deque(maxlen=DEFAULT_CAPACITY)
+    eviction: str = 'drop'
+    spill: Callable[[List[Calculation]], None] = None # receives evicted calculations when eviction == 'spill'
+
+    # Secondary indexes, so lookups do not scan the whole history
+    # -- operation name / operand value -> that key's calculations, oldest first; eviction always
+    #    removes the oldest calculation, which is therefore at the front of every deque it is in.
+    #    Operands are indexed lazily: calculations from seq _operands_indexed on are added to by_operand
+    #    by the next operand query, in one pass, so recording a big batch does not pay for it
+    # -- results are sorted lazily too: calculations from seq _results_indexed on are sorted by the next
+    #    result query into _results_recent (as (result, seq, calc)); once that small run grows past a
+    #    fraction of _results_sorted it is merged in, so a query never re-sorts everything
+    # seq numbers every calculation ever added; history[0] is number first_seq
+    by_operation: Dict[str, Deque[Calculation]] = {}
+    by_operand: Dict[Decimal, Deque[Calculation]] = {}
+    _results_sorted: list = []
+    _results_recent: list = []
+    _sorted_stale = 0 # evicted calculations still in _results_sorted / _results_recent
+    _results_indexed = 0
+    _operands_indexed = 0
+    first_seq = 0
+    next_seq = 0
+
+
+    @classmethod
+    def configure(cls, capacity: int = DEFAULT_CAPACITY, eviction: str = 'drop',
+                  spill: Callable[[List[Calculation]], None] = None):
+        """Sets the history capacity (None = unbounded) and what happens to evicted calculations"""
+        if eviction not in EVICTIONS:
+            raise ValueError(f"Unknown eviction policy '{eviction}', expected one of {EVICTIONS}")
+        if eviction == 'spill' and spill is None:
+            raise ValueError("The spill eviction policy needs a spill function")
+        cls.eviction = eviction
+        cls.spill = spill
+        # shrinking evicts like any other overflow
+        if capacity is not None:
+            cls._evict(len(cls.history) - capacity)
+        cls.history = deque(cls.history, maxlen=capacity)
+
+    @classmethod
+    def new_log(cls, capacity: int = DEFAULT_CAPACITY, eviction: str = 'drop',
+                spill: Callable[[List[Calculation]], None] = None) -> type:
+        """A separate Calculations with its own empty history and indexes, e.g. for one session"""
+        log = type(cls.__name__, (cls,), {
+            'history': deque(maxlen=capacity), 'by_operation': {}, 'by_operand': {}, '_results_sorted': [],
+            '_results_recent': [], '_sorted_stale': 0, '_results_indexed': 0, '_operands_indexed': 0,
+            'first_seq': 0, 'next_seq': 0})
+        log.configure(capacity, eviction, spill)
+        return log
+
+    @classmethod
+    def _evict(cls, count: int):
+        # removes the count oldest calculations from history and the indexes,
+        # handing them to spill first if that is the policy
+        count = min(count, len(cls.history))
+        if count <= 0:
+            return
+        evicted = [cls.history.popleft() for _ in range(count)]
+        for calculation in evicted:
+            cls._unindex(calculation)
+        if cls.eviction == 'spill':
+            cls.spill(evicted)
+
+    @staticmethod
+    def _operand_keys(calculation: Calculation):
+        # a calculation is indexed once under each distinct operand value (b is None for sqrt);
+        # NaN equals nothing, not even itself, so NaN operands are not indexed at all
+        a, b = calculation.a, calculation.b
+        if b is None or a == b or b.is_nan():
+            return () if a.is_nan() else (a,)
+        return (b,) if a.is_nan() else (a, b)
+
+    @classmethod
+    def _index(cls, calculation: Calculation):
+        cls.by_operation.setdefault(calculation.operation.__name__, deque()).append(calculation)
+        cls.next_seq += 1
+
+    @classmethod
+    def _index_many(cls, calculations: List[Calculation], operation):
+        # one operation for the whole batch, so its index is extended once
+        cls.by_operation.setdefault(operation.__name__, deque()).extend(calculations)
+        cls.next_seq += len(calculations)
+
+    @classmethod
+    def _recorded_since(cls, seq: int) -> List[Calculation]:
+        # the calculations numbered seq and up that are still in history, oldest first
+        count = cls.next_seq - max(seq, cls.first_seq)
+        return list(islice(reversed(cls.history), count))[::-1]
+
+    @classmethod
+    def _index_operands(cls):
+        # adds the calculations recorded since the last operand query to by_operand
+        by_operand = cls.by_operand
+        for calculation in cls._recorded_since(cls._operands_indexed):
+            for key in cls._operand_keys(calculation):
+                by_operand.setdefault(key, deque()).append(calculation)
+        cls._operands_indexed = cls.next_seq
+
+    @classmethod
+    def _unindex(cls, calculation: Calculation):
+        # calculation is the oldest one left, so it sits at the front of its deques
+        index, key = cls.by_operation, calculation.operation.__name__
+        keys = [(index, key)]
+        if cls.first_seq < cls._operands_indexed:
+            keys += [(cls.by_operand, key) for key in cls._operand_keys(calculation)]
+        for index, key in keys:
+            index[key].popleft()
+            if not index[key]:
+                del index[key]  # keys of evicted values do not pile up
+        if cls.first_seq < cls._results_indexed:
+            cls._sorted_stale += 1  # already sorted; filtered out by the next result query
+        cls.first_seq += 1
 
 
     # @Classmethod = affects ALL instances. any instance can add to the one singular history variable
@@ -14,18 +138,47 @@ class Calculations:
     # self keyword therefore works for instances only
     @classmethod
     def add_to_history(cls, calculation: Calculation): 
-        """Appends newest calculation to history"""
+        """Appends newest calculation to history, evicting the oldest when full"""
+        if len(cls.history) == cls.history.maxlen:
+            cls._evict(1)
         cls.history.append(calculation)
+        cls._index(calculation)
     
+    @classmethod
+    def add_many(cls, a_values: Iterable[Decimal], b_values: Iterable[Decimal], operation: Callable[[Decimal, Decimal], Decimal]):
+        """Appends one calculation per (a, b) pair in a single extend (b_values None for one operand operations)"""
+        # operands are stored as Decimal like the scalar path, whatever the batch was given
+        b_values = repeat(None) if b_values is None else map(Decimal, b_values)
+        calculations = list(map(Calculation, map(Decimal, a_values), b_values, repeat(operation)))
+        if cls.history.maxlen is not None:
+            overflow = len(cls.history) + len(calculations) - cls.history.maxlen
+            # new calculations that would be evicted straight away never enter history
+            passing = max(len(calculations) - cls.history.maxlen, 0)
+            cls._evict(overflow - passing)
+            if passing:
+                if cls.eviction == 'spill':
+                    cls.spill(calculations[:passing])
+                calculations = calculations[passing:]
+                cls.next_seq += passing
+                cls.first_seq += passing
+        cls.history.extend(calculations)
+        cls._index_many(calculations, operation)
+
     @classmethod
     def clear_history(cls): 
         """Empties calculation history"""
-        cls.history.clear() #empties the list
+        cls.history.clear() #empties the deque
+        cls.by_operation.clear()
+        cls.by_operand.clear()
+        cls._results_sorted.clear()
+        cls._results_recent.clear()
+        cls._sorted_stale = 0
+        cls.first_seq = cls._results_indexed = cls._operands_indexed = cls.next_seq
 
     @classmethod
     def get_history(cls) -> List[Calculation]:
         """Return full history of calculations"""
-        return cls.history
+        return list(cls.history)
     
     # Returns latest Calculation element
     # -1 index = last index by looping backwards
@@ -39,5 +192,94 @@ class Calculations:
     @classmethod
     def find_by_operation(cls, operation_name: str) -> List[Calculation]:
         """Find by matching requested operation and return list of matching calculations"""
-        # List comprehension
-        return [calc for calc in cls.history if calc.operation.__name__ == operation_name]
\ No newline at end of file
+        # index lookup: cost depends on the matches, not on the size of history
+        return list(cls.by_operation.get(operation_name, ()))
+
+    @classmethod
+    def find_by_operand(cls, value) -> List[Calculation]:
+        """Return calculations that used value as either operand, oldest first"""
+        # Decimal('2') == Decimal('2.0') == 2 and they hash alike, so any spelling of the number matches
+        cls._index_operands()
+        return list(cls.by_operand.get(Decimal(value) if isinstance(value, str) else value, ()))
+
+    @classmethod
+    def get_latest(cls, operation_name: str, count: int = 1) -> List[Calculation]:
+        """Return the count most recent calculations of one operation, newest first"""
+        return list(islice(reversed(cls.by_operation.get(operation_name, ())), count))
+
+    @classmethod
+    def find_by_result(cls, low, high) -> List[Calculation]:
+        """Return calculations whose result is between low and high (inclusive), smallest result first"""
+        cls._sort_results()
+        result = itemgetter(0)
+        low, high = Decimal(low), Decimal(high)
+        if low.is_nan() or high.is_nan():
+            return []  # no result lies between NaN and anything
+        matches = []
+        for index in (cls._results_sorted, cls._results_recent):
+            start = bisect_left(index, low, key=result)
+            stop = bisect_right(index, high, key=result)
+            matches.append([entry for entry in index[start:stop] if entry[1] >= cls.first_seq])
+        return [calc for _, _, calc in merge(*matches, key=itemgetter(0, 1))]
+
+    @classmethod
+    def _sort_results(cls):
+        # works out the results of calculations added since the last result query
+        pending = []
+        first = max(cls._results_indexed, cls.first_seq)
+        for seq, calc in enumerate(cls._recorded_since(cls._results_indexed), first):
+            try:
+                result = calc.perform()
+            except (ValueError, ArithmeticError):
+                continue  # divide by zero has no result to index
+            if not result.is_nan():  # NaN cannot be ordered, and no range holds it
+                pending.append((result, seq, calc))
+        cls._results_indexed = cls.next_seq
+        # sorts are stable and entries arrive in seq order, so equal results stay oldest first
+        result = itemgetter(0)
+        if pending:
+            recent = cls._results_recent + pending
+            recent.sort(key=result)
+            cls._results_recent = recent
+        if len(cls._results_recent) > max(MERGE_MIN, len(cls._results_sorted) // MERGE_FRACTION) or \
+                cls._sorted_stale * 2 > len(cls._results_sorted) + len(cls._results_recent):
+            cls._merge_results()
+
+    @classmethod
+    def _merge_results(cls):
+        # folds _results_recent into _results_sorted, dropping evicted entries on the way:
+        # binary search each recent entry's place and copy the sorted runs in between
+        result = itemgetter(0)
+        current = [entry for entry in cls._results_sorted if entry[1] >= cls.first_seq] \
+            if cls._sorted_stale else cls._results_sorted
+        merged = []
+        previous = 0
+        for entry in cls._results_recent:
+            if entry[1] < cls.first_seq:
+                continue
+            position = bisect_right(current, entry[0], lo=previous, key=result)
+            merged += current[previous:position]
+            merged.append(entry)
+            previous = position
+        merged += current[previous:]
+        cls._results_sorted = merged
+        cls._results_recent = []
+        cls._sorted_stale = 0
+
+
+# The calculation log calculators record to: Calculations itself, or a session's new_log() inside use_log
+_log = ContextVar('calculation_log', default=Calculations)
+
+
+def current_log() -> type:
+    return _log.get()
+
+
+@contextlib.contextmanager
+def use_log(log: type):
+    """Records calculations to log inside the with block only"""
+    token = _log.set(log)
+    try:
+        yield log
+    finally:
+        _log.reset(token)
@@ -0,0 +1,176 @@
+# Named cells: 'calc set x 5' stores an input, 'calc let y = x * 3' a formula over other cells.
+# Formulas are compiled expressions (calculator.expression); the cells they read are edges of a
+# dependency graph, kept both ways (depends_on / dependents). Changing a cell recomputes only its
+# descendants: they are collected by walking dependents from the changed cell, then evaluated in
+# topological order (Kahn's algorithm over just that subgraph), so the cost follows the size of
+# the change and not the number of cells. A cell whose inputs all came out unchanged is skipped.
+
+import contextlib
+import re
+from collections import deque
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple
+
+from plugins.calc.calculator.expression import Expression, compile_expression
+
+NAME = re.compile(r'[A-Za-z_]\w*$')
+
+
+class Cells:
+    values: Dict[str, Optional[Decimal]] = {}  # None while the cell's formula fails
+    errors: Dict[str, str] = {}  # why a cell has no value
+    formulas: Dict[str, Expression] = {}  # formula cells only; the rest are inputs
+    depends_on: Dict[str, Tuple[str, ...]] = {}
+    dependents: Dict[str, Set[str]] = {}
+
+    @classmethod
+    def set(cls, name: str, value) -> List[Tuple[str, Optional[Decimal]]]:
+        """Makes name an input cell holding value; returns every cell whose value was recomputed"""
+        cls._check_name(name)
+        value = Decimal(value)
+        if name in cls.values and name not in cls.formulas and str(cls.values[name]) == str(value):
+            return []  # nothing changed, nothing downstream to recompute
+        cls._unlink(name)
+        cls.values[name] = value
+        cls.errors.pop(name, None)
+        return [(name, value)] + cls._recalculate(name)
+
+    @classmethod
+    def let(cls, name: str, source: str) -> List[Tuple[str, Optional[Decimal]]]:
+        """Makes name a formula cell; returns every cell whose value was recomputed"""
+        cls._check_name(name)
+        expression = compile_expression(source)
+        unknown = [variable for variable in expression.variables if variable not in cls.values]
+        if unknown:
+            raise ValueError(f"Unknown cell: {', '.join(unknown)}")
+        if name in expression.variables or cls._descendants(name).intersection(expression.variables):
+            raise ValueError(f"Circular reference: {name} would depend on itself")
+
+        # computed before the graph changes, so nothing is left half linked if evaluating raises
+        value, error = cls._compute(expression, expression.variables)
+        cls._unlink(name)
+        cls.formulas[name] = expression
+        cls.depends_on[name] = expression.variables
+        for variable in expression.variables:
+            cls.dependents.setdefault(variable, set()).add(name)
+        cls._store(name, value, error)
+        return [(name, cls.values[name])] + cls._recalculate(name)
+
+    @classmethod
+    def describe(cls, name: str) -> str:
+        return cls.format_state(cls.state(name))
+
+    @classmethod
+    def state(cls, name: str) -> dict:
+        formula = cls.formulas.get(name)
+        return {'name': name, 'formula': formula.source if formula is not None else None,
+                'value': cls.values[name], 'error': cls.errors.get(name)}
+
+    @staticmethod
+    def format_state(cell: dict) -> str:
+        value = cell['value'] if cell['value'] is not None else f"error ({cell['error']})"
+        return f"{cell['name']} = {cell['formula']} = {value}" if cell['formula'] is not None else f"{cell['name']} = {value}"
+
+    @classmethod
+    def new_sheet(cls) -> type:
+        """A separate set of cells, e.g. for one session"""
+        return type(cls.__name__, (cls,), {'values': {}, 'errors': {}, 'formulas': {}, 'depends_on': {}, 'dependents': {}})
+
+    @classmethod
+    def clear(cls):
+        cls.values.clear()
+        cls.errors.clear()
+        cls.formulas.clear()
+        cls.depends_on.clear()
+        cls.dependents.clear()
+
+    @staticmethod
+    def _check_name(name: str):
+        if not NAME.match(name):
+            raise ValueError(f"Invalid cell name: {name}")
+
+    @classmethod
+    def _unlink(cls, name: str):
+        # drops name's own formula edges; cells that read name keep theirs
+        for variable in cls.depends_on.pop(name, ()):
+            cls.dependents[variable].discard(name)
+        cls.formulas.pop(name, None)
+
+    @classmethod
+    def _descendants(cls, name: str) -> Set[str]:
+        # every cell that reads name, directly or through other cells
+        found = set()
+        stack = [name]
+        while stack:
+            for dependent in cls.dependents.get(stack.pop(), ()):
+                if dependent not in found:
+                    found.add(dependent)
+                    stack.append(dependent)
+        return found
+
+    @classmethod
+    def _recalculate(cls, changed: str) -> List[Tuple[str, Optional[Decimal]]]:
+        # recomputes changed's descendants in topological order, skipping cells whose inputs all held
+        affected = cls._descendants(changed)
+        waiting = {name: sum(1 for variable in cls.depends_on[name] if variable in affected) for name in affected}
+        ready = deque(name for name, count in waiting.items() if count == 0)
+        modified = {changed}
+        recalculated = []
+        while ready:
+            name = ready.popleft()
+            if any(variable in modified for variable in cls.depends_on[name]):
+                before = (str(cls.values[name]), cls.errors.get(name))
+                cls._evaluate(name)
+                if (str(cls.values[name]), cls.errors.get(name)) != before:
+                    modified.add(name)
+                recalculated.append((name, cls.values[name]))
+            for dependent in cls.dependents.get(name, ()):
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    ready.append(dependent)
+        return recalculated
+
+    @classmethod
+    def _evaluate(cls, name: str):
+        cls._store(name, *cls._compute(cls.formulas[name], cls.depends_on[name]))
+
+    @classmethod
+    def _compute(cls, expression: Expression, variables) -> Tuple[Optional[Decimal], Optional[str]]:
+        # (value, None), or (None, why there is no value)
+        failed = [variable for variable in variables if cls.values[variable] is None]
+        if failed:
+            return None, f"{failed[0]} has no value"
+        try:
+            return expression.evaluate({variable: cls.values[variable] for variable in variables}), None
+        except ValueError as e:
+            return None, str(e).rstrip('.')
+        except ArithmeticError as e:
+            # Decimal signals such as inf - inf or the square root of NaN
+            return None, f"invalid arithmetic: {type(e).__name__}"
+
+    @classmethod
+    def _store(cls, name: str, value: Optional[Decimal], error: Optional[str]):
+        cls.values[name] = value
+        if error is None:
+            cls.errors.pop(name, None)
+        else:
+            cls.errors[name] = error
+
+
+# The cells calc set / let work on: Cells itself, or a session's new_sheet() inside use_sheet
+_sheet = ContextVar('cells', default=Cells)
+
+
+def current_sheet() -> type:
+    return _sheet.get()
+
+
+@contextlib.contextmanager
+def use_sheet(sheet: type):
+    """Works on sheet's cells inside the with block only"""
+    token = _sheet.set(sheet)
+    try:
+        yield sheet
+    finally:
+        _sheet.reset(token)
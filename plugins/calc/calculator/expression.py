@@ -0,0 +1,240 @@
+# Expression compiler for 'calc expr': "(a + 2) * sqrt(b) / -c".
+# Infix + - * / follow the usual precedence, with unary minus/plus and parentheses; any registered
+# operation can be called by name, e.g. sqrt(x) or power(x, 2). Names that are not followed by a
+# call are variables, bound when the expression is evaluated.
+# The source is parsed once into a tree of closures; every operation node runs through
+# Calculator.calculate, so results (and Calculations history, the result cache) match typing the
+# steps one calc command at a time. compile_expression caches compiled expressions by source text,
+# so evaluating the same formula again, or over many inputs, never parses it again.
+
+import re
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+import numpy as np
+
+from plugins.calc.calculator import Calculator
+from plugins.calc.calculator.batch import BatchResult, _decimal_array, _float_array
+from plugins.calc.calculator.registry import get_operation
+
+EXPRESSION_CACHE_SIZE = 256  # compiled expressions kept, least recently used dropped first
+
+TOKEN = re.compile(r'\s*(?:(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)|(?P<name>[A-Za-z_]\w*)|(?P<symbol>[-+*/(),]))')
+BINARY = {'+': 1, '-': 1, '*': 2, '/': 2}  # infix symbol -> precedence, all left associative
+
+
+class Expression:
+    def __init__(self, source: str, tree: tuple):
+        self.source = source
+        self.tree = tree
+        self.variables = tuple(dict.fromkeys(_names(tree)))  # in order of first use
+        self._evaluate = _scalar(tree)
+        self._evaluate_many = _batch(tree)
+
+    def evaluate(self, values: dict = None, **kwargs) -> Decimal:
+        """The expression's value with its variables bound from values / keyword arguments"""
+        values = {**(values or {}), **kwargs}
+        missing = [name for name in self.variables if name not in values]
+        if missing:
+            raise ValueError(f"No value given for {', '.join(missing)}")
+        return self._evaluate({name: Decimal(values[name]) for name in self.variables})
+
+    def evaluate_many(self, columns: dict, engine: str = 'decimal') -> BatchResult:
+        """Evaluates the expression once per row of columns (variable -> sequence of values), one
+        Calculator.evaluate_many call per operation node. Rows any step fails on are flagged in errors.
+        Like calc file, these calculations are not recorded in Calculations"""
+        missing = [name for name in self.variables if name not in columns]
+        if missing:
+            raise ValueError(f"No values given for {', '.join(missing)}")
+        lengths = {len(columns[name]) for name in self.variables}
+        if len(lengths) > 1:
+            raise ValueError(f"Variables have different numbers of values: {sorted(lengths)}")
+        rows = lengths.pop() if lengths else 1
+        values, errors = self._evaluate_many(columns, rows, engine)
+        results = values.copy()
+        results[errors] = np.nan if engine == 'float' else None
+        return BatchResult(results, errors)
+
+    def __repr__(self):
+        return f"Expression({self.source!r})"
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(source: str) -> Expression:
+    """The compiled expression for source, parsed only the first time it is seen"""
+    parser = _Parser(source)
+    tree = parser.expression(0)
+    if parser.peek() is not None:
+        parser.fail(f"unexpected '{parser.peek()[1]}'")
+    return Expression(source, tree)
+
+
+# ---- parsing: source text -> tree of ('number', Decimal) / ('variable', name) /
+#      ('negate', node) / ('operation', Operation, (node, ...))
+
+class _Parser:
+    def __init__(self, source: str):
+        self.source = source
+        self.tokens = []  # (kind, text, position)
+        self.index = 0
+        position = 0
+        source = source.rstrip()
+        while position < len(source):
+            match = TOKEN.match(source, position)
+            if match is None:
+                position += len(source[position:]) - len(source[position:].lstrip())
+                self.fail(f"unexpected '{source[position]}'", position)
+            self.tokens.append((match.lastgroup, match.group(match.lastgroup), match.start(match.lastgroup)))
+            position = match.end()
+
+    def peek(self):
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        if token is None:
+            self.fail("unexpected end")
+        self.index += 1
+        return token
+
+    def expect(self, symbol: str):
+        token = self.take()
+        if token[1] != symbol:
+            self.index -= 1
+            self.fail(f"expected '{symbol}', found '{token[1]}'")
+
+    def fail(self, reason: str, position: int = None):
+        if position is None:
+            token = self.peek()
+            position = token[2] if token is not None else len(self.source)
+        raise ValueError(f"Invalid expression: {reason} at position {position} in '{self.source}'")
+
+    def expression(self, min_precedence: int) -> tuple:
+        # precedence climbing: a run of operators binding at least as tightly as min_precedence
+        left = self.unary()
+        while True:
+            token = self.peek()
+            if token is None or token[1] not in BINARY or BINARY[token[1]] < min_precedence:
+                return left
+            self.take()
+            right = self.expression(BINARY[token[1]] + 1)
+            left = ('operation', get_operation(token[1]), (left, right))
+
+    def unary(self) -> tuple:
+        token = self.peek()
+        if token is not None and token[1] in ('-', '+'):
+            self.take()
+            operand = self.unary()
+            return ('negate', operand) if token[1] == '-' else operand
+        return self.primary()
+
+    def primary(self) -> tuple:
+        kind, text, _ = self.take()
+        if kind == 'number':
+            return ('number', Decimal(text))
+        if text == '(':
+            inner = self.expression(0)
+            self.expect(')')
+            return inner
+        if kind != 'name':
+            self.index -= 1
+            self.fail(f"unexpected '{text}'")
+        if self.peek() is None or self.peek()[1] != '(':
+            return ('variable', text)
+
+        # a call of a registered operation by name
+        operation = get_operation(text)
+        if operation is None or operation.name != text:
+            self.index -= 1
+            self.fail(f"unknown operation '{text}'")
+        self.take()
+        arguments = [self.expression(0)]
+        while self.peek() is not None and self.peek()[1] == ',':
+            self.take()
+            arguments.append(self.expression(0))
+        self.expect(')')
+        if len(arguments) != operation.arity:
+            raise ValueError(f"Invalid expression: {text} takes {operation.arity} operand(s), "
+                             f"got {len(arguments)} in '{self.source}'")
+        return ('operation', operation, tuple(arguments))
+
+
+def _names(tree: tuple):
+    if tree[0] == 'variable':
+        yield tree[1]
+    elif tree[0] == 'negate':
+        yield from _names(tree[1])
+    elif tree[0] == 'operation':
+        for argument in tree[2]:
+            yield from _names(argument)
+
+
+# ---- compiling: tree -> closures, so evaluating is only calls, no parsing or tree walking by kind
+
+def _scalar(tree: tuple):
+    # closure(values) -> Decimal
+    kind = tree[0]
+    if kind == 'number':
+        value = tree[1]
+        return lambda values: value
+    if kind == 'variable':
+        name = tree[1]
+        return lambda values: values[name]
+    if kind == 'negate':
+        operand = _scalar(tree[1])
+        return lambda values: -operand(values)
+    operation = tree[1]
+    calculate = Calculator.calculate
+    if operation.arity == 1:
+        (argument,) = map(_scalar, tree[2])
+        return lambda values: calculate(operation, argument(values))
+    left, right = map(_scalar, tree[2])
+    return lambda values: calculate(operation, left(values), right(values))
+
+
+def _batch(tree: tuple):
+    # closure(columns, rows, engine) -> (values, errors); failed rows hold a placeholder 1 so the
+    # steps after them still run, and their errors flag is carried up to the result
+    kind = tree[0]
+    if kind == 'number':
+        value = tree[1]
+        return lambda columns, rows, engine: (_full(rows, value, engine), np.zeros(rows, dtype=bool))
+    if kind == 'variable':
+        name = tree[1]
+        return lambda columns, rows, engine: _column(columns[name], engine)
+    if kind == 'negate':
+        operand = _batch(tree[1])
+
+        def negate(columns, rows, engine):
+            values, errors = operand(columns, rows, engine)
+            return -values, errors
+        return negate
+
+    operation = tree[1]
+    arguments = [_batch(argument) for argument in tree[2]]
+
+    def run(columns, rows, engine):
+        evaluated = [argument(columns, rows, engine) for argument in arguments]
+        operands = [values for values, _ in evaluated]
+        errors = np.logical_or.reduce([argument_errors for _, argument_errors in evaluated])
+        result = Calculator.evaluate_many(operation, *operands, engine=engine, record=False)
+        errors = errors | result.errors
+        values = result.as_decimal()  # the next step parses its operands again
+        values[result.errors] = 1 if engine == 'float' else Decimal(1)
+        return values, errors
+    return run
+
+
+def _full(rows: int, value: Decimal, engine: str) -> np.ndarray:
+    if engine == 'float':
+        return np.full(rows, float(value))
+    return np.full(rows, value, dtype=object)
+
+
+def _column(values, engine: str):
+    # a variable's values as the engine's array type
+    try:
+        array = _float_array(values) if engine == 'float' else _decimal_array(values)
+    except (InvalidOperation, TypeError) as e:
+        raise ValueError(f"Invalid number in expression variables: {e}") from e
+    return array, np.zeros(len(array), dtype=bool)
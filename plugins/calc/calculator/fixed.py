@@ -0,0 +1,221 @@
+# Fixed-point engine for the batch APIs: engine='fixed'.
+# Every operand is parsed into an integer count of 10**-scale units (scale 6: '1.5' -> 1500000),
+# held in an int64 numpy array while the values are small enough for the operation not to overflow,
+# and in an object array of Python ints (exact at any size) otherwise. add and subtract are exact;
+# multiply and divide round their result to the scale with ROUND_HALF_EVEN, Decimal's default mode.
+# Operands with more decimals than the scale are rounded the same way when parsed.
+# Results become Decimal (with exactly `scale` decimals) only at the end, for display and history.
+# set_scale changes the scale for every thread; local_scale(n) changes it for a with block only,
+# like decimal.localcontext.
+
+import contextlib
+import decimal
+from contextvars import ContextVar
+from decimal import Decimal, ROUND_HALF_EVEN
+from typing import Tuple
+
+import numpy as np
+
+DEFAULT_SCALE = 6
+INT64_SAFE = 1 << 62  # operands and results stay in int64 below this magnitude
+MAX_DIGITS = 18  # digits (scale included) parsed in bulk; 10**18 < INT64_SAFE
+POWERS = 10 ** np.arange(MAX_DIGITS, dtype=np.int64)
+
+_default_scale = DEFAULT_SCALE  # every thread's scale outside local_scale blocks
+_scale = ContextVar('fixed_scale', default=None)
+
+
+def get_scale() -> int:
+    scale = _scale.get()
+    return _default_scale if scale is None else scale
+
+
+def set_scale(scale: int):
+    """Sets the number of decimals the fixed engine keeps"""
+    global _default_scale
+    if scale < 0:
+        raise ValueError(f"Scale must be 0 or more, not {scale}")
+    _default_scale = scale
+
+
+@contextlib.contextmanager
+def local_scale(scale: int = None):
+    """Uses scale for the fixed engine inside the with block (None keeps the current one)"""
+    if scale is not None and scale < 0:
+        raise ValueError(f"Scale must be 0 or more, not {scale}")
+    token = _scale.set(get_scale() if scale is None else scale)
+    try:
+        yield
+    finally:
+        _scale.reset(token)
+
+
+def to_fixed(value, scale: int = None) -> int:
+    """value (str, int or Decimal) as an integer count of 10**-scale units"""
+    scale = get_scale() if scale is None else scale
+    if isinstance(value, int):
+        return value * 10 ** scale
+    text = str(value).strip()
+    whole, _, fraction = text.partition('.')
+    if len(fraction) <= scale and (not fraction or fraction.isdigit()) and (whole.lstrip('+-') or fraction):
+        try:
+            return int(whole + fraction.ljust(scale, '0'))
+        except ValueError:
+            pass
+    # exponents, more decimals than the scale keeps, or not a number at all (Decimal raises)
+    number = Decimal(text)
+    if not number.is_finite():
+        raise ValueError(f"Invalid number for the fixed engine: {text}")
+    return int(number.scaleb(scale).to_integral_value(ROUND_HALF_EVEN))
+
+
+def to_decimal(value: int, scale: int = None) -> Decimal:
+    scale = get_scale() if scale is None else scale
+    return Decimal(value).scaleb(-scale)
+
+
+def evaluate(name: str, a_values, b_values) -> Tuple[np.ndarray, np.ndarray]:
+    """(scaled integer results, error mask) of a fixed-point operation over the operands"""
+    scale = get_scale()
+    a_array = _fixed_array(a_values, scale)
+    b_array = _fixed_array(b_values, scale)
+    if len(a_array) != len(b_array):
+        raise ValueError(f"Operand arrays differ in length: {len(a_array)} and {len(b_array)}")
+    errors = np.zeros(len(a_array), dtype=bool)
+    if name == 'divide':
+        errors = b_array == 0
+        if errors.any():
+            b_array = b_array.copy()
+            b_array[errors] = 1
+    results = OPERATIONS[name](a_array, b_array, 10 ** scale)
+    results[errors] = 0
+    return results, errors
+
+
+def to_decimal_array(results: np.ndarray, errors: np.ndarray, scale: int) -> np.ndarray:
+    """Scaled integer results as Decimal, None where errors is True: the one conversion back"""
+    # numpy runs int * Decimal in its C loop; MAX_PREC keeps the product exact whatever the context
+    with decimal.localcontext(prec=decimal.MAX_PREC):
+        decimals = results.astype(object) * Decimal(1).scaleb(-scale)
+    decimals[errors] = None
+    return decimals
+
+
+def from_decimal_array(results: np.ndarray, errors: np.ndarray) -> np.ndarray:
+    """Decimal results of an operation the engine has no integer version of, rounded to the scale"""
+    scale = get_scale()
+    ints = [0 if failed else to_fixed(value, scale) for value, failed in zip(results.tolist(), errors.tolist())]
+    return _int_array(ints, scale)
+
+
+def _add(a_array, b_array, unit):
+    a_array, b_array = _widen(a_array, b_array, _magnitude(a_array) + _magnitude(b_array))
+    return a_array + b_array
+
+
+def _subtract(a_array, b_array, unit):
+    a_array, b_array = _widen(a_array, b_array, _magnitude(a_array) + _magnitude(b_array))
+    return a_array - b_array
+
+
+def _multiply(a_array, b_array, unit):
+    a_largest, b_largest = _magnitude(a_array), _magnitude(b_array)
+    if a_largest * b_largest >= INT64_SAFE and b_largest * unit < INT64_SAFE \
+            and (a_largest // unit + 1) * b_largest < INT64_SAFE // 2:
+        # a * b overflows int64 but (whole units of a) * b and (rest of a) * b do not:
+        # a * b / unit = whole * b + rest * b / unit, only the second part needs rounding
+        whole, rest = np.divmod(a_array, unit)
+        return _divide_rounded(rest * b_array, unit, whole * b_array)
+    a_array, b_array = _widen(a_array, b_array, a_largest * b_largest)
+    return _divide_rounded(a_array * b_array, unit)
+
+
+def _divide(a_array, b_array, unit):
+    a_array, b_array = _widen(a_array, b_array, _magnitude(a_array) * unit)
+    return _divide_rounded(a_array * unit, b_array)
+
+
+OPERATIONS = {'add': _add, 'subtract': _subtract, 'multiply': _multiply, 'divide': _divide}
+
+
+def _divide_rounded(numerators, denominators, base=0):
+    # base + numerators / denominators to the nearest integer, ties to even; // floors, so the
+    # remainder has the denominator's sign and |remainder| / |denominator| is the fraction dropped
+    quotients = numerators // denominators
+    remainders = numerators - quotients * denominators
+    quotients = quotients + base
+    doubled = 2 * abs(remainders)
+    denominators = abs(denominators)
+    round_up = (doubled > denominators) | ((doubled == denominators) & (quotients % 2 == 1))
+    return np.where(round_up, quotients + 1, quotients)
+
+
+def _magnitude(array: np.ndarray) -> int:
+    return int(abs(array).max()) if len(array) else 0
+
+
+def _widen(a_array, b_array, bound: int):
+    # Python ints when the operation's intermediate values could overflow int64
+    if bound < INT64_SAFE:
+        return a_array, b_array
+    return a_array.astype(object), b_array.astype(object)
+
+
+def _fixed_array(values, scale: int) -> np.ndarray:
+    # operands as int64 when they fit, else as an object array of Python ints
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'iu':
+        if len(values) == 0 or int(abs(values).max()) * 10 ** scale < INT64_SAFE:
+            return values.astype(np.int64) * 10 ** scale
+        values = values.tolist()
+    values = np.asarray(values, dtype=str)  # Decimal, int and float operands through their text
+    ints, parsed = _parse_texts(values, scale)
+    if parsed.all():
+        return ints
+    # exponents, spaces, more decimals than the scale, values past int64, not numbers: one at a time
+    ints = ints.tolist()
+    for row in np.flatnonzero(~parsed).tolist():
+        ints[row] = to_fixed(values[row], scale)
+    return _int_array(ints, scale)
+
+
+def _parse_texts(texts: np.ndarray, scale: int) -> Tuple[np.ndarray, np.ndarray]:
+    # parses plain numbers ('-12.5') in bulk from the unicode array's code points, one character
+    # column at a time across all rows. Returns the values and a mask of the rows parsed; rows with
+    # anything else (exponents, spaces, too many digits) are left for to_fixed
+    rows, width = len(texts), texts.dtype.itemsize // 4
+    if rows == 0 or width == 0 or scale >= MAX_DIGITS:
+        return np.zeros(rows, dtype=np.int64), np.zeros(rows, dtype=bool)
+    columns = np.ascontiguousarray(texts.view(np.uint32).reshape(rows, width).T)  # padded with code point 0
+    values = np.zeros(rows, dtype=np.int64)
+    digit_count = np.zeros(rows, dtype=np.int64)
+    fraction = np.zeros(rows, dtype=np.int64)  # digits after the point
+    seen_point = np.zeros(rows, dtype=bool)
+    negative = columns[0] == 45
+    parsed = np.ones(rows, dtype=bool)
+    for index, codes in enumerate(columns):
+        offsets = codes - 48  # unsigned: anything below '0' wraps around to a large number
+        digits = offsets < 10
+        point = codes == 46
+        other = ~(digits | point | (codes == 0))
+        if index == 0:
+            other &= ~negative & (codes != 43)
+        parsed &= ~other & ~(point & seen_point)
+        # values = values * 10 + digit on digit rows (arithmetic masks beat np.where here);
+        # rows past MAX_DIGITS may wrap around, they are not parsed
+        step = digits.astype(np.int64)
+        values *= 1 + 9 * step
+        values += offsets * step
+        digit_count += step
+        fraction += digits & seen_point
+        seen_point |= point
+    parsed &= (digit_count > 0) & (fraction <= scale) & (digit_count - fraction + scale <= MAX_DIGITS)
+    values *= POWERS[np.clip(scale - fraction, 0, MAX_DIGITS - 1)]
+    values[negative] *= -1
+    values[~parsed] = 0
+    return values, parsed
+
+
+def _int_array(ints: list, scale: int) -> np.ndarray:
+    if 10 ** scale >= INT64_SAFE or ints and max(max(ints), -min(ints)) >= INT64_SAFE:
+        return np.array(ints, dtype=object)
+    return np.array(ints, dtype=np.int64)
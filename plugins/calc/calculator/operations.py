@@ -18,5 +18,11 @@ def divide (a: Decimal, b: Decimal) -> Decimal:
         raise ValueError("Cannot divide by zero.")
     return a / b;
 
-# def sqrt (a: Decimal) -> Decimal:
-#     return Decimal(a).sqrt()
\ No newline at end of file
+def sqrt (a: Decimal) -> Decimal:
+    # only operation with one operand; negative numbers have no (real) square root
+    # NaN and infinities are refused up front, comparing a NaN Decimal would raise InvalidOperation
+    if not Decimal(a).is_finite(): 
+        raise ValueError("Cannot take the square root of a non-finite number.")
+    if (a < 0): 
+        raise ValueError("Cannot take the square root of a negative number.")
+    return Decimal(a).sqrt()
\ No newline at end of file
@@ -0,0 +1,72 @@
+# Process-pool engine for Decimal batches too heavy for one core (e.g. divides at high precision).
+# Operands are cut into shards and each shard runs batch.evaluate(..., 'decimal') in a worker process,
+# so the Decimal arithmetic is not serialized by the GIL. Every worker starts with a copy of the
+# caller's Decimal context, so results match what the serial decimal engine gives under that context.
+# executor.map hands the shards back in submission order, so results stay in input order.
+# Operands and results cross the process boundary as lists of str: pickling Decimal objects one by
+# one costs several times more than sending their text and parsing it on the other side.
+
+import os
+import decimal
+from decimal import Decimal
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from plugins.calc.calculator.batch import BatchResult, evaluate
+from plugins.calc.calculator.registry import get_operation
+
+SHARDS_PER_WORKER = 4  # a few shards per worker so one slow shard does not leave the others idle
+
+
+def make_pool(workers: int = None, context: decimal.Context = None) -> ProcessPoolExecutor:
+    """A process pool whose workers all use context (default: the caller's current Decimal context)"""
+    # forkserver/spawn rather than fork: the app has autosave and compaction threads holding locks
+    methods = multiprocessing.get_all_start_methods()
+    start_method = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=start_method,
+                               initializer=_set_context, initargs=(context or decimal.getcontext().copy(),))
+
+
+def evaluate_parallel(operation, a_values, b_values=None, workers: int = None,
+                      context: decimal.Context = None, pool: ProcessPoolExecutor = None) -> BatchResult:
+    """batch.evaluate with the decimal engine, sharded across worker processes.
+    pass an existing pool to reuse its workers across calls, otherwise one is started for this call"""
+    spec = get_operation(operation)
+    if spec is None:
+        raise ValueError(f"Unknown operation: {getattr(operation, '__name__', operation)}")
+    operation = spec  # the Operation itself is sent, so workers need no registry lookup
+    a_values = list(map(str, a_values))
+    b_values = None if spec.arity == 1 else list(map(str, b_values))
+    if b_values is not None and len(a_values) != len(b_values):
+        raise ValueError(f"Operand arrays differ in length: {len(a_values)} and {len(b_values)}")
+    if pool is None:
+        with make_pool(workers, context) as own_pool:
+            return evaluate_parallel(operation, a_values, b_values, workers, pool=own_pool)
+
+    shards = (workers or os.cpu_count()) * SHARDS_PER_WORKER
+    bounds = np.linspace(0, len(a_values), shards + 1, dtype=int)
+    spans = [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+    parts = list(pool.map(_evaluate_shard, [operation] * len(spans),
+                          [a_values[start:stop] for start, stop in spans],
+                          [b_values and b_values[start:stop] for start, stop in spans]))
+    if not parts:
+        return evaluate(operation, [], [], 'decimal')
+    texts = [text for part_texts, _ in parts for text in part_texts]
+    results = np.fromiter(map(Decimal, texts), dtype=object, count=len(texts))
+    errors = np.concatenate([part_errors for _, part_errors in parts])
+    results[errors] = None
+    return BatchResult(results, errors)
+
+
+def _set_context(context: decimal.Context):
+    # runs once in every worker as it starts
+    decimal.setcontext(context)
+
+
+def _evaluate_shard(operation, a_values, b_values):
+    # failed pairs come back as 'NaN' so the parent can parse the whole list in one pass
+    results, errors, _ = evaluate(operation, a_values, b_values, 'decimal')
+    results[errors] = Decimal('NaN')
+    return list(map(str, results.tolist())), errors
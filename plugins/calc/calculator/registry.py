@@ -0,0 +1,93 @@
+# Operation registry: every operation the calculator knows, built once at import.
+# Each Operation carries its name, its history symbol, its arity, the scalar function Calculator
+# runs and a vectorized (numpy, element-wise) version for the batch engines. The registry is keyed
+# by name, by symbol and by scalar function, so any of them resolves to the operation in one lookup.
+# Plugins add operations with register_operation; calc, calc file, evaluate_many and history add
+# all read from here.
+# Plugin operations used with the process-pool engine must live in an importable module, since the
+# Operation is pickled to the workers.
+
+import sys
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from plugins.calc.calculator.operations import add, subtract, multiply, divide, sqrt
+
+
+class Operation(NamedTuple):
+    name: str
+    symbol: str  # written to the history table's operand column
+    arity: int  # 1 or 2 operands
+    scalar: Callable  # scalar(a) or scalar(a, b), raises ValueError on operands it cannot take
+    vectorized: Callable = None  # element-wise over float64 or Decimal object arrays, e.g. a numpy ufunc
+    invalid: Callable = None  # invalid(*arrays) -> bool mask of operands scalar would raise on
+
+
+_REGISTRY: Dict[object, Operation] = {}  # name, symbol and scalar function -> Operation
+_BY_NAME: Dict[str, Operation] = {}  # registration order, for listings
+
+
+def register_operation(name: str, symbol: str, scalar: Callable, arity: int = 2,
+                       vectorized: Callable = None, invalid: Callable = None) -> Operation:
+    """Adds an operation, or replaces the one already registered under name"""
+    if arity not in (1, 2):
+        raise ValueError(f"Operations take 1 or 2 operands, not {arity}")
+    for key in (name, symbol):
+        existing = _REGISTRY.get(key)
+        if existing is not None and existing.name != name:
+            raise ValueError(f"'{key}' is already used by the {existing.name} operation")
+    unregister_operation(name)
+    operation = Operation(name, symbol, arity, scalar, vectorized, invalid)
+    _REGISTRY.update({name: operation, symbol: operation, scalar: operation})
+    _BY_NAME[name] = operation
+    _forget_compiled()
+    return operation
+
+
+def unregister_operation(name: str):
+    """Removes an operation; unknown names are ignored"""
+    operation = _BY_NAME.pop(name, None)
+    if operation is not None:
+        for key in (operation.name, operation.symbol, operation.scalar):
+            _REGISTRY.pop(key, None)
+        _forget_compiled()
+
+
+def _forget_compiled():
+    # compiled expressions hold the Operation they were parsed with, so they are dropped whenever the
+    # registry changes; looked up in sys.modules since expression imports this module
+    expression = sys.modules.get('plugins.calc.calculator.expression')
+    if expression is not None:
+        expression.compile_expression.cache_clear()
+
+
+def get_operation(key) -> Optional[Operation]:
+    """The operation for a name, symbol or scalar function, or None"""
+    if isinstance(key, Operation):
+        return key
+    return _REGISTRY.get(key)
+
+
+def operations() -> List[Operation]:
+    """Every registered operation, in registration order"""
+    return list(_BY_NAME.values())
+
+
+def _divisor_is_zero(a_array, b_array):
+    return b_array == 0
+
+
+def _no_real_root(a_array):
+    # the rows sqrt raises on: negative or non-finite (Decimal NaNs cannot be compared, so checked first)
+    if a_array.dtype == object:
+        return np.fromiter((not a.is_finite() or a < 0 for a in a_array), dtype=bool, count=len(a_array))
+    return ~np.isfinite(a_array) | (a_array < 0)
+
+
+# numpy's ufuncs run on object arrays too, calling Decimal's own arithmetic (and Decimal.sqrt)
+register_operation('add', '+', add, vectorized=np.add)
+register_operation('subtract', '-', subtract, vectorized=np.subtract)
+register_operation('multiply', '*', multiply, vectorized=np.multiply)
+register_operation('divide', '/', divide, vectorized=np.divide, invalid=_divisor_is_zero)
+register_operation('sqrt', 'sqrt', sqrt, arity=1, vectorized=np.sqrt, invalid=_no_real_root)
@@ -1,5 +1,5 @@
-from commands import Command
+from commands import Command, emit
 class HelloCommand(Command):
 
     def execute(self):
-        print ("Hello, World!")
+        return emit('message', "Hello, World!")
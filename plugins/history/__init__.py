@@ -1,33 +1,49 @@
 from decimal import Decimal
 import sys
-from commands import Command 
+from commands import Command, emit, is_interactive, Arg, Subcommand, index, positive
 import data_store
 import os
 import pandas as pd
 import logging as log
+from plugins.history.storage import (refresh_rows, row_count, read_rows, last_row, delete_row, compact_rows,
+                                     clear_rows, save_history, convert as convert_file)
+from plugins.calc.calculator.registry import get_operation, operations
+
+PAGE_SIZE = 20  # rows printed by show/page when no count is given
 
 class HistoryCommand(Command): 
+    # subcommand -> method and typed arguments, compiled once (commands.schema); unknown names show the usage
+    subcommands = {
+        '': Subcommand('default_response'),
+        None: Subcommand('default_response', (Arg('args', rest=True),)),
+        'show': Subcommand('show', (Arg('start', index, optional=True), Arg('count', index, optional=True)),
+                           "Error: Usage history show [start] [count] with integer arguments"),
+        'head': Subcommand('head', (Arg('count', index, optional=True),), "Error: Usage history head [n] with an integer argument"),
+        'tail': Subcommand('tail', (Arg('count', index, optional=True),), "Error: Usage history tail [n] with an integer argument"),
+        'page': Subcommand('page', (Arg('size', positive, optional=True),), "Error: Usage history page [size] with an integer argument of 1 or more"),
+        'clear': Subcommand('clear', (Arg('args', rest=True),)),
+        'last': Subcommand('last', (Arg('args', rest=True),)),
+        'dummy': Subcommand('dummy', (Arg('args', rest=True),)),
+        'add': Subcommand('add', (Arg('num1'), Arg('sign'), Arg('num2'), Arg('result')),
+                          "Error: Incorrect arguments for 'history add': $> history add <num1> <sign> <num2> <result>"),
+        'save': Subcommand('save', (Arg('args', rest=True),)),
+        'delete': Subcommand('delete', (Arg('row', int, error="Error: Provided index is not an integer."),),
+                             "Error: Incorrect number of arguments for 'delete'. Usage history delete [row_num]"),
+        'compact': Subcommand('compact', (Arg('args', rest=True),)),
+        'reloadfile': Subcommand('reloadfile', (Arg('args', rest=True),)),
+        'convert': Subcommand('convert', (Arg('source'), Arg('destination')),
+                              "Error: Incorrect arguments for 'convert'. Usage history convert [src] [dst]"),
+    }
+
     def execute(self, *args):         
+        return self.dispatch(args)
 
-        if len(args) == 0: 
-            self.default_response()
-        else: 
-            # method/function dictionary
-            switchcase_dict = {
-                'show': self.show, 
-                'clear': self.clear, 
-                'last': self.last,
-                'dummy' : self.dummy,
-                'add' : self.add,
-                'save': self.save,
-                'delete': self.delete,
-                'reloadfile': self.reloadfile 
-            }
-            #get method from args and store that method in variable 'method'
-            method = switchcase_dict.get(args[0], self.default_response)
-
-            #execute that method
-            method(*args)
+    def call(self, method, values):
+        #execute that method, the autosave thread may be reading the table
+        with data_store.lock:
+            # shared history file: catch up on rows other processes appended first
+            refresh_rows()
+            return method(self, *values)
 
     
     def default_response(self, *args):
@@ -36,143 +52,221 @@ class HistoryCommand(Command):
             '     The history plugin used for interacting with the calculations stored in memory.\n'
             '\n'
             'Commands: \n'
-            '  show            prints out the dataframe table\n'
+            '  show [start] [count]  prints count rows (default 20) starting at row start\n'
+            '  head [n]        prints the first n rows\n'
+            '  tail [n]        prints the last n rows\n'
+            '  page [size]     pages through the table, enter for next page, q to quit\n'
             '  dummy           appends a dummy calculation of "5*4 = 20"\n'
             '  last            shows last calculation stored in the table\n'
             '  delete [num]    delete specified row from history\n'
+            '  compact         removes deleted rows for good, renumbering the rows after them\n'
             '  save            firm saves the table to the csv file location\n'
             '  reloadfile      reloads file from known history path\n'
             '  clear           empties the dataframe table\n'
+            '  convert [src] [dst]  converts a history file between .csv, .db (sqlite) and binary\n'
             '     usage:  history delete 1\n'
         )
-        print(message)
+        return emit('usage', message)
         
     
-    def show(self, *args): 
-        # shows dataframe output
+    def show(self, start=0, count=PAGE_SIZE): 
+        # shows one page of the table; only that slice is read, never the whole table
         try:
-            print(data_store.hist_df)
+            return self.emit_rows(start, start + count)
         except Exception as e:
             log.error(f"Error showing history: {e}")
 
+    def head(self, count=PAGE_SIZE):
+        # shows the first n rows
+        return self.emit_rows(0, count)
+
+    def tail(self, count=PAGE_SIZE):
+        # shows the last n rows
+        total = row_count()
+        return self.emit_rows(total - count, total)
+
+    def page(self, size=PAGE_SIZE):
+        # streams the table a page at a time until the end or 'q'; outside the REPL every page, no prompts
+        start = 0
+        while True:
+            self.emit_rows(start, start + size)
+            start += size
+            if start >= row_count():
+                break
+            if is_interactive() and input("-- enter for next page, q to quit -- ").strip().lower() == 'q':
+                break
+
+    def emit_rows(self, start, stop):
+        # rows [start, stop) of the full table plus where they sit in it
+        total = row_count()
+        start = min(max(start, 0), total)
+        stop = min(max(stop, start), total)
+        return emit('rows', {'start': start, 'stop': stop, 'total': total, 'rows': read_rows(start, stop)},
+                    self.format_rows)
+
+    @staticmethod
+    def format_rows(data):
+        # a slice past the end of a non-empty table gets a message, not an empty frame and a backwards range
+        if data['start'] >= data['stop'] and data['total']:
+            return f"No rows to show: the table has {data['total']} rows (0 to {data['total'] - 1})."
+        text = data['rows'].to_string()
+        if data['stop'] - data['start'] < data['total']:
+            text += f"\n-- rows {data['start']} to {data['stop'] - 1} of {data['total']} --"
+        return text
+
     def dummy(self, *args): 
         # insert dummy row
         new_row = {'num1': 5, 'operand': '*',  'num2': 4, 'result': 20}
-        data_store.hist_df.loc[len(data_store.hist_df)] = new_row
+        data_store.hist_buffer.append(new_row)
 
-        print("New Dummy calculation added: ")
-        print(new_row)
+        added = emit('added', new_row, lambda row: f"New Dummy calculation added: \n{row}")
 
         #autosave
-        self.save(*args)
+        self.autosave()
+        return added
 
 
     def last(self, *args):
         #retrieves last added calculation 
         try:
-            print(data_store.hist_df.iloc[-1])
+            row_index = last_row()
+            if row_index < 0:
+                raise IndexError
+            return emit('row', read_rows(row_index, row_index + 1).iloc[-1])
         except IndexError:
             log.error("Data frame is empty.")
     
 
-    def add(self, *args): 
-        # used by calc to save new data with args[0] = null
-        log.debug(args)
-        try: 
-            if (len(args) != 5): 
-                raise IndexError
-            elif (args[2] not in ['+', '-', '*', '/']):
-                raise ValueError
-            
-            new_row = {'num1': args[1] , 'operand': args[2],  'num2': args[3], 'result': args[4]}
-            data_store.hist_df.loc[len(data_store.hist_df)] = new_row
-            print("New calculation added: ")
-            print(new_row)
-
-            #autosave
-            self.save(*args)
-        except IndexError: 
-            log.error("Error: Incorrect arguments for 'history add': $> history add <num1> <sign> <num2> <result>")
-        except ValueError: 
-            log.error("Error: Invalid sign symbol for 'history add': sign= +, -, *, / ")
+    def add(self, num1, sign, num2, result): 
+        # used by calc to save new data
+        log.debug(('add', num1, sign, num2, result))
+        # the sign must be the symbol of a registered operation (calc.calculator.registry)
+        operation = get_operation(sign)
+        if operation is None or operation.symbol != sign:
+            signs = ', '.join(operation.symbol for operation in operations())
+            log.error(f"Error: Invalid sign symbol for 'history add': sign= {signs} ")
             return
+
+        new_row = {'num1': num1, 'operand': sign,  'num2': num2, 'result': result}
+        data_store.hist_buffer.append(new_row)
+        added = emit('added', new_row, lambda row: f"New calculation added: \n{row}")
+
+        #autosave
+        self.autosave()
+        return added
         
-    def delete (self, *args): 
-        #Deletes a specific row in the dataframe --> Resets indexes
-        log.debug(args)
+    def add_frame(self, df, save=False):
+        # bulk version of add: rows go straight into the buffer, saved by the caller unless save is set
+        # (calc file appends each chunk to the file as soon as it is done)
+        with data_store.lock:
+            refresh_rows()
+            data_store.hist_buffer.extend(df)
+            if save:
+                save_history(data_store.autosaver is not None and data_store.autosaver.fsync)
+        log.info(f"History - {len(df)} calculations added")
 
-        # If arguments dont match, then error
-        if len(args) != 2:
-            log.error("Error: Incorrect number of arguments for 'delete'. Usage history delete [row_num]")
+    def add_calculations(self, calculations):
+        # spill target for Calculations: evicted calculations the calc command has not written already
+        rows = []
+        for calculation in calculations:
+            if calculation.saved:
+                continue
+            try:
+                result = calculation.perform()
+            except ValueError:
+                continue  # divide by zero never makes it into history
+            operation = get_operation(calculation.operation)
+            num2 = '' if calculation.b is None else str(calculation.b)
+            rows.append((str(calculation.a), operation.symbol, num2, str(result)))
+        if not rows:
             return
-        
+        self.add_frame(pd.DataFrame(rows, columns=['num1', 'operand', 'num2', 'result']))
+
+        # write-behind policy: let the autosave thread pick them up, otherwise save now
+        if data_store.autosaver is not None:
+            data_store.autosaver.notify()
+        else:
+            with data_store.lock:
+                save_history()
+
+    def delete (self, row_index): 
+        #Deletes a specific row in the dataframe --> row is tombstoned, numbers stay put until compact
+        log.debug(('delete', row_index))
+
         # If dataframe is empty, cannot delete anything
-        if data_store.hist_df.empty:
+        if row_count() == 0:
             log.error("Error: Table is empty, no rows to delete.")
             return
         
         try:
-            # Get row index from parameter
-            row_index = int(args[1])
-
-            # Delete specific row and reset/drop old index column
-            data_store.hist_df.drop(index=row_index, inplace=True)
-            data_store.hist_df.reset_index(drop=True, inplace=True)
-            print(f"Row {row_index} deleted successfully.")
+            # Mark the row deleted, it is only removed from the file on compaction
+            delete_row(row_index)
+            deleted = emit('deleted', {'row': row_index}, lambda data: f"Row {data['row']} deleted successfully.")
 
             #autosave
-            self.save()
-        except ValueError:
-            log.error("Error: Provided index is not an integer.")
-            return
+            self.autosave()
+            return deleted
         except KeyError:
             log.error(f"Error: No row found at index {row_index}.")
             return
 
+    def compact(self, *args):
+        # removes tombstoned rows for good; otherwise only done on exit, so row numbers never shift under the user
+        try:
+            removed = compact_rows()
+            return emit('compacted', {'removed': removed}, lambda data: f"Compacted history, {data['removed']} deleted rows removed.")
+        except Exception as e:
+            log.error(f"History - Error compacting history: {e}")
+
+    def autosave(self):
+        # The file is only appended to (deletes go to its sidecar), either now or by the autosave thread
+        if data_store.autosaver is not None:
+            data_store.autosaver.notify()
+            return
+        self.save()
+
     def save(self, *args):
         #Saves file to local 
-        my_df = data_store.hist_df
-        my_df.to_csv(data_store.hist_path, index=False)
-        print("!! Saved to File !!\n")
+        fsync = data_store.autosaver is not None and data_store.autosaver.fsync
+        save_history(fsync)
         log.info("File saved")
+        return emit('saved', {'path': data_store.hist_path}, lambda _: "!! Saved to File !!\n")
 
     def reloadfile(self, *args):
-        # Reloads the CSV file from local into memory
+        # Reloads the history file from disk, dropping rows that were not saved yet
         try:
-            #Read file from memory
-            data_store.hist_df = pd.read_csv(data_store.hist_path)
-            log.info("File read successfully")
-
-            # Resetting the index in case there are gaps from previous operations
-            data_store.hist_df.reset_index(drop=True, inplace=True)
-            
-            # Now its successful
-            print("Data successfully reloaded from file.")
+            if not os.path.exists(data_store.hist_cold.path):
+                log.error(f"File not found at {data_store.hist_path}. Ensure the file path is correct.")
+                return
+            # rows are paged in on demand; an empty csv gets its header back, a tail cut short by a crash is dropped
+            data_store.hist_cold.open()
+            data_store.hist_df = data_store.hist_df[0:0]
+            data_store.hist_buffer.clear()
+            data_store.hist_tombstones.load()
             log.info("File reloaded")
-
-            self.show()
-        except FileNotFoundError:
-            log.error(f"File not found at {data_store.hist_path}. Ensure the file path is correct.")
-        except pd.errors.EmptyDataError:
-            log.error("File is empty. Starting with an empty DataFrame.")
-            #resetting dataframe to ensure columns exist at all times
-            columns = ['num1', 'operand', 'num2', 'result']
-            data_store.hist_df = pd.DataFrame(columns=columns)  # Creating an empty DataFrame
-            log.info("New History dataframe created")
-
-            #autosave
-            self.save(*args)
+            emit('message', "Data successfully reloaded from file.")
+            return self.show()
         except Exception as e:
             log.error(f"An error occurred while reloading from file: {e}")
 
     def clear(self, *args):
         #empties dataframe and saves
         try:
-            data_store.hist_df = data_store.hist_df[0:0]  # Clearing the DataFrame
+            clear_rows()  # Clearing the DataFrame
             log.info("History - Dataframe cleared")
-            print("Cleared history dataframe!")
+            cleared = emit('message', "Cleared history dataframe!")
 
             #autosave
-            self.save(*args)
+            self.autosave()
+            return cleared
         except Exception as e:
-            log.error(f"History - Error clearing history: {e}")
\ No newline at end of file
+            log.error(f"History - Error clearing history: {e}")
+
+    def convert(self, source, destination):
+        # converts a history file between the csv, sqlite and binary formats
+        try:
+            rows = convert_file(source, destination)
+            return emit('converted', {'rows': rows, 'source': source, 'destination': destination},
+                        lambda data: f"Converted {data['rows']} rows from {data['source']} to {data['destination']}")
+        except (OSError, ValueError) as e:
+            log.error(f"Error converting history file: {e}")
\ No newline at end of file
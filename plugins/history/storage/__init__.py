@@ -0,0 +1,13 @@
+from plugins.history.storage.snapshot import write_snapshot, read_manifest, recover_snapshot
+from plugins.history.storage.buffer import HistoryBuffer, OPERANDS
+from plugins.history.storage.engine import HistoryEngine, COLUMNS
+from plugins.history.storage.binary import BinaryHistory
+from plugins.history.storage.sqlite import SQLiteHistory
+from plugins.history.storage.convert import convert, history_format
+from plugins.history.storage.loader import ChunkedCSV
+from plugins.history.storage.tombstones import Tombstones
+from plugins.history.storage.locking import file_lock
+from plugins.history.storage.table import (locked_rows, refresh_rows, current_frame, row_count, live_count,
+                                           read_rows, full_frame, last_row, delete_row, compact_rows, clear_rows,
+                                           save_history)
+from plugins.history.storage.autosave import Autosaver, flush_history, POLICIES
@@ -0,0 +1,86 @@
+# Write-behind autosave for the history table.
+# Mutations only notify the Autosaver; a background thread coalesces them into a single
+# flush so the REPL never waits on the disk.
+
+import contextvars
+import threading
+import logging as log
+
+import data_store
+from plugins.history.storage.table import save_history
+
+# sync     = flush inline after every mutation (the original behaviour)
+# ops      = flush in the background once every N mutations
+# interval = flush in the background every T milliseconds if anything changed
+# exit     = only flush when the program ends
+POLICIES = ['sync', 'ops', 'interval', 'exit']
+
+
+def flush_history(fsync: bool = False):
+    """Writes pending history mutations to disk. Runs on the autosave thread"""
+    with data_store.lock:
+        save_history(fsync)
+    log.debug("Autosave: history flushed")
+
+
+class Autosaver:
+    def __init__(self, flush=flush_history, policy: str = 'ops', every_ops: int = 100, every_ms: int = 1000, fsync: bool = False):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown autosave policy: {policy}")
+        self.flush = flush
+        self.policy = policy
+        self.every_ops = every_ops
+        self.every_ms = every_ms
+        self.fsync = fsync
+        self.pending = 0  # mutations since the last flush
+        self._wake = threading.Condition()
+        self._closed = False
+        self._thread = None
+        if policy in ['ops', 'interval']:
+            # the thread runs in the creating session's context, so it flushes that session's history
+            self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._run,),
+                                            name='history-autosave', daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """Called after every history mutation"""
+        if self.policy == 'sync':
+            self._flush()
+            return
+        with self._wake:
+            self.pending += 1
+            if self.policy == 'ops' and self.pending >= self.every_ops:
+                self._wake.notify()
+
+    def _run(self):
+        # background flusher loop
+        timeout = self.every_ms / 1000 if self.policy == 'interval' else None
+        while True:
+            with self._wake:
+                if self.policy == 'ops':
+                    self._wake.wait_for(lambda: self._closed or self.pending >= self.every_ops)
+                else:
+                    self._wake.wait(timeout)
+                if self._closed:
+                    return
+                if self.pending == 0:
+                    continue
+                self.pending = 0
+            self._flush()
+
+    def _flush(self):
+        try:
+            self.flush(self.fsync)
+        except Exception as e:
+            log.error(f"Autosave: error flushing history: {e}")
+
+    def close(self):
+        """Stops the flusher thread and writes anything still pending"""
+        with self._wake:
+            self._closed = True
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join()
+        if self.pending:
+            self.pending = 0
+            self._flush()
@@ -0,0 +1,155 @@
+# Typed binary history format.
+# The history file is a short header followed by fixed-width numpy structured records.
+# The operand is a uint8 code; num1/num2/result are (offset, length) pointers into a string heap
+# kept next to it in <history file>.heap, so Decimal values round trip exactly.
+# Both files are opened with np.memmap: opening is O(1) and rows are only paged in when read.
+# Operand codes index the file's own symbol list in <history file>.operands (json), so symbols of
+# registered operations keep their meaning whichever order a later process registers them in.
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from plugins.history.storage.buffer import OPERANDS
+from plugins.history.storage.engine import COLUMNS, HistoryEngine
+
+MAGIC = b'CALCHST1'
+HEADER_SIZE = len(MAGIC)
+
+VALUE = np.dtype([('offset', '<u8'), ('length', '<u4')])
+RECORD = np.dtype([('num1', VALUE), ('operand', 'u1'), ('num2', VALUE), ('result', VALUE)])
+VALUE_COLUMNS = ['num1', 'num2', 'result']
+
+BUILTIN_OPERANDS = OPERANDS[:4]  # the codes files written before the .operands list used
+
+
+class BinaryHistory(HistoryEngine):
+    def __init__(self, path: str):
+        self.path = path
+        self.heap_path = path + '.heap'
+        self.operands_path = path + '.operands'
+        if not os.path.exists(path):
+            self.truncate()
+        else:
+            self.open()
+
+    def open(self):
+        """(Re)maps the files; nothing is read until rows are asked for"""
+        with open(self.path, 'rb') as records_file:
+            if records_file.read(HEADER_SIZE) != MAGIC:
+                raise ValueError(f"{self.path} is not a binary history file")
+
+        try:
+            with open(self.operands_path, encoding='utf-8') as operands_file:
+                self.operands = json.load(operands_file)
+        except FileNotFoundError:
+            self.operands = list(BUILTIN_OPERANDS)
+        self.operand_lookup = np.array(self.operands, dtype=object)
+
+        # a partial trailing record left by a crash is ignored
+        self.count = (os.path.getsize(self.path) - HEADER_SIZE) // RECORD.itemsize
+        self.heap_size = os.path.getsize(self.heap_path) if os.path.exists(self.heap_path) else 0
+        if self.count:
+            self.records = np.memmap(self.path, dtype=RECORD, mode='r', offset=HEADER_SIZE, shape=(self.count,))
+        else:
+            self.records = np.empty(0, dtype=RECORD)
+        if self.heap_size:
+            self.heap = np.memmap(self.heap_path, dtype=np.uint8, mode='r')
+        else:
+            self.heap = np.empty(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def rows(self, start: int, stop: int) -> pd.DataFrame:
+        """Reads rows [start, stop) into a dataframe indexed by row number"""
+        chunk = self.records[start:stop]
+        heap = self.heap
+        data = {}
+        for column in COLUMNS:
+            if column == 'operand':
+                data[column] = self.operand_lookup[chunk['operand']]
+                continue
+            offsets = chunk[column]['offset'].tolist()
+            lengths = chunk[column]['length'].tolist()
+            data[column] = [heap[offset:offset + length].tobytes().decode('utf-8') for offset, length in zip(offsets, lengths)]
+        first = min(start, self.count)
+        return pd.DataFrame(data, columns=COLUMNS, index=range(first, first + len(chunk)))
+
+    def append_frame(self, df: pd.DataFrame, fsync: bool = False):
+        """Appends the dataframe's rows to the end of the file"""
+        if len(df) == 0:
+            return
+
+        # remap first so rows and heap bytes other processes appended are accounted for
+        self.open()
+        aligned = HEADER_SIZE + self.count * RECORD.itemsize
+        if os.path.getsize(self.path) != aligned:
+            # a record cut short by a crashed writer would misalign every record after it
+            os.truncate(self.path, aligned)
+
+        signs = df['operand'].tolist()
+        new_signs = [sign for sign in dict.fromkeys(signs) if sign not in self.operands]
+        if new_signs:
+            # the symbol list is written before any record that uses the new codes
+            if len(self.operands) + len(new_signs) > 256:
+                raise ValueError(f"No operand code left for {new_signs[0]}")
+            self._write_operands(self.operands + new_signs, fsync)
+            self.open()
+        codes = {sign: code for code, sign in enumerate(self.operands)}
+        records = np.zeros(len(df), dtype=RECORD)
+        records['operand'] = [codes[sign] for sign in signs]
+        heap_parts = []
+        offset = self.heap_size
+        for column in VALUE_COLUMNS:
+            encoded = [str(value).encode('utf-8') for value in df[column].tolist()]
+            lengths = np.fromiter(map(len, encoded), dtype='<u4', count=len(encoded))
+            records[column]['offset'] = offset + np.cumsum(lengths, dtype='<u8') - lengths
+            records[column]['length'] = lengths
+            heap_parts.append(b''.join(encoded))
+            offset += int(lengths.sum())
+
+        # heap first: a crash in between leaves unreferenced heap bytes, never dangling records
+        self._append_bytes(self.heap_path, b''.join(heap_parts), fsync)
+        self._append_bytes(self.path, records.tobytes(), fsync)
+        self.open()
+
+    def rewrite(self, chunks):
+        """Replaces the file's contents with the given dataframes, written to a temp file first"""
+        replacement = BinaryHistory(self.path + '.tmp')
+        replacement.truncate()
+        for chunk in chunks:
+            replacement.append_frame(chunk, self.fsync)
+        os.replace(replacement.path, self.path)
+        os.replace(replacement.heap_path, self.heap_path)
+        os.replace(replacement.operands_path, self.operands_path)
+        self.open()
+
+    def truncate(self):
+        """Empties the history, leaving just the header"""
+        with open(self.path, 'wb') as records_file:
+            records_file.write(MAGIC)
+        with open(self.heap_path, 'wb'):
+            pass
+        self._write_operands(BUILTIN_OPERANDS, False)
+        self.open()
+
+    def _write_operands(self, operands: list, fsync: bool):
+        temp_path = self.operands_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as operands_file:
+            json.dump(operands, operands_file)
+            if fsync:
+                operands_file.flush()
+                os.fsync(operands_file.fileno())
+        os.replace(temp_path, self.operands_path)
+
+    @staticmethod
+    def _append_bytes(path: str, data: bytes, fsync: bool):
+        with open(path, 'ab') as data_file:
+            data_file.write(data)
+            if fsync:
+                data_file.flush()
+                os.fsync(data_file.fileno())
+
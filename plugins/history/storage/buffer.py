@@ -0,0 +1,112 @@
+# Columnar append buffer for the history table.
+# Appending to a dataframe with hist_df.loc[len(hist_df)] reallocates it on every row, so new
+# rows are kept in preallocated column arrays instead and only turned into a dataframe
+# when something actually needs one (show, last, save, ...).
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from plugins.history.storage.engine import COLUMNS
+
+# operand column is stored as a uint8 code into this list; symbols of operations registered
+# later (sqrt, plugin operations) get the next free code the first time they are stored
+OPERANDS = ['+', '-', '*', '/']
+_OPERAND_CODES = {sign: code for code, sign in enumerate(OPERANDS)}
+_OPERAND_LOOKUP = np.array(OPERANDS, dtype=object)
+_codes_lock = threading.Lock()
+
+
+def operand_code(sign: str) -> int:
+    """The buffer's code for an operand symbol, assigning one if the symbol is new"""
+    global _OPERAND_LOOKUP
+    code = _OPERAND_CODES.get(sign)
+    if code is not None:
+        return code
+    with _codes_lock:
+        if sign not in _OPERAND_CODES:
+            if len(OPERANDS) == 256:
+                raise ValueError(f"No operand code left for {sign}")
+            OPERANDS.append(sign)
+            _OPERAND_LOOKUP = np.array(OPERANDS, dtype=object)
+            _OPERAND_CODES[sign] = len(OPERANDS) - 1
+        return _OPERAND_CODES[sign]
+
+
+class HistoryBuffer:
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        self.num1 = np.empty(capacity, dtype=object)
+        self.operand = np.empty(capacity, dtype=np.uint8)
+        self.num2 = np.empty(capacity, dtype=object)
+        self.result = np.empty(capacity, dtype=object)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def capacity(self) -> int:
+        return len(self.operand)
+
+    def append(self, row: dict):
+        """Appends one row in amortized O(1)"""
+        if self.size == self.capacity():
+            self._grow()
+        index = self.size
+        self.num1[index] = row['num1']
+        self.operand[index] = operand_code(row['operand'])
+        self.num2[index] = row['num2']
+        self.result[index] = row['result']
+        self.size += 1
+
+    def extend(self, df: pd.DataFrame):
+        """Appends every row of a dataframe with one copy per column"""
+        codes = df['operand'].map(_OPERAND_CODES)
+        if codes.isna().any():
+            for sign in df['operand'][codes.isna()].unique():
+                operand_code(sign)
+            codes = df['operand'].map(_OPERAND_CODES)
+        while self.size + len(df) > self.capacity():
+            self._grow()
+        rows = slice(self.size, self.size + len(df))
+        self.num1[rows] = df['num1'].to_numpy(dtype=object)
+        self.operand[rows] = codes.to_numpy(dtype=np.uint8)
+        self.num2[rows] = df['num2'].to_numpy(dtype=object)
+        self.result[rows] = df['result'].to_numpy(dtype=object)
+        self.size += len(df)
+
+    def _grow(self):
+        # doubling keeps the total copy cost linear in the number of appends
+        old = (self.num1, self.operand, self.num2, self.result)
+        self._allocate(self.capacity() * 2)
+        for new_column, old_column in zip((self.num1, self.operand, self.num2, self.result), old):
+            new_column[:self.size] = old_column[:self.size]
+
+    def to_frame(self) -> pd.DataFrame:
+        """Builds a dataframe of the buffered rows"""
+        # copies, the arrays get reused once the buffer is cleared
+        size = self.size
+        return pd.DataFrame({
+            'num1': self.num1[:size].copy(),
+            'operand': _OPERAND_LOOKUP[self.operand[:size]],
+            'num2': self.num2[:size].copy(),
+            'result': self.result[:size].copy(),
+        }, columns=COLUMNS)
+
+    def fold_into(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Returns df with the buffered rows appended, and empties the buffer"""
+        tail = self.to_frame()
+        self.clear()
+        if len(df) == 0:
+            return tail
+        return pd.concat([df, tail], ignore_index=True)
+
+    def clear(self):
+        # keeps the allocated arrays, drops references to the old values
+        self.num1[:self.size] = None
+        self.num2[:self.size] = None
+        self.result[:self.size] = None
+        self.size = 0
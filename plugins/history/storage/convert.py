@@ -0,0 +1,103 @@
+# Converts history files between the csv, binary and sqlite formats, a chunk at a time.
+# The format is picked from the file extension: .csv, .db/.sqlite/.sqlite3, anything else is binary.
+# The source is checked before anything is written, and the copy is built in <destination>.tmp and
+# renamed over the destination at the end, so a failed convert leaves an existing destination as it was.
+
+import os
+
+import pandas as pd
+
+from plugins.history.storage.engine import COLUMNS
+from plugins.history.storage.binary import BinaryHistory, MAGIC
+from plugins.history.storage.sqlite import SQLiteHistory
+
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+SQLITE_MAGIC = b'SQLite format 3\x00'
+
+
+def history_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in SQLITE_EXTENSIONS:
+        return 'sqlite'
+    return 'binary'
+
+
+def _read_chunks(path: str, chunksize: int):
+    if history_format(path) == 'csv':
+        yield from pd.read_csv(path, dtype=str, chunksize=chunksize)
+        return
+    source = BinaryHistory(path) if history_format(path) == 'binary' else SQLiteHistory(path)
+    try:
+        for start in range(0, len(source), chunksize):
+            yield source.rows(start, start + chunksize)
+    finally:
+        source.close()
+
+
+def check_source(path: str):
+    """Raises FileNotFoundError or ValueError unless path is a history file in its extension's format"""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"No history file at {path}")
+    file_format = history_format(path)
+    if file_format == 'csv':
+        if list(pd.read_csv(path, nrows=0).columns) != COLUMNS:
+            raise ValueError(f"{path} is not a csv history file (columns {','.join(COLUMNS)})")
+        return
+    magic = MAGIC if file_format == 'binary' else SQLITE_MAGIC
+    with open(path, 'rb') as source_file:
+        if source_file.read(len(magic)) != magic:
+            raise ValueError(f"{path} is not a {file_format} history file")
+
+
+def convert(src: str, dst: str, chunksize: int = 100_000) -> int:
+    """Converts a history file to another format. Returns the row count"""
+    if history_format(src) == history_format(dst):
+        raise ValueError("Convert needs two different history formats (.csv, binary, .db)")
+    check_source(src)
+
+    temp_path = dst + '.tmp'
+    try:
+        rows = _write_copy(src, temp_path, history_format(dst), chunksize)
+        if history_format(dst) == 'binary':
+            os.replace(temp_path + '.heap', dst + '.heap')
+            os.replace(temp_path + '.operands', dst + '.operands')
+        elif history_format(dst) == 'sqlite':
+            # a write-ahead log left next to the old file must not be replayed into the new one
+            for suffix in ('-wal', '-shm'):
+                _remove(dst + suffix)
+        os.replace(temp_path, dst)
+    finally:
+        for suffix in ('', '.heap', '.operands', '-wal', '-shm'):
+            _remove(temp_path + suffix)
+    return rows
+
+
+def _write_copy(src: str, path: str, file_format: str, chunksize: int) -> int:
+    rows = 0
+    if file_format == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as csv_file:
+            pd.DataFrame(columns=COLUMNS).to_csv(csv_file, index=False)
+            for chunk in _read_chunks(src, chunksize):
+                chunk.to_csv(csv_file, header=False, index=False)
+                rows += len(chunk)
+        return rows
+
+    _remove(path)  # a temp file left by an earlier failed convert
+    target = BinaryHistory(path) if file_format == 'binary' else SQLiteHistory(path)
+    try:
+        target.truncate()
+        for chunk in _read_chunks(src, chunksize):
+            target.append_frame(chunk)
+            rows += len(chunk)
+    finally:
+        target.close()
+    return rows
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,52 @@
+# Storage engine interface for history files.
+# An engine owns the rows that live on disk (data_store.hist_cold); storage.table puts the resident
+# dataframe and the append buffer on top of it. Row numbers are positions, 0 .. len(engine) - 1.
+# Engines: ChunkedCSV (csv + pandas), BinaryHistory (memory-mapped records), SQLiteHistory (sqlite3).
+# Every history file is opened through one (App.open_engine), so the table code never branches on the format.
+
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+COLUMNS = ['num1', 'operand', 'num2', 'result']  # every engine's rows, in this order
+
+
+class HistoryEngine(ABC):
+    path: str
+    shared = False  # other processes append to the same file, see storage.table.locked_rows
+    fsync = False  # rewrite and truncate force the new file and its rename to disk (HIST_FSYNC)
+
+
+    @abstractmethod
+    def open(self):
+        """(Re)opens the file, picking up anything written to it since"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def rows(self, start: int, stop: int) -> pd.DataFrame:
+        """Reads rows [start, stop) into a dataframe indexed by row number"""
+
+    @abstractmethod
+    def append_frame(self, df: pd.DataFrame, fsync: bool = False):
+        """Appends the dataframe's rows after the last row"""
+
+    @abstractmethod
+    def rewrite(self, chunks):
+        """Replaces every row with the given dataframes, renumbering from 0"""
+
+    @abstractmethod
+    def truncate(self):
+        """Removes every row"""
+
+    def refresh(self):
+        """Picks up rows other processes appended, reopening by default"""
+        self.open()
+
+    def to_frame(self) -> pd.DataFrame:
+        return self.rows(0, len(self))
+
+    def close(self):
+        """Releases anything held open, nothing by default"""
@@ -0,0 +1,204 @@
+# Streaming loader for large csv history files.
+# Instead of reading the whole csv with one pd.read_csv call, the file is scanned once to count
+# rows and remember the byte offset of every chunk, then only the most recent `window` rows are
+# parsed and kept resident. Older rows stay on disk and are read a chunk at a time on demand.
+# With no window every row is resident: that is the default csv history file, appended to and never
+# rewritten except by compaction.
+# Assumes one history row per line (no quoted newlines), which is what to_csv writes for this table.
+
+import os
+import time
+import logging as log
+
+import numpy as np
+import pandas as pd
+
+from plugins.history.storage.engine import COLUMNS, HistoryEngine
+from plugins.history.storage.snapshot import recover_snapshot, snapshot_file
+
+SCAN_BLOCK = 1 << 24  # bytes read per step while indexing the file
+CSV_OPTIONS = {'header': None, 'names': COLUMNS, 'dtype': str, 'engine': 'c'}
+
+
+class ChunkedCSV(HistoryEngine):
+    def __init__(self, path: str, window: int = None, chunksize: int = 100_000):
+        self.path = path
+        self.window = window  # most recent rows kept in memory, None for all of them
+        self.chunksize = chunksize  # rows per indexed chunk
+        self.open()
+
+    def open(self):
+        """Indexes the file and loads the resident window"""
+        started = time.perf_counter()
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            self.truncate()
+            return
+        recover_snapshot(self.path)  # only does anything if the file was last written as a snapshot
+        self._drop_partial_row()
+        self.inode = os.stat(self.path).st_ino
+
+        with open(self.path, 'rb') as csv_file:
+            header_end = len(csv_file.readline())
+        self.offsets = [header_end]  # byte offset of row 0, chunksize, 2*chunksize, ...
+        self.count = 0
+        self._scan(header_end)
+        log.info(f"History File: indexed {self.count} rows ({os.path.getsize(self.path) / 1e6:.1f} MB) "
+                 f"in {time.perf_counter() - started:.2f}s")
+
+        self._tail = self._read_disk(self._window_start(self.count), self.count)
+        self._appended = []
+        self._appended_rows = 0
+        log.info(f"History File: {len(self._tail)} recent rows resident, {self.tail_start} left on disk "
+                 f"({time.perf_counter() - started:.2f}s)")
+
+    def _scan(self, offset: int):
+        # counts rows from offset to the end of the file, recording where each chunk starts
+        with open(self.path, 'rb') as csv_file:
+            csv_file.seek(offset)
+            while True:
+                block = csv_file.read(SCAN_BLOCK)
+                if not block:
+                    break
+                newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10)
+                # the row after the i-th newline is row number count + i + 1
+                next_rows = self.count + 1 + np.arange(len(newlines))
+                starts = offset + newlines + 1
+                self.offsets.extend(starts[next_rows % self.chunksize == 0].tolist())
+                self.count += len(newlines)
+                offset += len(block)
+                log.debug(f"History File: indexed {self.count} rows")
+        self.end = offset  # bytes indexed so far
+
+    def _window_start(self, count: int) -> int:
+        # first resident row when the file holds count rows
+        return 0 if self.window is None else max(count - self.window, 0)
+
+    @property
+    def tail_start(self) -> int:
+        return self._window_start(self.count)
+
+    @property
+    def tail(self) -> pd.DataFrame:
+        """The resident rows, with the ones appended since it was last read folded in"""
+        self._fold_appended()
+        return self._tail
+
+    def _fold_appended(self):
+        if self._appended:
+            parts = [self._tail, *self._appended] if len(self._tail) else self._appended
+            self._tail = pd.concat(parts) if len(parts) > 1 else parts[0]
+            self._appended = []
+            self._appended_rows = 0
+            if self.window is not None and len(self._tail) > self.window:
+                self._tail = self._tail.iloc[len(self._tail) - self.window:]
+
+    def _drop_partial_row(self):
+        # a row cut short by a crash has no trailing newline; appending after it would corrupt the next row
+        with open(self.path, 'rb+') as csv_file:
+            csv_file.seek(0, os.SEEK_END)
+            size = csv_file.tell()
+            position = size
+            while position > 0:
+                step = min(4096, position)
+                csv_file.seek(position - step)
+                block = csv_file.read(step)
+                newline = block.rfind(b'\n')
+                if newline != -1:
+                    position = position - step + newline + 1
+                    break
+                position -= step
+            if position != size:
+                log.error(f"History File: dropping {size - position} bytes of a partial row")
+                csv_file.truncate(position)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def rows(self, start: int, stop: int) -> pd.DataFrame:
+        """Reads rows [start, stop), from the resident window when possible"""
+        start, stop = max(start, 0), min(stop, self.count)
+        if start >= self.tail_start:
+            return self.tail.iloc[start - self.tail_start:max(stop - self.tail_start, 0)]
+        if stop <= self.tail_start:
+            return self._read_disk(start, stop)
+        return pd.concat([self._read_disk(start, self.tail_start), self.tail.iloc[:stop - self.tail_start]])
+
+    def _read_disk(self, start: int, stop: int) -> pd.DataFrame:
+        # seeks to the chunk holding start, then parses only the rows asked for
+        if stop <= start:
+            return pd.DataFrame(columns=COLUMNS, index=range(start, start))
+        chunk = start // self.chunksize
+        parts = []
+        with open(self.path, 'rb') as csv_file:
+            csv_file.seek(self.offsets[chunk])
+            reader = pd.read_csv(csv_file, skiprows=start - chunk * self.chunksize, nrows=stop - start,
+                                 chunksize=self.chunksize, **CSV_OPTIONS)
+            for part in reader:
+                parts.append(part)
+        df = pd.concat(parts) if len(parts) > 1 else parts[0]
+        return df.set_axis(range(start, start + len(df)))
+
+    def iter_chunks(self):
+        """Yields the whole file a chunk at a time"""
+        for start in range(0, self.count, self.chunksize):
+            yield self.rows(start, start + self.chunksize)
+
+    def to_frame(self) -> pd.DataFrame:
+        if self.count == 0:
+            return self.tail
+        return pd.concat(list(self.iter_chunks()))
+
+    def append_frame(self, df: pd.DataFrame, fsync: bool = False):
+        """Appends rows to the end of the file and the resident window"""
+        if len(df) == 0:
+            return
+        offset = os.path.getsize(self.path)
+        with open(self.path, 'a', newline='', encoding='utf-8') as csv_file:
+            df.to_csv(csv_file, header=False, index=False)
+            if fsync:
+                csv_file.flush()
+                os.fsync(csv_file.fileno())
+
+        first = self.count
+        self._scan(offset)
+        self._extend_tail(df.astype(str).set_axis(range(first, first + len(df))))
+
+    def refresh(self):
+        """Picks up rows other processes appended, scanning only the bytes past the last known end"""
+        stat = os.stat(self.path)
+        if stat.st_ino != self.inode or stat.st_size < self.end:
+            self.open()  # replaced by a compaction or truncated: start over
+            return
+        if stat.st_size == self.end:
+            return
+        first = self.count
+        self._scan(self.end)
+        self._extend_tail(self._read_disk(max(first, self._window_start(self.count)), self.count))
+
+    def _extend_tail(self, appended: pd.DataFrame):
+        # newly appended rows join the resident window the next time it is read, so appending does not
+        # copy the rows already resident; a bounded window folds them in once they would fill it
+        self._appended.append(appended)
+        self._appended_rows += len(appended)
+        if self.window is not None and self._appended_rows >= self.window:
+            self._fold_appended()
+
+    def rewrite(self, chunks):
+        """Replaces the file's contents with the given dataframes, as a checksummed snapshot"""
+        with snapshot_file(self.path, self.fsync) as csv_file:
+            pd.DataFrame(columns=COLUMNS).to_csv(csv_file, index=False)
+            for chunk in chunks:
+                chunk.to_csv(csv_file, header=False, index=False)
+        self.open()
+
+    def truncate(self):
+        """Empties the history, leaving just the header"""
+        with snapshot_file(self.path, self.fsync) as csv_file:
+            pd.DataFrame(columns=COLUMNS).to_csv(csv_file, index=False)
+        self.inode = os.stat(self.path).st_ino
+        self.end = os.path.getsize(self.path)
+        self.offsets = [self.end]
+        self.count = 0
+        self._tail = pd.DataFrame(columns=COLUMNS)
+        self._appended = []
+        self._appended_rows = 0
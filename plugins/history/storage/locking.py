@@ -0,0 +1,17 @@
+# Cross-process lock for history files shared by several running apps (HIST_SHARED=on).
+# fcntl.flock on <history file>.lock: every write to the history file, and every read that
+# catches up on other processes' appends, happens while holding it.
+
+import fcntl
+from contextlib import contextmanager
+
+
+@contextmanager
+def file_lock(path: str):
+    """Holds an exclusive flock on path (created if missing) for the duration of the block"""
+    with open(path, 'a', encoding='utf-8') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,157 @@
+# Writes the full history table to the csv snapshot file, crash-safely.
+# The csv is written to <path>.tmp and renamed over the live file, so a crash mid-write leaves the
+# previous snapshot intact. Next to it, <path>.sum holds a crc32 for every SEGMENT_BYTES of the csv;
+# on startup only the segments at the end are checked, walking back until one matches, so a
+# damaged tail is found (and cut off) in time proportional to the damage, not to the file.
+# Every whole-file write of the csv history goes through snapshot_file: ChunkedCSV.rewrite
+# (compaction) and truncate (clear, a new file) as well as write_snapshot.
+
+import os
+import json
+import zlib
+import threading
+import logging as log
+from contextlib import contextmanager
+
+import pandas as pd
+
+SEGMENT_BYTES = 1 << 20
+
+# serialize whole-file writes coming from the command threads and the autosave threads, one lock per
+# file so sessions saving their own files do not wait on each other
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def _write_lock(path: str) -> threading.Lock:
+    with _write_locks_guard:
+        return _write_locks.setdefault(path, threading.Lock())
+
+
+def write_snapshot(df: pd.DataFrame, path: str, fsync: bool = False):
+    """Atomically replaces the csv at path with the dataframe, optionally forcing it to disk"""
+    with snapshot_file(path, fsync) as csv_file:
+        df.to_csv(csv_file, index=False)
+
+
+@contextmanager
+def snapshot_file(path: str, fsync: bool = False):
+    """Yields <path>.tmp open for writing; once the block finishes it is checksummed and renamed over
+    path, with the file and the rename forced to disk when fsync is set"""
+    with _write_lock(path):
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', newline='', encoding='utf-8') as csv_file:
+            yield csv_file
+            if fsync:
+                csv_file.flush()
+                os.fsync(csv_file.fileno())
+
+        # the manifest names the new file's inode, so until the rename below it matches nothing
+        stat = os.stat(temp_path)
+        manifest = {'inode': stat.st_ino, 'size': stat.st_size, 'segment': SEGMENT_BYTES,
+                    'crcs': _checksums(temp_path, 0, stat.st_size)}
+        _write_manifest(path, manifest, fsync)
+        os.replace(temp_path, path)
+        if fsync:
+            _sync_folder(path)
+
+
+def read_manifest(path: str):
+    """The snapshot's manifest, or None when there is none or it belongs to another file"""
+    try:
+        with open(path + '.sum', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest['inode'] != os.stat(path).st_ino:
+            return None
+        return manifest
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def good_length(path: str, manifest: dict) -> int:
+    """Bytes at the start of the snapshot that are intact, checking segments from the end backwards"""
+    size = os.path.getsize(path)
+    segment = manifest['segment']
+    crcs = manifest['crcs']
+    failed = False
+    with open(path, 'rb') as snapshot_file:
+        # rows appended after the snapshot come after the last checksummed byte; segments cut short by a
+        # truncation cannot be checked, their bytes are kept as long as no whole segment fails
+        for index in range(len(crcs) - 1, -1, -1):
+            start = index * segment
+            stop = min(start + segment, manifest['size'])
+            if stop > size:
+                continue
+            snapshot_file.seek(start)
+            if zlib.crc32(snapshot_file.read(stop - start)) == crcs[index]:
+                return stop if failed else size
+            failed = True
+    return 0 if failed else size
+
+
+def recover_snapshot(path: str) -> int:
+    """Cuts a damaged tail off the snapshot, keeping it in <path>.damaged. Returns bytes cut off"""
+    manifest = read_manifest(path)
+    if manifest is None:
+        return 0  # written before checksums, or never renamed into place: nothing to check against
+    size = os.path.getsize(path)
+    good = good_length(path, manifest)
+    if good == size and good >= manifest['size']:
+        return 0
+
+    # keep whole rows only: back to the last newline at or before good
+    with open(path, 'rb') as snapshot_file:
+        start = good
+        while start > 0:
+            step = min(4096, start)
+            snapshot_file.seek(start - step)
+            newline = snapshot_file.read(step).rfind(b'\n')
+            start -= step
+            if newline != -1:
+                start += newline + 1
+                break
+        good = start
+        snapshot_file.seek(good)
+        tail = snapshot_file.read()
+    with open(path + '.damaged', 'wb') as damaged_file:
+        damaged_file.write(tail)
+    os.truncate(path, good)
+
+    # checksum the shortened file again; only the last segment changes
+    kept = good // manifest['segment']
+    manifest['crcs'] = manifest['crcs'][:kept] + _checksums(path, kept * manifest['segment'], good)
+    manifest['size'] = good
+    _write_manifest(path, manifest, False)
+    log.error(f"History File: snapshot damaged, kept the first {good} bytes, "
+              f"{len(tail)} damaged bytes moved to {path}.damaged")
+    return len(tail)
+
+
+def _checksums(path: str, start: int, stop: int) -> list:
+    crcs = []
+    with open(path, 'rb') as snapshot_file:
+        snapshot_file.seek(start)
+        while start < stop:
+            block = snapshot_file.read(min(SEGMENT_BYTES, stop - start))
+            crcs.append(zlib.crc32(block))
+            start += len(block)
+    return crcs
+
+
+def _write_manifest(path: str, manifest: dict, fsync: bool):
+    temp_path = path + '.sum.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file)
+        if fsync:
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+    os.replace(temp_path, path + '.sum')
+
+
+def _sync_folder(path: str):
+    # makes the renames themselves durable
+    folder = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(folder)
+    finally:
+        os.close(folder)
@@ -0,0 +1,114 @@
+# SQLite history engine (stdlib sqlite3).
+# Each history row is a table row keyed by its row number (INTEGER PRIMARY KEY, i.e. the rowid),
+# so reading a page or a single row is a B-tree range lookup instead of a file scan, and
+# appends are inserts batched into one transaction per save.
+# The database runs in WAL mode: readers are not blocked while a save is committing.
+
+import sqlite3
+from contextlib import contextmanager
+import logging as log
+
+import pandas as pd
+
+from plugins.history.storage.engine import COLUMNS, HistoryEngine
+
+SCHEMA = ("CREATE TABLE IF NOT EXISTS {table} ("
+          "row INTEGER PRIMARY KEY, num1 TEXT NOT NULL, operand TEXT NOT NULL, num2 TEXT NOT NULL, result TEXT NOT NULL)")
+INDEXES = ["CREATE INDEX IF NOT EXISTS history_operand ON history (operand)",
+           "CREATE INDEX IF NOT EXISTS history_result ON history (result)"]
+
+# statements are kept as constants so sqlite3's statement cache prepares each one only once
+SELECT_ROWS = "SELECT row, num1, operand, num2, result FROM history WHERE row >= ? AND row < ? ORDER BY row"
+SELECT_COUNT = "SELECT COALESCE(MAX(row) + 1, 0) FROM history"
+INSERT_ROW = "INSERT INTO {table} (row, num1, operand, num2, result) VALUES (?, ?, ?, ?, ?)"
+
+
+class SQLiteHistory(HistoryEngine):
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = None
+        self.open()
+
+    def open(self):
+        """Connects (once) and reads the row count from the primary key, which also picks up
+        rows other processes inserted"""
+        if self.connection is None:
+            # autocommit mode: transactions are opened explicitly around each batch
+            # the history lock serializes access from the autosave and compaction threads
+            self.connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=30)
+            mode = self.connection.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+            if mode != 'wal':
+                log.error(f"History File: sqlite journal mode is {mode}, not wal")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(SCHEMA.format(table='history'))
+            for index in INDEXES:
+                self.connection.execute(index)
+        self.count = self.connection.execute(SELECT_COUNT).fetchone()[0]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def rows(self, start: int, stop: int) -> pd.DataFrame:
+        """Reads rows [start, stop) into a dataframe indexed by row number"""
+        records = self.connection.execute(SELECT_ROWS, (start, stop)).fetchall()
+        index = [record[0] for record in records]
+        return pd.DataFrame([record[1:] for record in records], columns=COLUMNS, index=index)
+
+    def append_frame(self, df: pd.DataFrame, fsync: bool = False):
+        """Inserts the dataframe's rows after the last row, in one transaction"""
+        if len(df) == 0:
+            return
+        self._sync_mode(fsync)
+        # IMMEDIATE takes the write lock before the count is read, so concurrent appenders cannot
+        # hand out the same row numbers
+        with self._transaction('IMMEDIATE'):
+            first = self.connection.execute(SELECT_COUNT).fetchone()[0]
+            self.connection.executemany(INSERT_ROW.format(table='history'), self._records(df, first))
+        self.count = first + len(df)
+
+    def rewrite(self, chunks):
+        """Replaces every row inside one transaction, so a crash leaves the old table intact"""
+        count = 0
+        with self._transaction():
+            self.connection.execute("DROP TABLE IF EXISTS history_new")
+            self.connection.execute(SCHEMA.format(table='history_new'))
+            for chunk in chunks:
+                self.connection.executemany(INSERT_ROW.format(table='history_new'), self._records(chunk, count))
+                count += len(chunk)
+            self.connection.execute("DROP TABLE history")
+            self.connection.execute("ALTER TABLE history_new RENAME TO history")
+            for index in INDEXES:
+                self.connection.execute(index)
+        self.count = count
+
+    def truncate(self):
+        """Removes every row"""
+        with self._transaction():
+            self.connection.execute("DELETE FROM history")
+        self.count = 0
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _sync_mode(self, fsync: bool):
+        # WAL + NORMAL only syncs on checkpoints; FULL syncs the WAL on every commit
+        self.connection.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+
+    @contextmanager
+    def _transaction(self, mode: str = ''):
+        # BEGIN ... COMMIT around a batch, ROLLBACK if anything in it fails
+        self.connection.execute(f"BEGIN {mode}")
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    @staticmethod
+    def _records(df: pd.DataFrame, first: int):
+        columns = [df[column].astype(str).tolist() for column in COLUMNS]
+        return zip(range(first, first + len(df)), *columns)
+
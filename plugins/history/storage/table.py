@@ -0,0 +1,150 @@
+# Helpers over the history table held in data_store.
+# The full table is, in order:
+#   data_store.hist_cold    rows already in the history file (a storage.engine.HistoryEngine)
+#   data_store.hist_df      rows not saved yet
+#   data_store.hist_buffer  rows appended since hist_df was last materialized
+# Row numbers are positions in that table. Deleted rows keep their number (data_store.hist_tombstones)
+# and are hidden from reads until compact_rows() removes them.
+# When the on-disk engine is shared with other processes, every write goes through locked_rows().
+
+import logging as log
+from contextlib import contextmanager
+
+import pandas as pd
+
+import data_store
+from plugins.history.storage.locking import file_lock
+
+COMPACT_CHUNK = 100_000  # on-disk rows rewritten per step while compacting
+
+
+
+@contextmanager
+def locked_rows():
+    """Shared history: holds the file lock and catches up on other processes' appends and deletes"""
+    cold = data_store.hist_cold
+    if not cold.shared:
+        yield
+        return
+    with file_lock(cold.path + '.lock'):
+        cold.refresh()
+        data_store.hist_tombstones.refresh()
+        yield
+
+
+def refresh_rows():
+    """Picks up what other processes wrote to a shared history file, nothing otherwise"""
+    with locked_rows():
+        pass
+
+
+def current_frame() -> pd.DataFrame:
+    """Folds buffered appends into data_store.hist_df and returns the resident table"""
+    buffer = data_store.hist_buffer
+    if len(buffer):
+        data_store.hist_df = buffer.fold_into(data_store.hist_df)
+    return data_store.hist_df
+
+
+def row_count() -> int:
+    """Number of rows in the full table, deleted ones included, without loading anything from disk"""
+    return len(data_store.hist_cold) + len(data_store.hist_df) + len(data_store.hist_buffer)
+
+
+def live_count() -> int:
+    return row_count() - len(data_store.hist_tombstones)
+
+
+def _hide_deleted(df: pd.DataFrame) -> pd.DataFrame:
+    tombstones = data_store.hist_tombstones
+    if len(tombstones) == 0 or len(df) == 0:
+        return df
+    return df[~tombstones.deleted(df.index.to_numpy())]
+
+
+def read_rows(start: int, stop: int) -> pd.DataFrame:
+    """Live rows among row numbers [start, stop), indexed by row number"""
+    cold_rows = len(data_store.hist_cold)
+    parts = []
+    if start < cold_rows:
+        parts.append(data_store.hist_cold.rows(start, min(stop, cold_rows)))
+    if stop > cold_rows or not parts:
+        resident = current_frame().iloc[max(start - cold_rows, 0):stop - cold_rows]
+        if cold_rows:
+            resident = resident.set_axis(resident.index + cold_rows)
+        parts.append(resident)
+    df = parts[0] if len(parts) == 1 else pd.concat(parts)
+    return _hide_deleted(df)
+
+
+def full_frame() -> pd.DataFrame:
+    """The full table, paging in every on-disk row"""
+    return read_rows(0, row_count())
+
+
+def last_row() -> int:
+    """Row number of the last live row, -1 when there is none"""
+    return data_store.hist_tombstones.last_live(row_count())
+
+
+def delete_row(row_index: int):
+    """Marks one row deleted in O(1). Raises KeyError when there is no such live row"""
+    with locked_rows():
+        if data_store.hist_cold.shared:
+            # unsaved rows would be renumbered by other processes' appends: give them their final number
+            _append_resident()
+        if not 0 <= row_index < row_count() or not data_store.hist_tombstones.mark(row_index):
+            raise KeyError(row_index)
+
+
+def compact_rows() -> int:
+    """Physically removes deleted rows; row numbers after them shift down. Returns rows removed"""
+    with locked_rows():
+        return _compact()
+
+
+def _compact() -> int:
+    tombstones = data_store.hist_tombstones
+    removed = len(tombstones)
+    if removed == 0:
+        return 0
+
+    # filter with a copy: the persisted tombstones are cleared before the file is swapped, so a
+    # crash in between brings deleted rows back instead of deleting the wrong ones
+    deleted = tombstones.copy()
+    tombstones.clear()
+
+    cold = data_store.hist_cold
+    cold_rows = len(cold)
+
+    def live_chunks():
+        for start in range(0, cold_rows, COMPACT_CHUNK):
+            chunk = cold.rows(start, min(start + COMPACT_CHUNK, cold_rows))
+            yield chunk[~deleted.deleted(chunk.index.to_numpy())]
+    cold.rewrite(live_chunks())
+
+    my_df = current_frame()
+    keep = ~deleted.deleted(my_df.index.to_numpy() + cold_rows)
+    data_store.hist_df = my_df[keep].reset_index(drop=True)
+    log.info(f"History - Compacted, removed {removed} deleted rows")
+    return removed
+
+
+def clear_rows():
+    with locked_rows():
+        data_store.hist_df = data_store.hist_df[0:0]
+        data_store.hist_buffer.clear()
+        data_store.hist_tombstones.clear()
+        data_store.hist_cold.truncate()
+
+
+def _append_resident(fsync: bool = False):
+    # the file is append-only: only resident rows need writing, deletes live in the sidecar
+    data_store.hist_cold.append_frame(current_frame(), fsync)
+    data_store.hist_df = data_store.hist_df[0:0]
+
+
+def save_history(fsync: bool = False):
+    """Appends the rows not saved yet to the history file"""
+    with locked_rows():
+        _append_resident(fsync)
@@ -0,0 +1,116 @@
+# Tombstones for deleted history rows.
+# history delete only sets a bit for the row number; the row stays where it is (hidden from reads)
+# so deleting is O(1) and row numbers do not shift. Compaction (history compact, or on exit) removes
+# the rows physically.
+
+import os
+
+import numpy as np
+
+
+class Tombstones:
+    def __init__(self, path: str = None):
+        self.path = path  # sidecar file deleted row numbers are appended to, None keeps them in memory only
+        self.bits = np.zeros(128, dtype=np.uint8)
+        self.count = 0
+        self.load()
+
+    def load(self):
+        """Reads deleted row numbers back from the sidecar file"""
+        self.bits[:] = 0
+        self.count = 0
+        self.inode = None
+        self.offset = 0  # sidecar bytes read so far
+        self.refresh()
+
+    def refresh(self):
+        """Reads row numbers other processes appended to the sidecar since it was last read"""
+        if self.path is None or not os.path.exists(self.path):
+            return
+        stat = os.stat(self.path)
+        if self.inode is not None and (stat.st_ino != self.inode or stat.st_size < self.offset):
+            self.load()  # cleared by a compaction
+            return
+        self.inode = stat.st_ino
+        with open(self.path, 'rb') as sidecar:
+            sidecar.seek(self.offset)
+            data = sidecar.read()
+        # only whole lines: a row number still being written is picked up next time
+        data = data[:data.rfind(b'\n') + 1]
+        self.offset += len(data)
+        for line in data.split():
+            if line.isdigit():
+                self._set(int(line))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def mark(self, row: int) -> bool:
+        """Marks a row deleted. Returns False if it already was"""
+        if not self._set(row):
+            return False
+        if self.path is not None:
+            with open(self.path, 'a', encoding='utf-8') as sidecar:
+                sidecar.write(f"{row}\n")
+            # nobody else writes while the caller holds the history lock, so this is still in step
+            self.offset = os.path.getsize(self.path)
+            self.inode = os.stat(self.path).st_ino
+        return True
+
+    def _set(self, row: int) -> bool:
+        byte = row >> 3
+        if byte >= len(self.bits):
+            grown = np.zeros(max(len(self.bits) * 2, byte + 1), dtype=np.uint8)
+            grown[:len(self.bits)] = self.bits
+            self.bits = grown
+        bit = np.uint8(1 << (row & 7))
+        if self.bits[byte] & bit:
+            return False
+        self.bits[byte] |= bit
+        self.count += 1
+        return True
+
+    def deleted(self, rows: np.ndarray) -> np.ndarray:
+        """Vectorized lookup: True for every row number in rows that is deleted"""
+        rows = np.asarray(rows, dtype=np.int64)
+        in_range = rows < len(self.bits) * 8
+        result = np.zeros(len(rows), dtype=bool)
+        hits = rows[in_range]
+        result[in_range] = (self.bits[hits >> 3] >> (hits & 7).astype(np.uint8)) & 1 == 1
+        return result
+
+    def is_deleted(self, row: int) -> bool:
+        return bool(self.deleted([row])[0])
+
+    def rows(self) -> np.ndarray:
+        """Every deleted row number, ascending"""
+        return np.flatnonzero(np.unpackbits(self.bits, bitorder='little'))
+
+    def last_live(self, total: int) -> int:
+        """Highest row number below total that is not deleted, -1 if there is none"""
+        stop = total
+        while stop > 0:
+            start = max(stop - 4096, 0)
+            live = np.flatnonzero(~self.deleted(np.arange(start, stop)))
+            if len(live):
+                return start + int(live[-1])
+            stop = start
+        return -1
+
+    def copy(self) -> 'Tombstones':
+        """In-memory copy, used to filter rows while the original is being cleared"""
+        copied = Tombstones()
+        copied.bits = self.bits.copy()
+        copied.count = self.count
+        return copied
+
+    def clear(self):
+        self.bits[:] = 0
+        self.count = 0
+        if self.path is not None:
+            # replaced rather than truncated, so other processes see a new file and start over
+            with open(self.path + '.tmp', 'w', encoding='utf-8'):
+                pass
+            os.replace(self.path + '.tmp', self.path)
+            self.inode = os.stat(self.path).st_ino
+            self.offset = 0
@@ -1,19 +1,15 @@
 
 
 import os
-from commands import Command
+from commands import Command, emit
 
 
 class MenuCommand(Command): 
     def execute(self): 
 
-        print("Plugins Menu: ")
         commands_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'plugins', '..', '..', ))
         # print (commands_path)
         folderIgnore = ['__pycache__', '__init__.py']
-        for item in os.listdir(commands_path):
-            # ignore pycache and other extraneous folders
-            if item in folderIgnore: 
-                continue
-            print(item)
-        print('// end of plugins list')
\ No newline at end of file
+        # ignore pycache and other extraneous folders
+        plugins = [item for item in os.listdir(commands_path) if item not in folderIgnore]
+        return emit('plugins', plugins, lambda items: '\n'.join(["Plugins Menu: ", *items, '// end of plugins list']))
\ No newline at end of file
@@ -1,14 +1,18 @@
 # pylint: disable=trailing-whitespace, missing-final-newline, too-many-arguments
 ''' Tests the main app program'''
-# import logging
+import io
+import logging
 import os
-# import sys
+import sys
 from unittest.mock import patch, MagicMock
 import pandas as pd
 import pytest
+from commands import emit
 
 # Importing the App class from the app package. Note: This assumes that the app package is accessible in your PYTHONPATH.
 from app import App
+import main
+import data_store
 # from app.Colorizer import Colorizer
 # from commands import Command, CommandHandler
 
@@ -54,30 +58,28 @@ def test_fetch_plugins(app_instance):
 
         mock_import_module.assert_called_with('dummy_plugin')
 
-def test_manage_history_existing_file(app_instance):
+def test_manage_history_existing_file(app_instance, tmp_path):
     '''Tests managing history function when file exists'''
-    with patch('app.os.path.exists', return_value=True), \
-         patch('app.pd.read_csv', return_value=pd.DataFrame({'num1': [1], 'operand': ['+'], 'num2': [1], 'result': [2]})) as mock_read_csv, \
-         patch('app.log.info') as mock_logger_info:
-        #  patch('app.pd.DataFrame.to_csv') as mock_to_csv, \
+    pd.DataFrame({'num1': [1], 'operand': ['+'], 'num2': [1], 'result': [2]}).to_csv(tmp_path / 'calc_history.csv', index=False)
+    app_instance.env_settings['HIST_FILE_PATH'] = str(tmp_path)
+    with patch('app.log.info') as mock_logger_info:
         history_df = app_instance.manage_history()
 
-        mock_read_csv.assert_called()
-
         # Assert that the DataFrame has the expected columns
         expected_columns = ['num1', 'operand', 'num2', 'result']
         assert list(history_df.columns) == expected_columns
 
-        # Assert that logger.info was called with the expected message
-        mock_logger_info.assert_called_with("Loaded existing history file")
+        # the rows are in the history file, the resident table only gets rows added from now on
+        assert data_store.hist_cold.to_frame()['result'].tolist() == ['2']
+        mock_logger_info.assert_called_with("History File: Opened ChunkedCSV history file with 1 rows (0 deleted)")
 
-def test_manage_history_no_existing_file(app_instance):
+def test_manage_history_no_existing_file(app_instance, tmp_path):
     '''Test if manage_history correctly handles the absence of a history file and creates a new one'''
-    with patch('app.os.path.exists', return_value=False), patch('app.pd.DataFrame.to_csv') as mock_to_csv:
-        history_df = app_instance.manage_history()
+    app_instance.env_settings['HIST_FILE_PATH'] = str(tmp_path)
+    history_df = app_instance.manage_history()
 
-        assert 'num1' in history_df.columns
-        mock_to_csv.assert_called()
+    assert 'num1' in history_df.columns
+    assert list(pd.read_csv(tmp_path / 'calc_history.csv').columns) == ['num1', 'operand', 'num2', 'result']
 
 
 def test_setup_log_with_config_file(app_instance):
@@ -139,3 +141,62 @@ def test_start_hello_command_output(app_instance, capsys):
 
         # Verify 'hello' command was processed
         mock_execute_command.assert_called_once_with('hello')
+
+
+def run_commands(app_instance, lines, **kwargs):
+    '''Runs lines through run_script with a handler that fails on "bad" and exits on "exit"'''
+    def execute_command_side_effect(command):
+        if command == 'bad':
+            logging.error("Error: bad command")
+        elif command == 'boom':
+            raise RuntimeError("boom")
+        elif command == 'exit':
+            sys.exit("Exiting...")
+        emit('message', f"ran {command}")
+
+    with patch.object(app_instance, 'setup'), patch.object(app_instance, 'close_history') as mock_close_history, \
+            patch.object(app_instance.command_handler, 'execute_command', side_effect=execute_command_side_effect) as mock_execute_command:
+        summary = app_instance.run_script(lines, **kwargs)
+    mock_close_history.assert_called_once()
+    return summary, [call.args[0] for call in mock_execute_command.call_args_list]
+
+def test_run_script_continues_on_error(app_instance, capsys):
+    '''Test batch mode skips blanks and comments, counts failed commands and stops at exit'''
+    (commands, errors, _), ran = run_commands(app_instance, ['hello\n', '\n', '# note\n', 'bad\n', 'boom\n', ' hello \n', 'exit\n', 'hello\n'])
+    assert ran == ['hello', 'bad', 'boom', 'hello', 'exit']
+    assert (commands, errors) == (5, 2)
+    captured = capsys.readouterr()
+    assert captured.out.count('ran hello') == 2
+    assert 'Ran 5 commands, 2 errors in' in captured.err
+
+def test_run_script_fail_fast_and_quiet(app_instance, capsys):
+    '''Test --fail-fast stops at the first error and --quiet hides command output'''
+    (commands, errors, _), ran = run_commands(app_instance, ['hello', 'bad', 'hello'], fail_fast=True, quiet=True)
+    assert ran == ['hello', 'bad']
+    assert (commands, errors) == (2, 1)
+    captured = capsys.readouterr()
+    assert 'ran hello' not in captured.out
+    assert 'Ran 2 commands, 1 errors in' in captured.err
+
+def test_piped_script_with_history_page(tmp_path, capsys):
+    '''Test history page in a piped script prints every page instead of reading the next lines as answers'''
+    script = io.StringIO('calc add 1 1\ncalc add 2 2\ncalc add 3 3\nhistory page 1\ncalc add 4 4\ncalc add 5 5\nhistory show\n')
+    with patch('app.App.setup_log'), patch.dict(os.environ, {'HIST_FILE_PATH': str(tmp_path), 'LOG_LEVEL': 'ERROR'}), \
+            patch('sys.stdin', script), patch('builtins.input', side_effect=AssertionError("prompted")):
+        assert main.main([]) == 0
+    captured = capsys.readouterr()
+    assert 'Ran 7 commands, 0 errors in' in captured.err
+    assert "-- rows 2 to 2 of 3 --" in captured.out and "Result: 5 add 5 = 10" in captured.out
+    assert pd.read_csv(tmp_path / 'calc_history.csv')['result'].tolist() == [2, 4, 6, 8, 10]
+
+def test_main_runs_script_file(tmp_path):
+    '''Test main.py runs a script file in batch mode and exits non-zero when a command failed'''
+    script = tmp_path / 'commands.txt'
+    script.write_text('hello\n')
+    with patch('main.App') as mock_app:
+        mock_app.return_value.run_script.return_value = (1, 1, 0.1)
+        assert main.main([str(script), '--fail-fast']) == 1
+        mock_app.return_value.run_script.assert_called_once()
+        assert mock_app.return_value.run_script.call_args.args[1:] == (True, False)
+        mock_app.return_value.start.assert_not_called()
+        assert main.main([str(tmp_path / 'missing.txt')]) == 2
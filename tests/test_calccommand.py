@@ -4,7 +4,12 @@
 from decimal import Decimal
 from unittest.mock import MagicMock, patch
 import pytest
+import pandas as pd
 from plugins.calc import CalcCommand
+from plugins.calc.calculator import Calculator
+from plugins.calc.calculator.cells import Cells
+from plugins.history.storage import current_frame, save_history, COLUMNS
+import data_store
 
 @pytest.mark.parametrize("val_a, val_b, operation_name, expected_output", [
     (Decimal('1'), Decimal('1'), 'add', 'Result: 1 add 1 = 2'),
@@ -13,14 +18,14 @@ from plugins.calc import CalcCommand
 ])
 
 @patch('data_store.hist_df')
-def test_run_calculations(mock_hist_df, capsys, val_a, val_b, operation_name, expected_output):
-    ''' Tests valid run calculations'''
+def test_execute_operation(mock_hist_df, capsys, val_a, val_b, operation_name, expected_output):
+    ''' Tests valid calculations run through execute'''
 
     # Configure the mock to avoid AttributeError
     mock_hist_df.loc = MagicMock()
 
     calc_command_instance = CalcCommand()
-    calc_command_instance.run_calculations(val_a, val_b, operation_name)
+    calc_command_instance.execute(operation_name, str(val_a), str(val_b))
 
     # Capture the output
     captured = capsys.readouterr()
@@ -31,7 +36,7 @@ def test_unknown_operation(capsys):
     ''' Tests unknown operation calculation run'''
     with patch('logging.error') as mock_log_error:
         calc_command_instance = CalcCommand()
-        calc_command_instance.run_calculations(Decimal('1'), Decimal('1'), 'nonexistent_operation')
+        calc_command_instance.execute('nonexistent_operation', '1', '1')
 
         # Assert that no output is printed
         captured = capsys.readouterr()
@@ -45,7 +50,7 @@ def test_invalid_decimal_input(capsys):
     with patch('logging.error') as mock_log_error:
         calc_command_instance = CalcCommand()
         # Providing a clearly invalid decimal input
-        calc_command_instance.run_calculations('not_a_decimal', Decimal('1'), 'add')
+        calc_command_instance.execute('add', 'not_a_decimal', '1')
 
         # Assert that no output is printed to stdout
         captured = capsys.readouterr()
@@ -61,7 +66,7 @@ def test_division_by_zero(capsys):
     with patch('logging.error') as mock_log_error:
         calc_command_instance = CalcCommand()
         # Setting up a division by zero scenario
-        calc_command_instance.run_calculations(Decimal('1'), Decimal('0'), 'divide')
+        calc_command_instance.execute('divide', '1', '0')
 
         # Assert that no output is printed to stdout
         captured = capsys.readouterr()
@@ -70,6 +75,15 @@ def test_division_by_zero(capsys):
         # Assert that logging.error was called
         mock_log_error.assert_called_with("An error occurred: Cannot divide by zero")
 
+@pytest.mark.parametrize("operand", ['nan', 'inf', '-inf'])
+def test_sqrt_non_finite(capsys, operand):
+    ''' Tests sqrt reports non-finite operands like any other bad operand'''
+    with patch('logging.error') as mock_log_error:
+        CalcCommand().execute('sqrt', operand)
+
+        assert capsys.readouterr().out == ''
+        mock_log_error.assert_called_once_with("An error occurred: Cannot take the square root of a non-finite number")
+
 def test_default_message(capsys):
     ''' Tests defaultMessage()'''
     calc_command_instance = CalcCommand()
@@ -86,6 +100,21 @@ def test_default_message(capsys):
         '    subtract <num1> <num2>  subtract num2 from num1 (num1-num2)\n'
         '    multiply <num1> <num2>  multiplies two numbers (num1*num2)\n'
         '    divide <num1> <num2>    divide num1 by num2 (num1/num2)\n'
+        '    sqrt <num1>             square root of num1\n'
+        '    file <in.csv> <out.csv> [history] [float|decimal|fixed] [parallel[=N]] [prec=N]\n'
+        '         [scale=N] [chunk rows]\n'
+        '                            runs every operation,num1,num2 row of in.csv, writing the\n'
+        '                            results to out.csv; history appends them to history in one save,\n'
+        '                            parallel spreads the decimal math over N processes, fixed uses\n'
+        '                            scaled integers with scale=N decimals\n'
+        '    cache [clear]           shows (or resets) the result cache counters\n'
+        '    expr "<expression>" [name=value ...]\n'
+        '                            evaluates e.g. "(a + 2) * sqrt(b)", a name=1,2,3 list evaluates\n'
+        '                            it once per value; other names read cells\n'
+        '    set <name> <number>     sets a cell, recomputing the cells that depend on it\n'
+        '    let <name> = <expression>\n'
+        '                            a cell computed from other cells, kept up to date\n'
+        '    cells                   lists the cells\n'
     )
 
     assert captured.out == expected_output
@@ -114,6 +143,21 @@ def test_execute_with_no_arguments(capsys):
         '    subtract <num1> <num2>  subtract num2 from num1 (num1-num2)\n'
         '    multiply <num1> <num2>  multiplies two numbers (num1*num2)\n'
         '    divide <num1> <num2>    divide num1 by num2 (num1/num2)\n'
+        '    sqrt <num1>             square root of num1\n'
+        '    file <in.csv> <out.csv> [history] [float|decimal|fixed] [parallel[=N]] [prec=N]\n'
+        '         [scale=N] [chunk rows]\n'
+        '                            runs every operation,num1,num2 row of in.csv, writing the\n'
+        '                            results to out.csv; history appends them to history in one save,\n'
+        '                            parallel spreads the decimal math over N processes, fixed uses\n'
+        '                            scaled integers with scale=N decimals\n'
+        '    cache [clear]           shows (or resets) the result cache counters\n'
+        '    expr "<expression>" [name=value ...]\n'
+        '                            evaluates e.g. "(a + 2) * sqrt(b)", a name=1,2,3 list evaluates\n'
+        '                            it once per value; other names read cells\n'
+        '    set <name> <number>     sets a cell, recomputing the cells that depend on it\n'
+        '    let <name> = <expression>\n'
+        '                            a cell computed from other cells, kept up to date\n'
+        '    cells                   lists the cells\n'
     )
     assert captured.out == expected_output
 
@@ -129,3 +173,159 @@ def test_execute_with_missing_arguments(capsys):
 
         # Assert the log error was called with the expected message
         mock_log_error.assert_called_with("Error: Incorrect number of arguments for calc")
+
+def write_input(path, rows):
+    path.write_text('operation,num1,num2\n' + ''.join(f'{row}\n' for row in rows))
+
+def test_file_streams_in_chunks(tmp_path, capsys):
+    ''' Tests calc file writes every row's result in order, across several chunks'''
+    in_path, out_path = tmp_path / 'in.csv', tmp_path / 'out.csv'
+    write_input(in_path, ['add,1,2', '/,1,0', 'divide,10,4', 'power,2,2', '*,abc,3', 'subtract,0.3,0.1'])
+
+    CalcCommand().execute('file', str(in_path), str(out_path), '2')
+
+    df = pd.read_csv(out_path, dtype=str, keep_default_na=False)
+    assert df['result'].tolist() == ['3', '', '2.5', '', '', '0.2']
+    assert df['error'].tolist() == ['', 'Cannot divide by zero', '', 'Unknown operation', 'Invalid number', '']
+    assert 'Processed 6 rows (3 failed)' in capsys.readouterr().out
+
+def test_file_float_engine(tmp_path):
+    ''' Tests calc file can run the float batch engine'''
+    in_path, out_path = tmp_path / 'in.csv', tmp_path / 'out.csv'
+    write_input(in_path, ['multiply,1.5,2'])
+
+    CalcCommand().execute('file', str(in_path), str(out_path), 'float')
+
+    assert pd.read_csv(out_path)['result'].tolist() == [3.0]
+
+def test_file_overflow_fails_one_row(tmp_path, capsys):
+    ''' Tests a row overflowing Decimal fails on its own, the rows around it are still written'''
+    in_path, out_path = tmp_path / 'in.csv', tmp_path / 'out.csv'
+    write_input(in_path, ['add,1,2', 'multiply,1e999999999,1e999999999', 'multiply,2,3'])
+
+    CalcCommand().execute('file', str(in_path), str(out_path))
+
+    df = pd.read_csv(out_path, dtype=str, keep_default_na=False)
+    assert df['result'].tolist() == ['3', '', '6']
+    assert df['error'].tolist() == ['', 'invalid arithmetic: Overflow', '']
+    assert 'Processed 3 rows (1 failed)' in capsys.readouterr().out
+
+@pytest.mark.parametrize("engine", ['decimal', 'float', 'fixed'])
+def test_file_missing_operand(tmp_path, monkeypatch, engine):
+    ''' Tests an empty or NaN operand fails its row in every engine and never reaches history'''
+    monkeypatch.setattr(data_store, 'hist_df', pd.DataFrame(columns=COLUMNS))
+    in_path, out_path = tmp_path / 'in.csv', tmp_path / 'out.csv'
+    write_input(in_path, ['add,3,', 'add,NaN,1', 'sqrt,4,', 'add,1,1'])
+
+    CalcCommand().execute('file', str(in_path), str(out_path), engine, 'history')
+
+    df = pd.read_csv(out_path, dtype=str, keep_default_na=False)
+    assert df['error'].tolist() == ['Invalid number', 'Invalid number', '', '']
+    assert data_store.hist_cold.to_frame()['num1'].tolist() == ['4', '1']
+
+def test_file_appends_history_per_chunk(tmp_path, monkeypatch):
+    ''' Tests calc file history appends each chunk's successful rows to the history file as it goes'''
+    monkeypatch.setattr(data_store, 'hist_df', pd.DataFrame(columns=COLUMNS))
+    in_path, out_path = tmp_path / 'in.csv', tmp_path / 'out.csv'
+    write_input(in_path, ['add,1,2', '/,1,0', '*,2,3'])
+
+    with patch('plugins.history.save_history', wraps=save_history) as mock_save:
+        CalcCommand().execute('file', str(in_path), str(out_path), 'history', '1')
+
+    history = data_store.hist_cold.to_frame()
+    assert history[['num1', 'operand', 'num2', 'result']].values.tolist() == [['1', '+', '2', '3'], ['2', '*', '3', '6']]
+    assert mock_save.call_count == 3
+    assert len(current_frame()) == 0
+
+def test_file_error_keeps_history_in_step(tmp_path, monkeypatch):
+    ''' Tests a file that fails part way leaves the chunks done before it saved, and nothing pending'''
+    monkeypatch.setattr(data_store, 'hist_df', pd.DataFrame(columns=COLUMNS))
+    in_path, out_path = tmp_path / 'in.csv', tmp_path / 'out.csv'
+    write_input(in_path, ['add,1,2', 'add,2,3', 'add,"1,2'])  # unclosed quote, a ParserError in the 2nd chunk
+
+    with patch('logging.error') as mock_log_error:
+        CalcCommand().execute('file', str(in_path), str(out_path), 'history', '2')
+
+    assert 'stopped after 2 rows' in mock_log_error.call_args[0][0]
+    assert len(pd.read_csv(out_path)) == 2
+    assert data_store.hist_cold.to_frame()['result'].tolist() == ['3', '5']
+    assert len(current_frame()) == 0 and len(data_store.hist_buffer) == 0
+
+def test_file_missing_input(tmp_path):
+    ''' Tests calc file logs an error for an unreadable input file'''
+    with patch('logging.error') as mock_log_error:
+        CalcCommand().execute('file', str(tmp_path / 'missing.csv'), str(tmp_path / 'out.csv'))
+
+    assert 'could not process' in mock_log_error.call_args[0][0]
+
+def test_file_parallel_precision(tmp_path):
+    ''' Tests calc file parallel with a raised precision gives the same rows as the serial run'''
+    in_path = tmp_path / 'in.csv'
+    write_input(in_path, ['divide,1,3', '/,1,0', 'add,1,2'])
+
+    CalcCommand().execute('file', str(in_path), str(tmp_path / 'serial.csv'), 'prec=40')
+    CalcCommand().execute('file', str(in_path), str(tmp_path / 'parallel.csv'), 'parallel=2', 'prec=40')
+
+    serial = pd.read_csv(tmp_path / 'serial.csv', dtype=str, keep_default_na=False)
+    assert serial['result'].tolist() == ['0.' + '3' * 40, '', '3']
+    assert pd.read_csv(tmp_path / 'parallel.csv', dtype=str, keep_default_na=False).equals(serial)
+
+def test_cache_stats(capsys):
+    ''' Tests calc cache reports the counters, or that the cache is off'''
+    CalcCommand().execute('cache')
+    assert 'off' in capsys.readouterr().out
+
+    Calculator.enable_cache(8)
+    try:
+        CalcCommand().execute('add', '1', '2')
+        CalcCommand().execute('add', '1', '2')
+        capsys.readouterr()
+        CalcCommand().execute('cache')
+        assert '1/8 entries, 1 hits, 1 misses (50% hit rate), 0 evictions' in capsys.readouterr().out
+    finally:
+        Calculator.disable_cache()
+
+def test_expr(capsys):
+    ''' Tests calc expr evaluates a quoted expression, once or per value of a variable list'''
+    CalcCommand().execute('expr', '"(a', '+', '2)', '*', '-b"', 'a=1', 'b=3')
+    CalcCommand().execute('expr', '"1', '/', 'x"', 'x=2,0,4')
+    out = capsys.readouterr().out
+    assert 'Result: (a + 2) * -b = -9' in out
+    assert 'Result: 1 / x with x=2 = 0.5\nResult: 1 / x with x=0 = error\nResult: 1 / x with x=4 = 0.25' in out
+
+@pytest.mark.parametrize("args", [
+    ('"1e999999999', '*', '1e999999999"'),
+    ('a', '*', 'a', 'a=1e999999999,2'),
+])
+def test_expr_overflow(capsys, args):
+    ''' Tests an expression overflowing Decimal is reported instead of escaping the command'''
+    with patch('logging.error') as mock_log_error:
+        assert CalcCommand().execute('expr', *args) is None
+
+    mock_log_error.assert_called_once_with("An error occurred: invalid arithmetic: Overflow")
+    assert capsys.readouterr().out == ''
+
+def test_cells(capsys):
+    ''' Tests calc set / let / cells, and calc expr reading cells'''
+    Cells.clear()
+    CalcCommand().execute('set', 'x', '5')
+    CalcCommand().execute('let', 'y', '=', 'x', '*', '3')
+    CalcCommand().execute('set', 'x', '2')
+    CalcCommand().execute('expr', 'y', '+', '1')
+    CalcCommand().execute('cells')
+    Cells.clear()
+    assert capsys.readouterr().out == ('x = 5\ny = x * 3 = 15\n'
+                                       'x = 2\ny = x * 3 = 6\n'
+                                       'Result: y + 1 = 7\n'
+                                       'x = 2\ny = x * 3 = 6\n')
+
+def test_file_fixed_engine(tmp_path):
+    ''' Tests calc file can run the fixed-point engine at a chosen scale'''
+    in_path, out_path = tmp_path / 'in.csv', tmp_path / 'out.csv'
+    write_input(in_path, ['divide,2,3', '/,1,0', 'multiply,1.25,1.25'])
+
+    CalcCommand().execute('file', str(in_path), str(out_path), 'fixed', 'scale=2')
+
+    df = pd.read_csv(out_path, dtype=str, keep_default_na=False)
+    assert df['result'].tolist() == ['0.67', '', '1.56']
+    assert df['error'].tolist() == ['', 'Cannot divide by zero', '']
@@ -1,10 +1,14 @@
 # pylint: disable=trailing-whitespace, missing-final-newline, unused-variable
 ''' Tests the history plugin'''
 
+from decimal import Decimal
 from unittest.mock import patch
 import pandas as pd
 import pytest
 from plugins.history import HistoryCommand
+from plugins.history.storage import current_frame
+from plugins.calc.calculator.calculation import Calculation
+from plugins.calc.calculator.operations import add, divide
 import data_store
 
 @pytest.fixture(params=['empty', 'with_data', 'default'])
@@ -76,10 +80,10 @@ def test_last_function_empty_df(capsys, setup_history_df):
 
 
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
-def test_dummy_function(capsys, setup_history_df):
+def test_dummy_function(capsys, setup_history_df, tmp_path):
     ''' Tests output for dummy() to load a dummy row of data'''
     with patch('plugins.history.HistoryCommand.save') as mock_save, \
-            patch('data_store.hist_path', 'dummy_path.csv'):
+            patch('data_store.hist_path', str(tmp_path / 'dummy_path.csv')):
             # patch('plugins.history.log.debug') as mock_log_debug, \
         history_command_instance = HistoryCommand()
         history_command_instance.dummy()
@@ -90,10 +94,10 @@ def test_dummy_function(capsys, setup_history_df):
 
 
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
-def test_add_function(capsys, setup_history_df):
+def test_add_function(capsys, setup_history_df, tmp_path):
     ''' Tests output for add() to add custom row to data'''
     with patch('plugins.history.HistoryCommand.save') as mock_save, \
-            patch('data_store.hist_path', 'dummy_path.csv'):
+            patch('data_store.hist_path', str(tmp_path / 'dummy_path.csv')):
 
             # patch('plugins.history.log.debug') as mock_log_debug, \
         history_command_instance = HistoryCommand()
@@ -113,13 +117,13 @@ def test_add_function(capsys, setup_history_df):
 
         # Additionally, you can assert that the DataFrame has been updated with the new calculation
         new_calculation = {'num1': '1', 'operand': '+', 'num2': '1', 'result': '2'}
-        assert new_calculation.items() <= data_store.hist_df.iloc[-1].to_dict().items()
+        assert new_calculation.items() <= current_frame().iloc[-1].to_dict().items()
             
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
-def test_add_function_too_many_args(capsys, setup_history_df):
+def test_add_function_too_many_args(capsys, setup_history_df, tmp_path):
     ''' Tests output for add() with too many args'''
     with patch('plugins.history.HistoryCommand.save') as mock_save, \
-            patch('data_store.hist_path', 'dummy_path.csv'), \
+            patch('data_store.hist_path', str(tmp_path / 'dummy_path.csv')), \
             patch('plugins.history.log.error') as mock_log_error:
             # patch('plugins.history.log.debug') as mock_log_debug, \ 
         history_command_instance = HistoryCommand()
@@ -138,29 +142,29 @@ def test_add_function_too_many_args(capsys, setup_history_df):
         assert "New calculation added:" not in captured.out
 
         # Optionally, assert that no new rows were added to the DataFrame
-        assert len(data_store.hist_df) == 0  # Assumes DataFrame was initially empty
+        assert len(current_frame()) == 0  # Assumes DataFrame was initially empty
 
 
 # @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
-def test_add_function_incorrect_symbol(capsys, setup_history_df):
+def test_add_function_incorrect_symbol(capsys, setup_history_df, tmp_path):
     ''' Tests output for add() but incorrect symbol was used'''
     with patch('plugins.history.HistoryCommand.save') as mock_save, \
-            patch('data_store.hist_path', 'dummy_path.csv'), \
+            patch('data_store.hist_path', str(tmp_path / 'dummy_path.csv')), \
             patch('plugins.history.log.error') as mock_log_error:
 
         history_command_instance = HistoryCommand()
         history_command_instance.execute('add', '1', '$', '1', '2')
 
-        expected_error_msg = "Error: Invalid sign symbol for 'history add': sign= +, -, *, / "
+        expected_error_msg = "Error: Invalid sign symbol for 'history add': sign= +, -, *, /, sqrt "
         mock_log_error.assert_called_with(expected_error_msg)
 
 
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
-def test_delete_function(capsys, setup_history_df):
+def test_delete_function(capsys, setup_history_df, tmp_path):
     ''' Tests output for delete() to delete a row'''
     with patch('plugins.history.HistoryCommand.save') as mock_save, \
-            patch('data_store.hist_path', 'dummy_path.csv'):
+            patch('data_store.hist_path', str(tmp_path / 'dummy_path.csv')):
 
         history_command_instance = HistoryCommand()
         history_command_instance.execute('dummy')
@@ -177,10 +181,10 @@ def test_delete_function(capsys, setup_history_df):
 
 
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
-def test_delete_function_too_many_args(capsys, setup_history_df):
+def test_delete_function_too_many_args(capsys, setup_history_df, tmp_path):
     ''' Tests output for delete() with too many args'''
     with patch('plugins.history.HistoryCommand.save') as mock_save, \
-            patch('data_store.hist_path', 'dummy_path.csv'), \
+            patch('data_store.hist_path', str(tmp_path / 'dummy_path.csv')), \
             patch('plugins.history.log.error') as mock_log_error:
 
         history_command_instance = HistoryCommand()
@@ -194,10 +198,10 @@ def test_delete_function_too_many_args(capsys, setup_history_df):
 
 
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
-def test_delete_function_index_not_int(capsys, setup_history_df):
+def test_delete_function_index_not_int(capsys, setup_history_df, tmp_path):
     ''' Tests output for delete() but not integer'''
     with patch('plugins.history.HistoryCommand.save') as mock_save, \
-            patch('data_store.hist_path', 'dummy_path.csv'), \
+            patch('data_store.hist_path', str(tmp_path / 'dummy_path.csv')), \
             patch('plugins.history.log.error') as mock_log_error:
 
         history_command_instance = HistoryCommand()
@@ -212,10 +216,10 @@ def test_delete_function_index_not_int(capsys, setup_history_df):
 
 
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
-def test_delete_function_index_not_found(capsys, setup_history_df):
+def test_delete_function_index_not_found(capsys, setup_history_df, tmp_path):
     ''' Tests output for delete() when row index is not found'''
     with patch('plugins.history.HistoryCommand.save') as mock_save, \
-            patch('data_store.hist_path', 'dummy_path.csv'), \
+            patch('data_store.hist_path', str(tmp_path / 'dummy_path.csv')), \
             patch('plugins.history.log.error') as mock_log_error:
 
         history_command_instance = HistoryCommand()
@@ -226,9 +230,9 @@ def test_delete_function_index_not_found(capsys, setup_history_df):
         mock_log_error.assert_called_with(expected_error_msg)
 
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
-def test_delete_function_empty_table(capsys, setup_history_df):
+def test_delete_function_empty_table(capsys, setup_history_df, tmp_path):
     ''' Tests output for delete() when table is empty'''
-    with patch('data_store.hist_path', 'dummy_path.csv'), \
+    with patch('data_store.hist_path', str(tmp_path / 'dummy_path.csv')), \
          patch('plugins.history.log.error') as mock_log_error:
 
         history_command_instance = HistoryCommand()
@@ -242,20 +246,16 @@ def test_delete_function_empty_table(capsys, setup_history_df):
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
 def test_reloadfile_file_exists(capsys, setup_history_df):
     ''' Tests output for reload() from csv file'''
-    with patch('plugins.history.os.path.exists', return_value=True), \
-         patch('plugins.history.pd.read_csv') as mock_read_csv, \
-         patch('plugins.history.log.info') as mock_log_info:
-        
-        mock_read_csv.return_value = pd.DataFrame({'num1': [1], 'operand': ['+'], 'num2': [1], 'result': [2]})
-        
+    pd.DataFrame({'num1': [1], 'operand': ['+'], 'num2': [1], 'result': [2]}).to_csv(data_store.hist_path, index=False)
+    with patch('plugins.history.log.info') as mock_log_info:
         history_command_instance = HistoryCommand()
         history_command_instance.reloadfile()
         
-        mock_log_info.assert_any_call("File read successfully")
         mock_log_info.assert_any_call("File reloaded")
         
         captured = capsys.readouterr()
         assert "Data successfully reloaded from file." in captured.out
+        assert data_store.hist_cold.to_frame()['result'].tolist() == ['2']
 
 
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
@@ -275,24 +275,22 @@ def test_reloadfile_file_not_exists(capsys, setup_history_df):
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
 def test_reloadfile_file_empty(capsys, setup_history_df):
     ''' Tests output for reload() when file is empty'''
-    with patch('plugins.history.os.path.exists', return_value=True), \
-         patch('plugins.history.pd.read_csv', side_effect=pd.errors.EmptyDataError), \
-         patch('plugins.history.data_store.hist_path', 'dummy_path.csv'), \
-         patch('plugins.history.log.error') as mock_log_error:
+    with open(data_store.hist_path, 'w', encoding='utf-8'):
+        pass
 
-        history_command_instance = HistoryCommand()
-        history_command_instance.reloadfile()
+    history_command_instance = HistoryCommand()
+    history_command_instance.reloadfile()
 
-        # Assert that the expected error message was logged
-        expected_error_msg = "File is empty. Starting with an empty DataFrame."
-        mock_log_error.assert_called_with(expected_error_msg)
+    # the table starts empty and the file gets its header back
+    assert "Empty DataFrame" in capsys.readouterr().out
+    assert list(pd.read_csv(data_store.hist_path).columns) == ['num1', 'operand', 'num2', 'result']
 
 @pytest.mark.parametrize("setup_history_df", ['default'], indirect=True)
-def test_clear_function(capsys, setup_history_df):
+def test_clear_function(capsys, setup_history_df, tmp_path):
     ''' Tests output for clear()'''
     with   patch('plugins.history.os.path.exists', return_value=True), \
             patch('plugins.history.HistoryCommand.save') as mock_save, \
-            patch('data_store.hist_path', 'dummy_path.csv'), \
+            patch('data_store.hist_path', str(tmp_path / 'dummy_path.csv')), \
             patch('plugins.history.log.info') as mock_log_info:
 
         history_command_instance = HistoryCommand()
@@ -301,3 +299,87 @@ def test_clear_function(capsys, setup_history_df):
 
         expected_msg = "History - Dataframe cleared"
         mock_log_info.assert_called_with(expected_msg)
+
+
+@pytest.fixture
+def long_history():
+    '''Fixture for a 50 row history table'''
+    data_store.hist_df = pd.DataFrame({
+        'num1': list(range(50)),
+        'operand': ['+'] * 50,
+        'num2': [1] * 50,
+        'result': [i + 1 for i in range(50)]
+    })
+    yield data_store.hist_df
+    del data_store.hist_df
+
+def test_show_default_page(capsys, long_history):
+    ''' Tests show only prints the first page'''
+    HistoryCommand().execute('show')
+
+    captured = capsys.readouterr()
+    assert "-- rows 0 to 19 of 50 --" in captured.out
+    assert "\n20 " not in captured.out
+
+def test_show_range(capsys, long_history):
+    ''' Tests show [start] [count] prints that slice only'''
+    HistoryCommand().execute('show', '30', '5')
+
+    captured = capsys.readouterr()
+    assert captured.out.splitlines()[1].startswith("30 ")
+    assert "-- rows 30 to 34 of 50 --" in captured.out
+
+def test_show_past_the_end(capsys, long_history):
+    ''' Tests show starting at or past the last row prints a message instead of an empty slice'''
+    HistoryCommand().execute('show', '60')
+
+    captured = capsys.readouterr()
+    assert captured.out.strip() == "No rows to show: the table has 50 rows (0 to 49)."
+    assert "Empty DataFrame" not in captured.out
+
+def test_head_and_tail(capsys, long_history):
+    ''' Tests head/tail print from the right end of the table'''
+    history_command_instance = HistoryCommand()
+    history_command_instance.execute('head', '2')
+    assert "-- rows 0 to 1 of 50 --" in capsys.readouterr().out
+
+    history_command_instance.execute('tail', '3')
+    assert "-- rows 47 to 49 of 50 --" in capsys.readouterr().out
+
+def test_show_bad_arguments(long_history):
+    ''' Tests show rejects non integer arguments'''
+    with patch('plugins.history.log.error') as mock_log_error:
+        HistoryCommand().execute('show', 'abc')
+        mock_log_error.assert_called_with("Error: Usage history show [start] [count] with integer arguments")
+
+def test_page_stops_on_quit(capsys, long_history):
+    ''' Tests the pager streams pages until q is entered'''
+    with patch('plugins.history.is_interactive', return_value=True), \
+            patch('builtins.input', side_effect=['', 'q']) as mock_input:
+        HistoryCommand().execute('page', '10')
+
+        assert mock_input.call_count == 2
+        captured = capsys.readouterr()
+        assert "-- rows 10 to 19 of 50 --" in captured.out
+        assert "-- rows 20 to 29 of 50 --" not in captured.out
+
+def test_page_rejects_empty_pages(long_history):
+    ''' Tests page sizes below 1 are rejected instead of paging forever'''
+    with patch('plugins.history.log.error') as mock_log_error, patch('builtins.input') as mock_input:
+        HistoryCommand().execute('page', '0')
+        mock_log_error.assert_called_with("Error: Usage history page [size] with an integer argument of 1 or more")
+        mock_input.assert_not_called()
+
+def test_add_calculations_spills_unsaved():
+    ''' Tests evicted calculations are written to history, skipping saved ones and failed divides'''
+    data_store.hist_df = pd.DataFrame(columns=['num1', 'operand', 'num2', 'result'])
+    saved = Calculation(Decimal('1'), Decimal('1'), add)
+    saved.saved = True
+    calculations = [saved, Calculation(Decimal('6'), Decimal('3'), divide), Calculation(Decimal('1'), Decimal('0'), divide)]
+
+    with patch('plugins.history.save_history') as mock_save:
+        HistoryCommand().add_calculations(calculations)
+
+    assert current_frame().values.tolist() == [['6', '/', '3', '2']]
+    mock_save.assert_called_once()
+    del data_store.hist_df
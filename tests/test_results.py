@@ -0,0 +1,63 @@
+# pylint: disable=trailing-whitespace, missing-final-newline
+'''Tests structured command results and the renderers'''
+import json
+from decimal import Decimal
+from unittest.mock import MagicMock
+import pandas as pd
+import pytest
+from commands import Result, emit, use_renderer
+from commands.results import CollectingRenderer, jsonable
+from plugins.calc import CalcCommand
+from plugins.calc.calculator import Calculations
+from plugins.history import HistoryCommand
+from plugins.history.storage import COLUMNS
+import data_store
+
+@pytest.fixture(autouse=True)
+def empty_history(monkeypatch):
+    '''Commands run against an empty in-memory history'''
+    monkeypatch.setattr(data_store, 'hist_df', pd.DataFrame(columns=COLUMNS), raising=False)
+    yield
+    Calculations.clear_history()
+
+def test_text_renderer_prints_formatted_text(capsys):
+    '''Test the default renderer prints what the formatter makes of the data'''
+    result = emit('greeting', {'name': 'x'}, lambda data: f"hi {data['name']}")
+    assert isinstance(result, Result) and result.data == {'name': 'x'}
+    assert capsys.readouterr().out == "hi x\n"
+
+def test_json_renderer(capsys):
+    '''Test the json renderer prints one object per result with JSON-safe data'''
+    with use_renderer('json'):
+        CalcCommand().execute('divide', '1', '4')
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert lines[0] == {'kind': 'calculation', 'data': {'operation': 'divide', 'a': '1', 'b': '4', 'result': '0.25'}}
+    assert [line['kind'] for line in lines] == ['calculation', 'added', 'saved']
+
+def test_silent_renderer_never_formats(capsys):
+    '''Test silent and collecting renderers do no formatting work'''
+    formatter = MagicMock(return_value='text')
+    with use_renderer('silent'):
+        emit('message', 1, formatter)
+    collector = CollectingRenderer()
+    with use_renderer(collector):
+        emit('message', 2, formatter)
+    formatter.assert_not_called()
+    assert [result.data for result in collector.results] == [2]
+    assert capsys.readouterr().out == ''
+
+def test_commands_return_results():
+    '''Test commands return their Result as well as rendering it'''
+    with use_renderer('silent'):
+        calculation = CalcCommand().execute('sqrt', '9')
+        rows = HistoryCommand().execute('show')
+    assert calculation.kind == 'calculation' and calculation.data['result'] == Decimal('3')
+    assert calculation.text() == 'Result: sqrt 9 = 3'
+    assert rows.kind == 'rows' and rows.data['total'] == 1
+    assert jsonable(rows.data['rows']) == [{'row': 0, 'num1': '9', 'operand': 'sqrt', 'num2': '', 'result': '3'}]
+
+def test_unknown_renderer():
+    '''Test an unknown output format is refused'''
+    with pytest.raises(ValueError, match="Unknown output format 'xml'"):
+        with use_renderer('xml'):
+            pass
@@ -0,0 +1,70 @@
+# pylint: disable=trailing-whitespace, missing-final-newline
+'''Tests compiled subcommand schemas and their dispatch through the CommandHandler'''
+from decimal import Decimal
+from unittest.mock import patch
+import pytest
+from commands import Arg, ArgumentError, Command, CommandHandler, Subcommand, compile_schema, index
+
+class ScoreCommand(Command):
+    ''' dummy command with typed subcommands'''
+    subcommands = {
+        '': Subcommand('usage'),
+        'set': Subcommand('set', (Arg('row', index), Arg('score', Decimal, error="Not a number: {value}"), Arg('note', optional=True)),
+                          "Usage: score set <row> <score> [note]"),
+        'tag': Subcommand('tag', (Arg('tags', rest=True),)),
+        None: Subcommand('other', (Arg('args', rest=True),)),
+    }
+
+    def execute(self, *args):
+        return self.dispatch(args)
+
+    def usage(self):
+        return 'usage'
+
+    def set(self, row, score, note='none'):
+        return (row, score, note)
+
+    def tag(self, *tags):
+        return tags
+
+    def other(self, *args):
+        return ('other',) + tuple(args)
+
+def test_parse_converts_typed_arguments():
+    '''Test typed arguments are converted and optional ones left to the method's defaults'''
+    assert ScoreCommand().execute('set', '3', '1.50') == (3, Decimal('1.50'), 'none')
+    assert ScoreCommand().execute('set', '3', '2', 'late') == (3, Decimal('2'), 'late')
+    assert ScoreCommand().execute() == 'usage'
+    assert ScoreCommand().execute('tag', 'a', 'b', 'c') == ('a', 'b', 'c')
+    assert ScoreCommand().execute('unknown', '1') == ('other', 'unknown', '1')
+
+@pytest.mark.parametrize("args, message", [
+    (['set', '3'], "Usage: score set <row> <score> [note]"),
+    (['set', '1', '2', '3', '4'], "Usage: score set <row> <score> [note]"),
+    (['set', '-1', '2'], "Usage: score set <row> <score> [note]"),
+    (['set', '1', 'abc'], "Not a number: abc"),
+])
+def test_parse_errors(args, message):
+    '''Test wrong counts and failed conversions raise ArgumentError with the declared message'''
+    with pytest.raises(ArgumentError, match=message.replace('[', '\\[').replace(']', '\\]')):
+        compile_schema(ScoreCommand).parse(args)
+
+def test_compiled_once():
+    '''Test a class is compiled once and bad declarations fail at compile time'''
+    assert compile_schema(ScoreCommand) is compile_schema(ScoreCommand)
+
+    class Broken(ScoreCommand):
+        ''' rest argument that is not last'''
+        subcommands = {'x': Subcommand('tag', (Arg('tags', rest=True), Arg('more')))}
+    with pytest.raises(ValueError, match="only the last argument"):
+        compile_schema(Broken)
+
+def test_handler_dispatches_through_schema(capsys):
+    '''Test the handler runs schema commands with converted arguments and logs argument errors'''
+    handler = CommandHandler()
+    handler.register_command('score', ScoreCommand())
+    handler.execute_command('score set 2 7.5')
+    assert capsys.readouterr().out == "(2, Decimal('7.5'), 'none')\n"
+    with patch('logging.error') as mock_error:
+        handler.execute_command('score set x 1')
+    mock_error.assert_called_once_with("Usage: score set <row> <score> [note]")
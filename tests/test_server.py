@@ -0,0 +1,106 @@
+# pylint: disable=trailing-whitespace, missing-final-newline
+'''Tests server mode: JSON-lines requests over a Unix socket'''
+import asyncio
+import json
+from unittest.mock import patch
+import pandas as pd
+import pytest
+from app.server import CommandServer, parse_address
+from commands import CommandHandler
+from plugins.calc import CalcCommand
+from plugins.calc.calculator import Calculations
+from plugins.exit import ExitCommand
+from plugins.hello import HelloCommand
+from plugins.history import HistoryCommand
+from plugins.history.storage import full_frame, COLUMNS
+import data_store
+
+@pytest.fixture
+def command_server(monkeypatch):
+    '''Server over the calc, hello and exit commands with an empty history'''
+    monkeypatch.setattr(data_store, 'hist_df', pd.DataFrame(columns=COLUMNS), raising=False)
+    handler = CommandHandler()
+    handler.register_command('calc', CalcCommand())
+    handler.register_command('hello', HelloCommand())
+    handler.register_command('exit', ExitCommand())
+    server = CommandServer(handler)
+    yield server
+    server.close()
+    Calculations.clear_history()
+
+def talk(server, path, clients):
+    '''Starts the server on path, sends each client's request lines on its own connection, returns the replies'''
+    async def client(lines):
+        reader, writer = await asyncio.open_unix_connection(path)
+        replies = []
+        for line in lines:
+            writer.write(line.encode() + b'\n')
+            await writer.drain()
+            replies.append(json.loads(await reader.readline()))
+        writer.close()
+        return replies
+
+    async def run():
+        listener = await server.start(path)
+        async with listener:
+            return await asyncio.gather(*(client(lines) for lines in clients))
+    return asyncio.run(run())
+
+def test_parse_address():
+    '''Test digits are a localhost TCP port and anything else a socket path'''
+    assert parse_address('8765') == ('127.0.0.1', 8765)
+    assert parse_address('/tmp/calc.sock') == '/tmp/calc.sock'
+
+def test_replies(command_server, tmp_path):
+    '''Test replies carry the request id, the command's results and the logged errors'''
+    [replies] = talk(command_server, str(tmp_path / 'calc.sock'), [[
+        json.dumps({'id': 1, 'command': 'calc', 'args': ['add', '1', '2']}),
+        json.dumps({'id': 2, 'command': 'calc divide 1 0'}),
+        json.dumps({'id': 3, 'command': 'hello'}),
+        json.dumps({'id': 4, 'command': 'exit'}),
+        json.dumps({'id': 5, 'command': 'hello', 'args': ['extra']}),
+        'not json',
+        json.dumps({'id': 7}),
+    ]])
+    assert [reply['id'] for reply in replies] == [1, 2, 3, 4, 5, None, 7]
+    assert replies[0]['ok'] and replies[0]['results'][0] == {'kind': 'calculation', 'data': {'operation': 'add', 'a': '1', 'b': '2', 'result': '3'}}
+    assert replies[0]['results'][1] == {'kind': 'added', 'data': {'num1': '1', 'operand': '+', 'num2': '2', 'result': '3'}}
+    assert replies[1]['errors'] == ['An error occurred: Cannot divide by zero']
+    assert replies[2] == {'id': 3, 'ok': True, 'results': [{'kind': 'message', 'data': 'Hello, World!'}], 'output': [], 'errors': [], 'ms': replies[2]['ms']}
+    assert replies[3]['errors'] == ["Error: 'exit' ends the app, stop the server instead"]
+    assert not replies[4]['ok'] and 'failed' in replies[4]['errors'][0]
+    assert replies[5]['errors'][0].startswith('Invalid request')
+    assert replies[6]['errors'] == ["Invalid request: missing 'command'"]
+
+@pytest.mark.parametrize('args', ['add 1 2', ['add', 1, 2], {'a': '1'}, None])
+def test_rejects_args_that_are_not_a_list_of_strings(command_server, args):
+    '''Test args sent as a string, numbers or any other type are refused instead of run'''
+    reply = command_server.handle_line(json.dumps({'id': 1, 'command': 'calc', 'args': args}).encode())
+    assert reply['errors'] == ["Invalid request: 'args' must be a list of strings"] and not reply['ok']
+    assert not Calculations.get_history()
+
+def test_concurrent_clients_share_history(command_server, tmp_path):
+    '''Test every calculation from many concurrent clients lands in history exactly once'''
+    clients = [[json.dumps({'id': i, 'command': f'calc add {client} {i}'}) for i in range(20)] for client in range(5)]
+    results = talk(command_server, str(tmp_path / 'calc.sock'), clients)
+    assert all(reply['ok'] for replies in results for reply in replies)
+    rows = full_frame()
+    assert len(rows) == 100
+    assert set(zip(rows['num1'], rows['num2'])) == {(str(client), str(i)) for client in range(5) for i in range(20)}
+
+def test_refuses_path_that_is_not_a_socket(command_server, tmp_path):
+    '''Test the server will not delete a regular file to listen on its path'''
+    precious = tmp_path / 'calc_history.csv'
+    precious.write_text('num1,operand,num2,result\n')
+    assert asyncio.run(command_server.start(str(precious))) is None
+    assert asyncio.run(command_server.serve_forever(str(precious))) is False
+    assert precious.read_text() == 'num1,operand,num2,result\n'
+
+def test_page_does_not_prompt(command_server, tmp_path):
+    '''Test history page replies with every page instead of waiting on the server's stdin'''
+    command_server.command_handler.register_command('history', HistoryCommand())
+    with patch('builtins.input', side_effect=AssertionError("prompted")):
+        [replies] = talk(command_server, str(tmp_path / 'calc.sock'), [
+            [json.dumps({'id': i, 'command': f'calc add {i} {i}'}) for i in range(3)] +
+            [json.dumps({'id': 3, 'command': 'history page 1'})]])
+    assert replies[3]['ok'] and [result['data']['start'] for result in replies[3]['results']] == [0, 1, 2]
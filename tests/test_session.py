@@ -0,0 +1,87 @@
+# pylint: disable=trailing-whitespace, missing-final-newline
+'''Tests sessions: separate history, calculation log and cells per session, run on the handler's thread pool'''
+import os
+from unittest.mock import patch
+import pytest
+from app import App
+from app.session import Session
+from commands import CommandHandler
+from plugins.calc import CalcCommand
+from plugins.calc.calculator import Calculations
+from plugins.calc.calculator.cells import Cells
+from plugins.history import HistoryCommand
+from plugins.history.storage import Autosaver, current_frame
+import data_store
+
+@pytest.fixture
+def handler():
+    '''Handler over the calc and history commands, its thread pool stopped afterwards'''
+    command_handler = CommandHandler(workers=4)
+    command_handler.register_command('calc', CalcCommand())
+    command_handler.register_command('history', HistoryCommand())
+    yield command_handler
+    command_handler.shutdown()
+
+def make_session(name, tmp_path):
+    '''Session whose history file is only written on close'''
+    session = Session(name, str(tmp_path / f'{name}.csv'))
+    session.store.autosaver = Autosaver(policy='exit', flush=lambda fsync=False: None)
+    return session
+
+def test_sessions_keep_their_own_state(handler, tmp_path):
+    '''Test history, calculations and cells of one session are invisible to another and to the defaults'''
+    first, second = make_session('first', tmp_path), make_session('second', tmp_path)
+    with first.activate():
+        handler.execute_command('calc add 1 2')
+        handler.execute_command('calc set x 5')
+    with second.activate():
+        handler.execute_command('calc multiply 3 4')
+        assert current_frame()['result'].tolist() == [12]
+        assert handler.execute_command('calc expr x') is None  # x is the first session's cell
+    with first.activate():
+        assert current_frame()['result'].tolist() == [3]
+        assert handler.execute_command('calc expr x+1').data['result'] == 6
+    assert [calc.perform() for calc in first.calculations.get_history()] == [3, 6]
+    assert [calc.perform() for calc in second.calculations.get_history()] == [12]
+    assert not Calculations.get_history() and 'x' not in Cells.values
+    assert getattr(data_store, 'hist_df', None) is None or len(data_store.hist_df) == 0
+
+def test_submit_runs_sessions_side_by_side(handler, tmp_path):
+    '''Test commands submitted for many sessions all land in their own session, in submission order'''
+    sessions = [make_session(f's{number}', tmp_path) for number in range(6)]
+    futures = [(session, handler.submit(session, f'calc add {number} {step}'))
+               for step in range(25) for number, session in enumerate(sessions)]
+    results = [(session, future.result(timeout=30)) for session, future in futures]
+    assert all(result.kind == 'calculation' for _, result in results)
+    for number, session in enumerate(sessions):
+        with session.activate():
+            rows = current_frame()
+        assert rows['num1'].tolist() == [str(number)] * 25
+        assert rows['num2'].tolist() == [str(step) for step in range(25)]
+        assert len(session.calculations.get_history()) == 25
+    assert not handler.queues
+
+def test_open_session_uses_its_own_file(tmp_path):
+    '''Test App.open_session gives a session its own history file, saved by close_session'''
+    with patch('app.App.setup_log'), patch('app.App.setup_env_vars') as mock_setup_env_vars:
+        mock_setup_env_vars.return_value = {'HIST_FILE_PATH': str(tmp_path), 'HIST_AUTOSAVE': 'exit', 'CALC_HISTORY_SIZE': '5'}
+        app = App()
+    app.command_handler.register_command('calc', CalcCommand())
+    session = app.open_session('alice')
+    assert session.store.hist_path == os.path.join(str(tmp_path), 'calc_history-alice.csv')
+    assert session.calculations.history.maxlen == 5 and Calculations.history.maxlen is None
+    app.command_handler.submit(session, 'calc subtract 9 4').result(timeout=30)
+    app.command_handler.shutdown()
+    app.close_session(session)
+    with open(session.store.hist_path, encoding='utf-8') as history_file:
+        assert history_file.read().splitlines()[-1] == '9,-,4,5'
+
+def test_open_session_checks_the_name(tmp_path):
+    '''Test a session name cannot point its history file outside HIST_FILE_PATH'''
+    with patch('app.App.setup_log'), patch('app.App.setup_env_vars') as mock_setup_env_vars:
+        mock_setup_env_vars.return_value = {'HIST_FILE_PATH': str(tmp_path / 'sessions')}
+        app = App()
+    for name in ['../x', 'a/b', '']:
+        with pytest.raises(ValueError, match="Invalid session name"):
+            app.open_session(name)
+    assert not list(tmp_path.rglob('calc_history*'))
@@ -0,0 +1,67 @@
+# pylint: disable=unnecessary-dunder-call, invalid-name, line-too-long, trailing-whitespace, missing-final-newline
+''' This module tests batch evaluation with Calculator.evaluate_many'''
+from decimal import Decimal
+import numpy as np
+import pytest
+from plugins.calc.calculator import Calculator
+from plugins.calc.calculator.calculations import Calculations
+from plugins.calc.calculator.operations import add, divide
+
+@pytest.fixture(autouse=True)
+def clear_calculations():
+    '''Starts every test with an empty calculation history'''
+    Calculations.clear_history()
+    yield
+    Calculations.clear_history()
+
+def test_decimal_engine_exact():
+    '''Test the decimal engine gives the same results as the scalar path'''
+    result = Calculator.evaluate_many('add', ['0.1', '1'], ['0.2', '2'])
+    assert result.results.tolist() == [Decimal('0.3'), Decimal('3')]
+    assert not result.errors.any()
+
+def test_float_engine():
+    '''Test the float engine works on numpy arrays'''
+    result = Calculator.evaluate_many('multiply', np.arange(4), np.full(4, 2.5), engine='float')
+    assert result.results.dtype == np.float64
+    assert result.results.tolist() == [0.0, 2.5, 5.0, 7.5]
+
+@pytest.mark.parametrize("engine", ['float', 'decimal'])
+def test_divide_by_zero_masked(engine):
+    '''Test dividing by zero flags the pair instead of raising'''
+    result = Calculator.evaluate_many(divide, [1, 2, 3], [2, 0, 4], engine=engine)
+    assert result.errors.tolist() == [False, True, False]
+    assert result.results[0] == Decimal('0.5')
+    assert result.results[2] == Decimal('0.75')
+    if engine == 'float':
+        assert np.isnan(result.results[1])
+    else:
+        assert result.results[1] is None
+
+@pytest.mark.parametrize("engine", ['float', 'decimal', 'fixed'])
+def test_sqrt_masks_rows_without_a_root(engine):
+    '''Test sqrt flags negative and non-finite operands in every engine instead of raising'''
+    result = Calculator.evaluate_many('sqrt', ['4', '-1', 'nan', 'inf'], engine=engine, record=False)
+    assert result.errors.tolist() == [False, True, True, True]
+    root = result.as_decimal()[0] if engine == 'fixed' else result.results[0]
+    assert root == 2
+
+def test_history_recorded_in_bulk():
+    '''Test every pair is recorded, failed divides included, and record=False skips it'''
+    Calculator.evaluate_many('divide', np.array([4, 1]), np.array([2, 0]))
+    history = Calculations.get_history()
+    assert len(history) == 2
+    assert history[0].perform() == 2
+    assert history[1].operation is divide
+
+    Calculator.evaluate_many(add, [1], [1], record=False)
+    assert len(Calculations.get_history()) == 2
+
+def test_bad_arguments():
+    '''Test unknown operations and engines and mismatched lengths are rejected'''
+    with pytest.raises(ValueError, match="Unknown operation"):
+        Calculator.evaluate_many('power', [1], [1])
+    with pytest.raises(ValueError, match="Unknown engine"):
+        Calculator.evaluate_many('add', [1], [1], engine='gpu')
+    with pytest.raises(ValueError, match="differ in length"):
+        Calculator.evaluate_many('add', [1, 2], [1])
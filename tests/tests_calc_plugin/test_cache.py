@@ -0,0 +1,66 @@
+# pylint: disable=unnecessary-dunder-call, invalid-name, line-too-long, trailing-whitespace, missing-final-newline
+''' This module tests the opt-in result cache behind Calculator's scalar operations'''
+import decimal
+from decimal import Decimal
+import pytest
+from plugins.calc.calculator import Calculator
+from plugins.calc.calculator.calculations import Calculations
+from plugins.calc.calculator.cache import ResultCache
+from plugins.calc.calculator.operations import add, divide
+
+@pytest.fixture
+def cache():
+    '''Turns a two-entry cache on for the test, and off again after it'''
+    Calculations.clear_history()
+    yield Calculator.enable_cache(2)
+    Calculator.disable_cache()
+    Calculations.clear_history()
+
+def test_hits_and_misses(cache):
+    '''Test a repeated call is served from the cache and counted'''
+    assert Calculator.add(Decimal('1'), Decimal('2')) == 3
+    assert Calculator.add(Decimal('1'), Decimal('2')) == 3
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.size) == (1, 1, 1)
+
+def test_history_unchanged(cache):
+    '''Test cached calls are still recorded in Calculations.history'''
+    for _ in range(3):
+        Calculator.multiply(Decimal('2'), Decimal('3'))
+    assert len(Calculations.get_history()) == 3
+    assert Calculations.get_latest_calc().perform() == 6
+
+def test_lru_eviction(cache):
+    '''Test the least recently used entry is the one evicted'''
+    Calculator.add(Decimal('1'), Decimal('1'))
+    Calculator.add(Decimal('2'), Decimal('2'))
+    Calculator.add(Decimal('1'), Decimal('1'))  # 1+1 is now the most recently used
+    Calculator.add(Decimal('3'), Decimal('3'))  # evicts 2+2
+    Calculator.add(Decimal('1'), Decimal('1'))
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions) == (2, 3, 1)
+
+def test_divide_by_zero_cached(cache):
+    '''Test a failing call is cached and raises a fresh exception on every hit'''
+    errors = []
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Cannot divide by zero") as error:
+            Calculator.divide(Decimal('1'), Decimal('0'))
+        errors.append(error.value)
+    assert errors[0] is not errors[1]
+    assert cache.stats().hits == 1
+
+def test_key_is_exact_and_context_aware():
+    '''Test operands are keyed by their exact Decimal text, and precision is part of the key'''
+    results = ResultCache()
+    assert str(results.perform(add, Decimal('2.0'), Decimal('1'))) == '3.0'
+    assert str(results.perform(add, Decimal('2'), Decimal('1'))) == '3'
+    with decimal.localcontext(prec=5):
+        assert str(results.perform(divide, Decimal('1'), Decimal('3'))) == '0.33333'
+    assert str(results.perform(divide, Decimal('1'), Decimal('3'))) == '0.' + '3' * 28
+    assert results.stats().misses == 4
+
+def test_bad_size():
+    '''Test a cache needs room for at least one entry'''
+    with pytest.raises(ValueError):
+        ResultCache(0)
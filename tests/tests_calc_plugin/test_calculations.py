@@ -2,6 +2,7 @@
 ''' This module will test at the Calculations level to test historical storage
 and retireval'''
 from decimal import Decimal
+import tracemalloc
 import pytest
 from plugins.calc.calculator.calculation import Calculation
 from plugins.calc.calculator.calculations import Calculations
@@ -64,3 +65,127 @@ def test_find_by_operation(setup_calculations):
     multiply_operations = Calculations.find_by_operation("multiply")
     # Test for exactly 1 multiply calc based on fixture
     assert len(multiply_operations) == 1, "Did not find the correct number of calculations with multiply operation"
+
+
+@pytest.fixture
+def bounded():
+    """Restores the default capacity and eviction policy after a test reconfigures them"""
+    Calculations.clear_history()
+    yield
+    Calculations.clear_history()
+    Calculations.configure()
+
+def test_calculation_has_no_dict():
+    """Test Calculation records are slotted, so they carry no per-instance __dict__"""
+    calc = Calculation(Decimal('1'), Decimal('2'), add)
+    assert not hasattr(calc, '__dict__')
+    with pytest.raises(AttributeError):
+        calc.extra = 1
+
+def test_default_keeps_every_calculation(bounded):
+    """Test history is unbounded until configured, and get_history returns a list"""
+    Calculations.add_many([Decimal(i) for i in range(20_001)], [Decimal('1')] * 20_001, add)
+    history = Calculations.get_history()
+    assert isinstance(history, list) and len(history) == 20_001 and history[0].a == 0
+
+def test_ring_buffer_drops_oldest(bounded):
+    """Test a full history evicts its oldest calculations"""
+    Calculations.configure(3)
+    for i in range(5):
+        Calculations.add_to_history(Calculation(Decimal(i), Decimal('1'), add))
+    assert [calc.a for calc in Calculations.get_history()] == [2, 3, 4]
+    assert Calculations.get_latest_calc().a == 4
+
+def test_spill_hands_evicted_in_order(bounded):
+    """Test the spill policy passes evicted calculations on oldest first, one by one and in bulk"""
+    spilled = []
+    Calculations.configure(2, 'spill', spilled.extend)
+    for i in range(3):
+        Calculations.add_to_history(Calculation(Decimal(i), Decimal('1'), add))
+    Calculations.add_many([Decimal(i) for i in range(3, 8)], [Decimal('1')] * 5, add)
+
+    assert [calc.a for calc in spilled] == [0, 1, 2, 3, 4, 5]
+    assert [calc.a for calc in Calculations.get_history()] == [6, 7]
+
+def test_configure_rejects_bad_policy(bounded):
+    """Test unknown policies, and spill without a spill function, are rejected"""
+    with pytest.raises(ValueError, match="Unknown eviction"):
+        Calculations.configure(10, 'lru')
+    with pytest.raises(ValueError, match="spill function"):
+        Calculations.configure(10, 'spill')
+
+def test_memory_flat_when_bounded(bounded):
+    """Test memory stops growing once the history is full (tracemalloc)"""
+    Calculations.configure(1000)
+
+    def add_batch():
+        for i in range(5000):
+            Calculations.add_to_history(Calculation(Decimal(i), Decimal(i + 1), add))
+
+    tracemalloc.start()
+    try:
+        add_batch()
+        after_first, _ = tracemalloc.get_traced_memory()
+        for _ in range(4):
+            add_batch()
+        after_last, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # 20000 more calculations, yet (almost) no more memory than after the first 5000
+    assert after_last - after_first < 64 * 1024
+    assert len(Calculations.get_history()) == 1000
+
+def test_find_by_operand(setup_calculations):
+    """Test the operand index matches either operand, whatever the spelling of the number"""
+    assert len(Calculations.find_by_operand(Decimal('20'))) == 5
+    assert [calc.operation for calc in Calculations.find_by_operand('4.0')] == [subtract]
+    assert not Calculations.find_by_operand(7)
+
+def test_get_latest_for_operation(setup_calculations):
+    """Test the latest N calculations of one operation come back newest first"""
+    Calculations.add_to_history(Calculation(Decimal('1'), Decimal('1'), subtract))
+    assert [calc.b for calc in Calculations.get_latest('subtract', 2)] == [Decimal('1'), Decimal('4')]
+    assert not Calculations.get_latest('power', 2)
+
+def test_find_by_result(setup_calculations):
+    """Test result range queries, including calculations added after the index was sorted"""
+    assert [calc.perform() for calc in Calculations.find_by_result(4, 16)] == [4, 15, 16]
+    Calculations.add_to_history(Calculation(Decimal('5'), Decimal('0'), divide))
+    Calculations.add_to_history(Calculation(Decimal('5'), Decimal('5'), add))
+    assert [calc.perform() for calc in Calculations.find_by_result('10', '15')] == [10, 15]
+
+def test_indexes_follow_eviction_and_clear(bounded):
+    """Test evicted and cleared calculations drop out of every index"""
+    Calculations.configure(2)
+    for i in range(4):
+        Calculations.add_to_history(Calculation(Decimal(i), Decimal(i), multiply))
+    assert [calc.a for calc in Calculations.find_by_operation('multiply')] == [2, 3]
+    assert not Calculations.find_by_operand(1)
+    assert [calc.a for calc in Calculations.find_by_result(0, 100)] == [2, 3]
+
+    Calculations.clear_history()
+    assert not Calculations.find_by_operation('multiply')
+    assert not Calculations.find_by_result(0, 100)
+
+def test_bulk_indexes_follow_eviction(bounded):
+    """Test a batch is indexed by the first query after it, also when part of it was evicted before"""
+    Calculations.configure(6)
+    Calculations.add_many([Decimal(i) for i in range(4)], [Decimal('1')] * 4, add)
+    assert [calc.a for calc in Calculations.find_by_operand(2)] == [2]
+    assert [calc.a for calc in Calculations.find_by_result(2, 3)] == [1, 2]
+    Calculations.add_many([Decimal(i) for i in range(4, 9)], [Decimal('1')] * 5, add)
+
+    assert [calc.a for calc in Calculations.get_history()] == [3, 4, 5, 6, 7, 8]
+    assert not Calculations.find_by_operand(2) and 2 not in Calculations.by_operand
+    assert [calc.a for calc in Calculations.find_by_operand(1)] == [3, 4, 5, 6, 7, 8]
+    assert [calc.a for calc in Calculations.find_by_result(0, 100)] == [3, 4, 5, 6, 7, 8]
+
+def test_nan_results_not_ordered(bounded):
+    """Test NaN operands and results are kept in history but never matched by value or range"""
+    Calculations.add_to_history(Calculation(Decimal('NaN'), Decimal('1'), add))
+    Calculations.add_many([Decimal('2'), Decimal('NaN')], [Decimal('1'), Decimal('NaN')], multiply)
+    assert [calc.a for calc in Calculations.find_by_result(0, 10)] == [2]
+    assert not Calculations.find_by_result('NaN', 10)
+    assert not Calculations.find_by_operand('NaN')
+    assert [str(calc.a) for calc in Calculations.find_by_operand(1)] == ['NaN', '2']
+    assert len(Calculations.get_history()) == 3
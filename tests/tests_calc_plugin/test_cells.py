@@ -0,0 +1,86 @@
+# pylint: disable=unnecessary-dunder-call, invalid-name, line-too-long, trailing-whitespace, missing-final-newline
+''' This module tests named cells and their incremental recalculation'''
+from decimal import Decimal
+from unittest.mock import patch
+import pytest
+from plugins.calc.calculator.calculations import Calculations
+from plugins.calc.calculator.cells import Cells
+
+@pytest.fixture(autouse=True)
+def cells():
+    '''Starts each test with no cells'''
+    Cells.clear()
+    yield Cells
+    Cells.clear()
+    Calculations.clear_history()
+
+def test_set_and_let():
+    '''Test a formula cell is computed from the cells it reads'''
+    assert Cells.set('x', '5') == [('x', Decimal('5'))]
+    assert Cells.let('y', 'x * 3') == [('y', Decimal('15'))]
+    assert Cells.describe('y') == 'y = x * 3 = 15'
+
+def test_change_recomputes_descendants_in_order():
+    '''Test changing an input recomputes every cell below it, each after the cells it reads'''
+    Cells.set('x', '1')
+    Cells.set('unrelated', '1')
+    Cells.let('a', 'x + 1')
+    Cells.let('b', 'a * 2')
+    Cells.let('c', 'a + b + x')
+    Cells.let('d', 'unrelated * 2')
+    changed = Cells.set('x', '2')
+    assert changed == [('x', Decimal('2')), ('a', Decimal('3')), ('b', Decimal('6')), ('c', Decimal('11'))]
+    assert Cells.values['d'] == 2
+
+def test_recalculation_scales_with_change():
+    '''Test a change only evaluates the formulas below it, however many other cells there are'''
+    for chain in range(200):
+        Cells.set(f'x{chain}', chain)
+        Cells.let(f'y{chain}', f'x{chain} + 1')
+    with patch.object(Cells, '_evaluate', wraps=Cells._evaluate) as mock_evaluate:
+        Cells.set('x7', '100')
+    assert [call.args[0] for call in mock_evaluate.call_args_list] == ['y7']
+    assert Cells.values['y7'] == 101
+
+def test_unchanged_value_stops_propagation():
+    '''Test cells below a formula whose value did not change are not recomputed'''
+    Cells.set('x', '2')
+    Cells.let('sign', 'x / x')
+    Cells.let('z', 'sign * 10')
+    with patch.object(Cells, '_evaluate', wraps=Cells._evaluate) as mock_evaluate:
+        Cells.set('x', '5')
+    assert [call.args[0] for call in mock_evaluate.call_args_list] == ['sign']
+    assert Cells.set('x', '5') == []
+
+def test_errors_propagate():
+    '''Test a failing formula leaves its dependents without a value until it recovers'''
+    Cells.set('x', '0')
+    Cells.let('inverse', '1 / x')
+    Cells.let('double', 'inverse * 2')
+    assert Cells.describe('double') == 'double = inverse * 2 = error (inverse has no value)'
+    Cells.set('x', '4')
+    assert Cells.values['double'] == Decimal('0.5')
+
+def test_invalid_definitions():
+    '''Test unknown cells, cycles and bad names are refused without changing anything'''
+    Cells.set('x', '1')
+    Cells.let('y', 'x + 1')
+    with pytest.raises(ValueError, match="Unknown cell: nope"):
+        Cells.let('z', 'nope + 1')
+    with pytest.raises(ValueError, match="Circular reference"):
+        Cells.let('x', 'y + 1')
+    with pytest.raises(ValueError, match="Circular reference"):
+        Cells.let('y', 'y + 1')
+    with pytest.raises(ValueError, match="Invalid cell name"):
+        Cells.set('2x', '1')
+    assert Cells.describe('y') == 'y = x + 1 = 2'
+
+def test_decimal_signals_are_cell_errors():
+    '''Test inf - inf and the square root of NaN leave an error cell and an intact graph'''
+    Cells.set('x', 'inf')
+    assert Cells.let('y', 'x - x') == [('y', None)]
+    assert Cells.describe('y') == 'y = x - x = error (invalid arithmetic: InvalidOperation)'
+    Cells.set('n', 'nan')
+    assert Cells.let('r', 'sqrt(n)') == [('r', None)]
+    assert Cells.set('x', '2') == [('x', Decimal('2')), ('y', Decimal('0'))]
+    assert [cell for cell in Cells.values] == ['x', 'y', 'n', 'r']
@@ -0,0 +1,83 @@
+# pylint: disable=unnecessary-dunder-call, invalid-name, line-too-long, trailing-whitespace, missing-final-newline
+''' This module tests the calc expr compiler'''
+from decimal import Decimal
+import pytest
+from plugins.calc.calculator.calculations import Calculations
+from plugins.calc.calculator.registry import register_operation, unregister_operation
+from plugins.calc.calculator.expression import compile_expression
+
+@pytest.fixture(autouse=True)
+def clear_history():
+    '''Each scalar evaluation records its steps in Calculations'''
+    yield
+    Calculations.clear_history()
+
+@pytest.mark.parametrize("source, expected", [
+    ('1 + 2 * 3', Decimal('7')),
+    ('(1 + 2) * 3', Decimal('9')),
+    ('10 - 4 - 3', Decimal('3')),
+    ('8 / 4 / 2', Decimal('1')),
+    ('-2 * -3 + +1', Decimal('7')),
+    ('sqrt(16) + divide(1, 4)', Decimal('4.25')),
+    ('1.5e2 / .5', Decimal('3E+2')),
+])
+def test_precedence(source, expected):
+    '''Test precedence, associativity, unary signs and operation calls'''
+    assert compile_expression(source).evaluate() == expected
+
+def test_variables():
+    '''Test variables are listed in order of first use and bound at evaluation'''
+    expression = compile_expression('(a + 2) * sqrt(b) / -a')
+    assert expression.variables == ('a', 'b')
+    assert expression.evaluate({'a': '2'}, b=9) == Decimal('-6')
+    with pytest.raises(ValueError, match="No value given for b"):
+        expression.evaluate(a=1)
+
+def test_steps_go_through_calculator():
+    '''Test every operation node is a Calculator calculation'''
+    compile_expression('a * b + 1').evaluate(a=2, b=3)
+    assert [calc.operation.__name__ for calc in Calculations.get_history()] == ['multiply', 'add']
+
+def test_cached_by_source():
+    '''Test the same source text is compiled only once'''
+    compile_expression.cache_clear()
+    first = compile_expression('x / 3')
+    assert compile_expression('x / 3') is first
+    assert compile_expression.cache_info().hits == 1
+
+def test_registry_changes_drop_compiled():
+    '''Test expressions compiled before an operation is replaced or removed do not keep the old one'''
+    register_operation('power', '^', lambda a, b: a ** b)
+    assert compile_expression('power(2, 3)').evaluate() == 8
+    register_operation('power', '^', lambda a, b: a * b)
+    assert compile_expression('power(2, 3)').evaluate() == 6
+    unregister_operation('power')
+    with pytest.raises(ValueError, match="unknown operation 'power'"):
+        compile_expression('power(2, 3)')
+
+@pytest.mark.parametrize("source, message", [
+    ('1 +', 'unexpected end at position 3'),
+    ('(1 + 2', 'unexpected end'),
+    ('1 $ 2', "unexpected '\\$' at position 2"),
+    ('2 3', "unexpected '3'"),
+    ('power(2, 3)', "unknown operation 'power'"),
+    ('sqrt(1, 2)', 'sqrt takes 1 operand'),
+])
+def test_invalid(source, message):
+    '''Test malformed expressions raise ValueError with where they went wrong'''
+    with pytest.raises(ValueError, match=message):
+        compile_expression(source)
+
+def test_divide_by_zero():
+    '''Test a failing step raises like the calc command does'''
+    with pytest.raises(ValueError, match="Cannot divide by zero"):
+        compile_expression('1 / (x - 1)').evaluate(x=1)
+
+@pytest.mark.parametrize("engine", ['decimal', 'float'])
+def test_evaluate_many(engine):
+    '''Test batch evaluation matches scalar evaluation and flags rows any step fails on'''
+    expression = compile_expression('sqrt(a) / (b - 1)')
+    batch = expression.evaluate_many({'a': ['4', '-4', '9', '16'], 'b': ['3', '3', '1', '5']}, engine)
+    assert batch.errors.tolist() == [False, True, True, False]
+    assert [float(value) for value in batch.results[~batch.errors]] == [1.0, 1.0]
+    assert len(Calculations.get_history()) == 0
@@ -0,0 +1,98 @@
+# pylint: disable=unnecessary-dunder-call, invalid-name, line-too-long, trailing-whitespace, missing-final-newline
+''' This module tests the fixed-point batch engine'''
+from decimal import Decimal, ROUND_HALF_EVEN, InvalidOperation
+import numpy as np
+import pytest
+from plugins.calc.calculator import Calculator
+from plugins.calc.calculator.fixed import to_fixed, local_scale, get_scale, set_scale
+
+@pytest.mark.parametrize("text, expected", [
+    ('1.5', 1500000),
+    ('-.5', -500000),
+    ('+2', 2000000),
+    ('1e2', 100000000),
+    ('0.0000025', 2),  # more decimals than the scale: ties go to even
+    ('0.0000035', 4),
+])
+def test_to_fixed(text, expected):
+    '''Test operands parse into scaled integers, rounding half to even past the scale'''
+    assert to_fixed(text) == expected
+
+@pytest.mark.parametrize("text", ['', '.', '-', 'abc', '.-5', '1.2.3', 'NaN'])
+def test_to_fixed_invalid(text):
+    '''Test malformed operands raise like Decimal does'''
+    with pytest.raises((ValueError, InvalidOperation)):
+        to_fixed(text)
+
+@pytest.mark.parametrize("name", ['add', 'subtract', 'multiply', 'divide'])
+def test_matches_decimal(name):
+    '''Test every result equals the exact Decimal result rounded half to even at the scale'''
+    rng = np.random.default_rng(0)
+    a_values = [f'{value:.6f}' for value in rng.uniform(-1000, 1000, 500)]
+    b_values = [f'{value:.6f}' for value in rng.uniform(-1000, 1000, 500)] + ['0.000001', '-0.000003']
+    a_values += ['0.000005', '0.000005']
+    batch = Calculator.evaluate_many(name, a_values, b_values, engine='fixed', record=False)
+    exact = Calculator.evaluate_many(name, a_values, b_values, engine='decimal', record=False)
+    expected = [value.quantize(Decimal('0.000001'), ROUND_HALF_EVEN) for value in exact.results]
+    assert batch.as_decimal().tolist() == expected
+    assert len(str(batch.as_decimal()[0]).split('.')[1]) == 6
+
+def test_results_stay_integers():
+    '''Test results are scaled int64 values until they are converted for display'''
+    batch = Calculator.evaluate_many('add', np.array([1, 2]), ['0.5', '-2.25'], engine='fixed', record=False)
+    assert batch.results.dtype == np.int64 and batch.scale == 6
+    assert batch.results.tolist() == [1500000, -250000]
+
+def test_divide_by_zero_and_ties():
+    '''Test zero divisors are flagged and halves round to the even neighbour'''
+    batch = Calculator.evaluate_many('divide', ['1', '0.000005', '-0.000005', '0.000007'], ['0', '2', '2', '2'], engine='fixed', record=False)
+    assert batch.errors.tolist() == [True, False, False, False]
+    assert batch.as_decimal().tolist() == [None, Decimal('0.000002'), Decimal('-0.000002'), Decimal('0.000004')]
+
+def test_large_values_stay_exact():
+    '''Test operands and products past int64 switch to Python ints instead of overflowing'''
+    batch = Calculator.evaluate_many('multiply', ['123456789.123', '9223372036854.775807'], ['987654321.987', '2'], engine='fixed', record=False)
+    assert batch.as_decimal().tolist() == [Decimal('121932631355968601.347401'), Decimal('18446744073709.551614')]
+
+def test_scale():
+    '''Test local_scale changes the decimals kept inside its block only, and set_scale everywhere'''
+    with local_scale(2):
+        assert Calculator.evaluate_many('divide', ['2'], ['3'], engine='fixed', record=False).as_decimal()[0] == Decimal('0.67')
+    assert get_scale() == 6
+    set_scale(0)
+    try:
+        assert Calculator.evaluate_many('add', ['1.5'], ['1'], engine='fixed', record=False).as_decimal()[0] == 3
+    finally:
+        set_scale(6)
+    with pytest.raises(ValueError):
+        set_scale(-1)
+
+def test_other_operations_rounded():
+    '''Test operations without an integer version run on Decimal and are rounded to the scale'''
+    batch = Calculator.evaluate_many('sqrt', ['2', '-1'], engine='fixed', record=False)
+    assert batch.as_decimal().tolist() == [Decimal('1.414214'), None]
+    assert batch.errors.tolist() == [False, True]
+
+def test_default_engine():
+    '''Test evaluate_many uses Calculator.engine when no engine is named'''
+    Calculator.engine = 'fixed'
+    try:
+        assert str(Calculator.evaluate_many('add', ['1'], ['2'], record=False).as_decimal()[0]) == '3.000000'
+    finally:
+        Calculator.engine = 'decimal'
+
+def test_bulk_parse_matches_to_fixed():
+    '''Test operands parsed in bulk agree with to_fixed, including the ones left to it'''
+    texts = ['1', '-0.5', '+.25', '1e3', ' 7', '12345678901.123456', '99999999999999.999999', '0.0000005', '5.', '-0']
+    batch = Calculator.evaluate_many('add', texts, ['0'] * len(texts), engine='fixed', record=False)
+    assert batch.results.tolist() == [to_fixed(text) for text in texts]
+
+def test_multiply_split_matches_decimal():
+    '''Test products too large for int64 in one step, but split into whole units and the rest, round correctly'''
+    rng = np.random.default_rng(1)
+    a_values = [f'{value:.6f}' for value in rng.uniform(-1e5, 1e5, 300)] + ['100000.000001', '3.000001']
+    b_values = [f'{value:.6f}' for value in rng.uniform(-1e5, 1e5, 300)] + ['0.5', '-0.5']  # exact ties
+    batch = Calculator.evaluate_many('multiply', a_values, b_values, engine='fixed', record=False)
+    assert batch.results.dtype == np.int64
+    expected = [(Decimal(a) * Decimal(b)).quantize(Decimal('0.000001'), ROUND_HALF_EVEN) for a, b in zip(a_values, b_values)]
+    assert batch.as_decimal().tolist() == expected
@@ -0,0 +1,47 @@
+# pylint: disable=unnecessary-dunder-call, invalid-name, line-too-long, trailing-whitespace, missing-final-newline
+''' This module tests the process-pool Decimal engine'''
+import decimal
+from decimal import Decimal
+import pytest
+from plugins.calc.calculator import Calculator
+from plugins.calc.calculator.calculations import Calculations
+
+@pytest.fixture(autouse=True)
+def clear_calculations():
+    '''Starts every test with an empty calculation history'''
+    Calculations.clear_history()
+    yield
+    Calculations.clear_history()
+
+@pytest.fixture(scope='module')
+def pool():
+    '''One two-worker pool at 50 digits of precision, shared by the tests in this module'''
+    with decimal.localcontext(prec=50):
+        with Calculator.make_pool(2) as shared_pool:
+            yield shared_pool
+
+def test_results_in_input_order(pool):
+    '''Test the sharded results come back in input order and match the serial engine'''
+    a_values = [Decimal(i) for i in range(1, 101)]
+    b_values = [Decimal(i % 7) for i in range(1, 101)]
+    with decimal.localcontext(prec=50):
+        serial = Calculator.evaluate_many('divide', a_values, b_values, record=False)
+    parallel = Calculator.evaluate_many('divide', a_values, b_values, pool=pool)
+    assert parallel.results.tolist() == serial.results.tolist()
+    assert parallel.errors.tolist() == serial.errors.tolist()
+
+def test_workers_use_pool_context(pool):
+    '''Test the workers divide at the precision the pool was started with, not the default 28'''
+    result = Calculator.evaluate_many('divide', ['1'], ['3'], pool=pool)
+    assert result.results[0] == Decimal('0.' + '3' * 50)
+
+def test_history_merged(pool):
+    '''Test every pair is recorded in Calculations.history in input order'''
+    Calculator.evaluate_many('multiply', [1, 2, 3], [4, 5, 6], pool=pool)
+    assert [calculation.perform() for calculation in Calculations.get_history()] == [4, 10, 18]
+
+def test_own_pool_and_float_rejected():
+    '''Test workers= starts a pool for the call, and parallel mode refuses the float engine'''
+    assert Calculator.evaluate_many('add', ['1', '2'], ['3', '4'], workers=2, record=False).results.tolist() == [4, 6]
+    with pytest.raises(ValueError, match="decimal engine"):
+        Calculator.evaluate_many('add', [1], [1], engine='float', workers=2)
@@ -0,0 +1,88 @@
+# pylint: disable=unnecessary-dunder-call, invalid-name, line-too-long, trailing-whitespace, missing-final-newline
+''' This module tests the operation registry and operations added through it'''
+from decimal import Decimal
+from unittest.mock import patch
+import pandas as pd
+import pytest
+from plugins.calc import CalcCommand
+from plugins.calc.calculator import Calculator, register_operation, unregister_operation, get_operation, operations
+from plugins.calc.calculator.calculations import Calculations
+from plugins.calc.calculator.operations import divide
+from plugins.history import HistoryCommand
+from plugins.history.storage import current_frame, COLUMNS
+import data_store
+
+def power(a: Decimal, b: Decimal) -> Decimal:
+    '''a plugin operation'''
+    return a ** b
+
+@pytest.fixture
+def plugin_operation():
+    '''Registers power as ^ for the test'''
+    yield register_operation('power', '^', power)
+    unregister_operation('power')
+    Calculations.clear_history()
+
+def test_builtin_lookups():
+    '''Test an operation resolves by name, symbol and function alike'''
+    assert get_operation('divide') is get_operation('/') is get_operation(divide)
+    assert [operation.name for operation in operations()][:5] == ['add', 'subtract', 'multiply', 'divide', 'sqrt']
+    assert get_operation('power') is None
+
+def test_plugin_operation(plugin_operation, capsys):
+    '''Test a registered operation works in Calculator, calc and the batch engines'''
+    assert Calculator.calculate('power', Decimal('2'), Decimal('10')) == 1024
+    assert Calculator.evaluate_many('^', ['2', '3'], ['3', '2'], record=False).results.tolist() == [8, 9]
+    with patch('plugins.calc.CalcCommand.save_operation') as mock_save:
+        CalcCommand().execute('power', '2', '3')
+    assert 'Result: 2 power 3 = 8' in capsys.readouterr().out
+    mock_save.assert_called_once_with('add', '2', '^', '3', Decimal('8'))
+
+def test_plugin_symbol_in_history(plugin_operation, monkeypatch):
+    '''Test history add takes the symbol of a registered operation, and only its symbol'''
+    monkeypatch.setattr(data_store, 'hist_df', pd.DataFrame(columns=COLUMNS), raising=False)
+    with patch('plugins.history.HistoryCommand.autosave'), patch('plugins.history.log.error') as mock_log_error:
+        HistoryCommand().execute('add', '2', '^', '3', '8')
+        HistoryCommand().execute('add', '2', 'power', '3', '8')
+    assert current_frame()['operand'].tolist() == ['^']
+    assert mock_log_error.call_args[0][0] == "Error: Invalid sign symbol for 'history add': sign= +, -, *, /, sqrt, ^ "
+
+def test_conflicting_registration(plugin_operation):
+    '''Test a name or symbol already taken by another operation is refused'''
+    with pytest.raises(ValueError, match="already used by the add operation"):
+        register_operation('plus', '+', power)
+    with pytest.raises(ValueError, match="1 or 2 operands"):
+        register_operation('fold', '@', power, arity=3)
+    register_operation('power', '**', power)  # re-registering a name replaces it
+    assert get_operation('^') is None and get_operation('**').name == 'power'
+
+def test_sqrt():
+    '''Test sqrt takes one operand, and negative operands fail in both paths'''
+    assert Calculator.sqrt(Decimal('2.25')) == Decimal('1.5')
+    with pytest.raises(ValueError, match="negative"):
+        Calculator.sqrt(Decimal('-1'))
+    batch = Calculator.evaluate_many('sqrt', ['4', '-4', '9'], record=False)
+    assert batch.results.tolist() == [2, None, 3]
+    assert batch.errors.tolist() == [False, True, False]
+    Calculations.clear_history()
+
+def test_sqrt_command(capsys):
+    '''Test calc sqrt takes exactly one number'''
+    with patch('plugins.calc.CalcCommand.save_operation') as mock_save, patch('logging.error') as mock_log_error:
+        CalcCommand().execute('sqrt', '9')
+        CalcCommand().execute('sqrt', '9', '1')
+    assert 'Result: sqrt 9 = 3' in capsys.readouterr().out
+    mock_save.assert_called_once_with('add', '9', 'sqrt', '', Decimal('3'))
+    mock_log_error.assert_called_once_with("Error: Incorrect number of arguments for calc")
+    Calculations.clear_history()
+
+def test_sqrt_file(tmp_path):
+    '''Test calc file runs one operand rows and reports their own errors'''
+    in_path, out_path = tmp_path / 'in.csv', tmp_path / 'out.csv'
+    in_path.write_text('operation,num1,num2\nsqrt,16,\nsqrt,-1,\n/,1,0\n')
+
+    CalcCommand().execute('file', str(in_path), str(out_path))
+
+    df = pd.read_csv(out_path, dtype=str, keep_default_na=False)
+    assert df['result'].tolist() == ['4', '', '']
+    assert df['error'].tolist() == ['', 'Cannot take the square root of a negative number', 'Cannot divide by zero']
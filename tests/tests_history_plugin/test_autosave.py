@@ -0,0 +1,99 @@
+# pylint: disable=trailing-whitespace, missing-final-newline
+''' Tests the write-behind history autosaver'''
+import os
+import threading
+from unittest.mock import MagicMock, patch
+import pandas as pd
+import pytest
+from plugins.history import HistoryCommand
+from plugins.history.storage import Autosaver, flush_history, COLUMNS
+import data_store
+
+def test_sync_policy_flushes_inline():
+    ''' Tests the sync policy flushes on every mutation'''
+    flush = MagicMock()
+    autosaver = Autosaver(flush, policy='sync', fsync=True)
+    autosaver.notify()
+    autosaver.notify()
+    assert flush.call_count == 2
+    flush.assert_called_with(True)
+
+def test_ops_policy_coalesces():
+    ''' Tests many mutations are coalesced into one background flush'''
+    flushed = threading.Event()
+    flush = MagicMock(side_effect=lambda fsync: flushed.set())
+    autosaver = Autosaver(flush, policy='ops', every_ops=5)
+    for _ in range(5):
+        autosaver.notify()
+
+    assert flushed.wait(2)
+    autosaver.close()
+    assert flush.call_count == 1
+
+def test_interval_policy_flushes_in_background():
+    ''' Tests pending mutations are flushed once the interval passes'''
+    flushed = threading.Event()
+    flush = MagicMock(side_effect=lambda fsync: flushed.set())
+    autosaver = Autosaver(flush, policy='interval', every_ms=10)
+    autosaver.notify()
+    autosaver.notify()
+
+    assert flushed.wait(2)
+    autosaver.close()
+    assert flush.call_count == 1
+
+def test_exit_policy_flushes_on_close():
+    ''' Tests the exit policy only flushes when closed'''
+    flush = MagicMock()
+    autosaver = Autosaver(flush, policy='exit')
+    for _ in range(10):
+        autosaver.notify()
+    flush.assert_not_called()
+
+    autosaver.close()
+    flush.assert_called_once_with(False)
+
+def test_unknown_policy():
+    ''' Tests an unknown policy is rejected'''
+    with pytest.raises(ValueError, match="Unknown autosave policy"):
+        Autosaver(MagicMock(), policy='sometimes')
+
+def test_flush_history_fsync():
+    ''' Tests flushing writes the table and fsyncs when asked'''
+    data_store.hist_df = pd.DataFrame({'num1': [1], 'operand': ['+'], 'num2': [1], 'result': [2]})
+    with patch('plugins.history.storage.loader.os.fsync') as mock_fsync:
+        flush_history(fsync=True)
+        # only the appended rows are written
+        assert mock_fsync.call_count == 1
+    assert len(pd.read_csv(data_store.hist_cold.path)) == 1
+
+def test_sync_save_appends():
+    ''' Tests saving after every mutation appends the new row and leaves the rows already in the file alone'''
+    data_store.hist_df = pd.DataFrame(columns=COLUMNS)
+    path = data_store.hist_cold.path
+    history_command_instance = HistoryCommand()
+    history_command_instance.execute('add', '1', '+', '1', '2')
+    inode = os.stat(path).st_ino
+    with open(path, 'rb') as history_file:
+        before = history_file.read()
+
+    history_command_instance.execute('add', '2', '+', '2', '4')
+    with open(path, 'rb') as history_file:
+        after = history_file.read()
+    assert os.stat(path).st_ino == inode
+    assert after == before + b'2,+,2,4\n'
+
+def test_history_mutations_notify_autosaver(capsys):
+    ''' Tests history mutations hand off to the autosaver instead of saving inline'''
+    data_store.hist_df = pd.DataFrame(columns=COLUMNS)
+    data_store.autosaver = MagicMock()
+    try:
+        with patch('plugins.history.HistoryCommand.save') as mock_save:
+            history_command_instance = HistoryCommand()
+            history_command_instance.execute('add', '1', '+', '1', '2')
+            history_command_instance.execute('dummy')
+
+            mock_save.assert_not_called()
+            assert data_store.autosaver.notify.call_count == 2
+    finally:
+        data_store.autosaver = None
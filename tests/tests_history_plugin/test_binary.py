@@ -0,0 +1,141 @@
+# pylint: disable=trailing-whitespace, missing-final-newline
+''' Tests the memory-mapped binary history format'''
+from unittest.mock import patch
+import pandas as pd
+import pytest
+from app import App
+from plugins.history import HistoryCommand
+from plugins.history.storage import BinaryHistory, convert, read_rows, COLUMNS
+import data_store
+
+ROWS = pd.DataFrame({
+    'num1': ['1', '10'],
+    'operand': ['+', '/'],
+    'num2': ['1', '3'],
+    'result': ['2', '3.333333333333333333333333333']
+})
+
+@pytest.fixture
+def binary_history(tmp_path):
+    ''' Fixture for a binary history file holding two rows'''
+    history = BinaryHistory(str(tmp_path / 'calc_history.bin'))
+    history.append_frame(ROWS)
+    return history
+
+@pytest.fixture
+def binary_mode(binary_history):
+    ''' Fixture that points the history plugin at the binary file'''
+    data_store.hist_cold = binary_history
+    data_store.hist_df = pd.DataFrame(columns=COLUMNS)
+    return binary_history
+
+def test_rows_round_trip(binary_history):
+    ''' Tests values come back exactly, indexed by row number'''
+    assert len(binary_history) == 2
+    df = binary_history.rows(1, 2)
+    assert df.index.tolist() == [1]
+    assert df.iloc[0].to_dict() == ROWS.iloc[1].to_dict()
+
+def test_reopen_is_memory_mapped(binary_history):
+    ''' Tests a second instance maps the same records without loading them'''
+    reopened = BinaryHistory(binary_history.path)
+    assert len(reopened) == 2
+    assert reopened.to_frame()['result'].tolist() == ROWS['result'].tolist()
+
+def test_partial_record_ignored(binary_history):
+    ''' Tests a record cut short by a crash is not counted'''
+    with open(binary_history.path, 'ab') as records_file:
+        records_file.write(b'\x00' * 5)
+    assert len(BinaryHistory(binary_history.path)) == 2
+
+def test_not_a_binary_file(tmp_path):
+    ''' Tests a csv file is rejected'''
+    path = tmp_path / 'calc_history.csv'
+    ROWS.to_csv(path, index=False)
+    with pytest.raises(ValueError, match="not a binary history file"):
+        BinaryHistory(str(path))
+
+def test_convert_round_trip(binary_history, tmp_path):
+    ''' Tests converting binary -> csv -> binary keeps every row'''
+    csv_path = str(tmp_path / 'copy.csv')
+    bin_path = str(tmp_path / 'copy.bin')
+    assert convert(binary_history.path, csv_path) == 2
+    assert convert(csv_path, bin_path) == 2
+    assert BinaryHistory(bin_path).to_frame().equals(binary_history.to_frame())
+
+def test_convert_missing_source(binary_history, tmp_path):
+    ''' Tests a missing source is reported without creating it or touching the destination'''
+    csv_path = str(tmp_path / 'copy.csv')
+    assert convert(binary_history.path, csv_path) == 2
+    with pytest.raises(FileNotFoundError):
+        convert(str(tmp_path / 'missing.bin'), csv_path)
+    with pytest.raises(FileNotFoundError):
+        convert(str(tmp_path / 'missing.csv'), binary_history.path)
+    assert not list(tmp_path.glob('missing*')) and not list(tmp_path.glob('*.tmp*'))
+    assert len(pd.read_csv(csv_path)) == 2 and len(BinaryHistory(binary_history.path)) == 2
+
+def test_convert_keeps_destination_on_bad_source(binary_history, tmp_path):
+    ''' Tests a source in the wrong format leaves an existing destination intact'''
+    not_binary = tmp_path / 'notes.bin'
+    not_binary.write_text('num1,operand,num2,result\n1,+,1,2\n')
+    bad_csv = tmp_path / 'notes.csv'
+    bad_csv.write_text('a,b\n1,2\n')
+    with pytest.raises(ValueError, match="not a binary history file"):
+        convert(str(not_binary), str(tmp_path / 'copy.csv'))
+    with pytest.raises(ValueError, match="not a csv history file"):
+        convert(str(bad_csv), binary_history.path)
+    assert BinaryHistory(binary_history.path).to_frame().equals(ROWS)
+    assert not (tmp_path / 'copy.csv').exists()
+
+def test_convert_command_missing_source(tmp_path):
+    ''' Tests history convert logs a missing source instead of converting 0 rows'''
+    with patch('plugins.history.log.error') as mock_log_error:
+        assert HistoryCommand().execute('convert', str(tmp_path / 'missing.bin'), str(tmp_path / 'out.csv')) is None
+    assert 'No history file at' in mock_log_error.call_args[0][0]
+    assert not list(tmp_path.iterdir())
+
+def test_save_appends_resident_rows(capsys, binary_mode):
+    ''' Tests add + save only appends the new row to the file'''
+    history_command_instance = HistoryCommand()
+    history_command_instance.execute('add', '5', '*', '4', '20')
+
+    assert len(binary_mode) == 3
+    assert len(data_store.hist_df) == 0
+    history_command_instance.execute('last')
+    assert "20" in capsys.readouterr().out
+
+def test_delete_on_disk_row(capsys, binary_mode):
+    ''' Tests deleting a row that is only on disk'''
+    history_command_instance = HistoryCommand()
+    history_command_instance.execute('delete', '0')
+
+    assert "Row 0 deleted successfully." in capsys.readouterr().out
+    assert read_rows(0, 2)['num1'].tolist() == ['10']
+
+    # the file keeps the row until it is compacted
+    assert len(binary_mode) == 2
+    history_command_instance.execute('compact')
+    assert binary_mode.to_frame()['num1'].tolist() == ['10']
+
+def test_manage_history_binary(tmp_path, binary_history):
+    ''' Tests HIST_FILE_FORMAT=binary maps the file instead of reading it'''
+    with patch('app.App.setup_log'), patch('app.App.setup_env_vars') as mock_setup_env_vars:
+        mock_setup_env_vars.return_value = {'HIST_FILE_FORMAT': 'binary', 'HIST_FILE_PATH': str(tmp_path)}
+        app = App()
+
+    with patch('app.pd.read_csv') as mock_read_csv:
+        history_df = app.manage_history()
+        mock_read_csv.assert_not_called()
+
+    assert len(history_df) == 0
+    assert len(data_store.hist_cold) == 2
+
+def test_new_operand_symbols(tmp_path):
+    ''' Tests symbols outside the built-in four are kept in the file's own operand list'''
+    path = str(tmp_path / 'calc_history.bin')
+    history = BinaryHistory(path)
+    history.append_frame(pd.DataFrame({'num1': ['9', '2'], 'operand': ['sqrt', '+'], 'num2': ['', '2'], 'result': ['3', '4']}))
+
+    reopened = BinaryHistory(path)
+    assert reopened.operands == ['+', '-', '*', '/', 'sqrt']
+    assert reopened.to_frame()['operand'].tolist() == ['sqrt', '+']
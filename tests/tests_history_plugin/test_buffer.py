@@ -0,0 +1,52 @@
+# pylint: disable=trailing-whitespace, missing-final-newline
+''' Tests the columnar history append buffer'''
+import pandas as pd
+from plugins.history.storage import HistoryBuffer, current_frame, COLUMNS
+import data_store
+
+def test_append_grows_capacity():
+    ''' Tests the buffer doubles its arrays instead of growing per row'''
+    buffer = HistoryBuffer(capacity=2)
+    for i in range(5):
+        buffer.append({'num1': i, 'operand': '+', 'num2': 1, 'result': i + 1})
+
+    assert len(buffer) == 5
+    assert buffer.capacity() == 8
+    assert buffer.to_frame()['num1'].tolist() == [0, 1, 2, 3, 4]
+
+def test_operand_stored_as_code():
+    ''' Tests the operand column is a uint8 code that decodes back to the sign'''
+    buffer = HistoryBuffer()
+    buffer.append({'num1': '8', 'operand': '/', 'num2': '2', 'result': '4'})
+
+    assert buffer.operand.dtype == 'uint8'
+    assert buffer.to_frame().iloc[0].to_dict() == {'num1': '8', 'operand': '/', 'num2': '2', 'result': '4'}
+
+def test_fold_into_appends_and_empties():
+    ''' Tests folding keeps existing rows first and empties the buffer'''
+    df = pd.DataFrame({'num1': [1], 'operand': ['+'], 'num2': [1], 'result': [2]})
+    buffer = HistoryBuffer()
+    buffer.append({'num1': 5, 'operand': '*', 'num2': 4, 'result': 20})
+
+    folded = buffer.fold_into(df)
+    assert list(folded.columns) == COLUMNS
+    assert folded['result'].tolist() == [2, 20]
+    assert len(buffer) == 0
+
+def test_current_frame_materializes_lazily():
+    ''' Tests hist_df is only rebuilt when the full table is asked for'''
+    data_store.hist_df = pd.DataFrame(columns=COLUMNS)
+    data_store.hist_buffer.append({'num1': 5, 'operand': '*', 'num2': 4, 'result': 20})
+    assert len(data_store.hist_df) == 0
+
+    assert len(current_frame()) == 1
+    assert len(data_store.hist_buffer) == 0
+
+def test_extend_appends_frame():
+    ''' Tests a whole dataframe goes into the buffer in one step, growing it as needed'''
+    buffer = HistoryBuffer(capacity=2)
+    buffer.append({'num1': '1', 'operand': '+', 'num2': '1', 'result': '2'})
+    buffer.extend(pd.DataFrame({'num1': ['2', '3'], 'operand': ['*', '-'], 'num2': ['2', '1'], 'result': ['4', '2']}))
+
+    assert len(buffer) == 3
+    assert buffer.to_frame()['operand'].tolist() == ['+', '*', '-']
\ No newline at end of file
@@ -0,0 +1,80 @@
+# pylint: disable=trailing-whitespace, missing-final-newline
+''' Tests the streaming csv history loader'''
+from unittest.mock import patch
+import pandas as pd
+import pytest
+from app import App
+from plugins.history.storage import ChunkedCSV, COLUMNS
+import data_store
+
+@pytest.fixture
+def csv_path(tmp_path):
+    ''' Fixture for a csv history file with ten rows'''
+    path = tmp_path / 'calc_history.csv'
+    pd.DataFrame({
+        'num1': range(10),
+        'operand': ['+'] * 10,
+        'num2': range(10),
+        'result': range(10)
+    }).to_csv(path, index=False)
+    return str(path)
+
+def test_index_and_window(csv_path):
+    ''' Tests only the recent window is resident and chunk offsets are indexed'''
+    history = ChunkedCSV(csv_path, window=3, chunksize=4)
+
+    assert len(history) == 10
+    assert len(history.offsets) == 3
+    assert history.tail['num1'].tolist() == ['7', '8', '9']
+
+def test_window_rows_read_from_memory(csv_path):
+    ''' Tests reading inside the window does not touch the file'''
+    history = ChunkedCSV(csv_path, window=3, chunksize=4)
+    with patch('plugins.history.storage.loader.pd.read_csv') as mock_read_csv:
+        assert history.rows(8, 10)['num1'].tolist() == ['8', '9']
+        mock_read_csv.assert_not_called()
+
+def test_rows_across_chunks_and_window(csv_path):
+    ''' Tests a range spanning disk chunks and the resident window'''
+    history = ChunkedCSV(csv_path, window=3, chunksize=4)
+    df = history.rows(2, 9)
+
+    assert df.index.tolist() == list(range(2, 9))
+    assert df['num1'].tolist() == [str(i) for i in range(2, 9)]
+
+def test_append_frame(csv_path):
+    ''' Tests appended rows are indexed and the window slides'''
+    history = ChunkedCSV(csv_path, window=3, chunksize=4)
+    history.append_frame(pd.DataFrame({'num1': ['5', '6'], 'operand': ['*', '*'], 'num2': ['4', '4'], 'result': ['20', '24']}))
+
+    assert len(history) == 12
+    assert history.tail.index.tolist() == [9, 10, 11]
+    assert len(ChunkedCSV(csv_path, window=3, chunksize=4).to_frame()) == 12
+
+def test_append_frame_every_row_resident(csv_path):
+    ''' Tests without a window every row stays resident and appended rows show up in it'''
+    history = ChunkedCSV(csv_path, chunksize=4)
+    for number in range(10, 13):
+        history.append_frame(pd.DataFrame({'num1': [str(number)], 'operand': ['+'], 'num2': ['1'], 'result': ['2']}))
+
+    assert len(history) == 13 and history.tail_start == 0
+    assert history.rows(9, 13)['num1'].tolist() == ['9', '10', '11', '12']
+    assert history.tail.index.tolist() == list(range(13))
+
+def test_partial_row_dropped(csv_path):
+    ''' Tests a row cut short by a crash is dropped on open'''
+    with open(csv_path, 'a', encoding='utf-8') as csv_file:
+        csv_file.write('11,+,1')
+    history = ChunkedCSV(csv_path, window=3, chunksize=4)
+    assert len(history) == 10
+
+def test_manage_history_streaming(csv_path, tmp_path):
+    ''' Tests HIST_RESIDENT_ROWS streams the csv instead of reading it in one call'''
+    with patch('app.App.setup_log'), patch('app.App.setup_env_vars') as mock_setup_env_vars:
+        mock_setup_env_vars.return_value = {'HIST_RESIDENT_ROWS': '3', 'HIST_LOAD_CHUNKSIZE': '4', 'HIST_FILE_PATH': str(tmp_path)}
+        app = App()
+
+    history_df = app.manage_history()
+    assert list(history_df.columns) == COLUMNS
+    assert len(data_store.hist_cold) == 10
+    assert len(data_store.hist_cold.tail) == 3
@@ -0,0 +1,112 @@
+# pylint: disable=trailing-whitespace, missing-final-newline
+''' Tests several processes sharing one history file'''
+import contextlib
+import io
+import multiprocessing
+from unittest.mock import patch
+import pandas as pd
+import pytest
+from app import App
+from plugins.calc import CalcCommand
+from plugins.history.storage import ChunkedCSV, BinaryHistory, SQLiteHistory, Tombstones, full_frame, COLUMNS
+import data_store
+
+PROCESSES = 4
+OPS = 100
+
+def make_rows(values):
+    ''' Builds history rows with the given num1 values'''
+    values = [str(value) for value in values]
+    return pd.DataFrame({'num1': values, 'operand': ['+'] * len(values), 'num2': values, 'result': values})
+
+def open_app(folder, file_format):
+    ''' Builds an App in shared mode and opens the history the way start() does'''
+    with patch('app.App.setup_log'), patch('app.App.setup_env_vars') as mock_setup_env_vars:
+        mock_setup_env_vars.return_value = {'HIST_SHARED': 'on', 'HIST_FILE_FORMAT': file_format,
+                                            'HIST_FILE_PATH': folder}
+        app = App()
+    data_store.hist_df = app.manage_history()
+    data_store.hist_buffer.clear()
+    return app
+
+def run_calculations(folder, file_format, worker):
+    ''' One process: OPS calc commands against the shared file'''
+    app = open_app(folder, file_format)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(OPS):
+            CalcCommand().execute('add', str(worker), str(i))
+    app.close_history()
+
+def test_refresh_reads_only_new_rows(tmp_path):
+    ''' Tests a csv reader picks up another writer's appends from its last offset'''
+    path = str(tmp_path / 'calc_history.csv')
+    writer = ChunkedCSV(path, window=3, chunksize=4)
+    reader = ChunkedCSV(path, window=3, chunksize=4)
+    writer.append_frame(make_rows(range(5)))
+
+    end = reader.end
+    with patch.object(ChunkedCSV, 'open') as mock_open:
+        reader.refresh()
+        mock_open.assert_not_called()
+    assert reader.end > end
+    assert len(reader) == 5
+    assert reader.tail['num1'].tolist() == ['2', '3', '4']
+    assert reader.rows(0, 5)['num1'].tolist() == ['0', '1', '2', '3', '4']
+
+def test_refresh_after_rewrite(tmp_path):
+    ''' Tests a reader starts over when another process compacted the file'''
+    path = str(tmp_path / 'calc_history.csv')
+    writer = ChunkedCSV(path)
+    reader = ChunkedCSV(path)
+    writer.append_frame(make_rows(range(5)))
+    reader.refresh()
+    writer.rewrite([make_rows([7])])
+
+    reader.refresh()
+    assert reader.to_frame()['num1'].tolist() == ['7']
+
+def test_tombstones_refresh(tmp_path):
+    ''' Tests deletes from another process are read from the sidecar offset, and clears start over'''
+    path = str(tmp_path / 'calc_history.csv.deleted')
+    mine, theirs = Tombstones(path), Tombstones(path)
+    theirs.mark(3)
+    mine.refresh()
+    assert mine.rows().tolist() == [3]
+
+    theirs.clear()
+    theirs.mark(1)
+    mine.refresh()
+    assert mine.rows().tolist() == [1]
+
+@pytest.mark.parametrize('engine', [BinaryHistory, SQLiteHistory])
+def test_interleaved_appends(tmp_path, engine):
+    ''' Tests two handles appending in turn never reuse a row number'''
+    path = str(tmp_path / 'calc_history.dat')
+    first, second = engine(path), engine(path)
+    first.append_frame(make_rows([1]))
+    second.append_frame(make_rows([2]))
+    first.append_frame(make_rows([3]))
+
+    second.refresh()
+    assert second.to_frame()['num1'].tolist() == ['1', '2', '3']
+    first.close()
+    second.close()
+
+@pytest.mark.parametrize('file_format', ['csv', 'binary', 'sqlite'])
+def test_processes_lose_no_rows(tmp_path, file_format):
+    ''' Stress test: PROCESSES apps doing OPS calc commands each on the same file'''
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=run_calculations, args=(str(tmp_path), file_format, worker))
+               for worker in range(PROCESSES)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+
+    open_app(str(tmp_path), file_format)
+    df = full_frame()
+    assert list(df.columns) == COLUMNS
+    assert len(df) == PROCESSES * OPS
+    assert set(zip(df['num1'], df['num2'])) == {(str(w), str(i)) for w in range(PROCESSES) for i in range(OPS)}
+    data_store.hist_cold.close()
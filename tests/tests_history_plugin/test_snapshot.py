@@ -0,0 +1,108 @@
+# pylint: disable=trailing-whitespace, missing-final-newline
+''' Tests crash-safe history snapshots and recovery'''
+import os
+import zlib
+from unittest.mock import patch
+import pandas as pd
+import pytest
+from app import App
+from plugins.history.storage import ChunkedCSV, write_snapshot, read_manifest, recover_snapshot, COLUMNS
+from plugins.history.storage import snapshot
+import data_store
+
+ROWS = 500
+
+@pytest.fixture
+def small_segments(monkeypatch):
+    ''' Fixture for 256 byte checksum segments, so a small file has many'''
+    monkeypatch.setattr(snapshot, 'SEGMENT_BYTES', 256)
+
+@pytest.fixture
+def snapshot_path(tmp_path, small_segments):
+    ''' Fixture for a checksummed snapshot of ROWS rows'''
+    path = str(tmp_path / 'calc_history.csv')
+    values = [str(i) for i in range(ROWS)]
+    write_snapshot(pd.DataFrame({'num1': values, 'operand': ['+'] * ROWS, 'num2': values, 'result': values}), path)
+    return path
+
+def test_failed_write_keeps_old_snapshot(snapshot_path):
+    ''' Tests a crash mid-write leaves the previous snapshot and manifest in place'''
+    with patch.object(pd.DataFrame, 'to_csv', side_effect=OSError('disk full')):
+        with pytest.raises(OSError):
+            write_snapshot(pd.DataFrame(columns=COLUMNS), snapshot_path)
+
+    assert len(pd.read_csv(snapshot_path)) == ROWS
+    assert read_manifest(snapshot_path) is not None
+    assert recover_snapshot(snapshot_path) == 0
+
+def test_manifest(snapshot_path):
+    ''' Tests the manifest checksums every segment of the renamed file'''
+    manifest = read_manifest(snapshot_path)
+    assert manifest['size'] == os.path.getsize(snapshot_path)
+    assert len(manifest['crcs']) == -(-manifest['size'] // 256)
+    with open(snapshot_path, 'rb') as snapshot_file:
+        assert zlib.crc32(snapshot_file.read(256)) == manifest['crcs'][0]
+
+def test_manifest_of_other_file_ignored(snapshot_path):
+    ''' Tests a manifest is only trusted for the file it was written for'''
+    os.replace(snapshot_path, snapshot_path + '.moved')
+    pd.DataFrame(columns=COLUMNS).to_csv(snapshot_path, index=False)
+    assert read_manifest(snapshot_path) is None
+
+def test_truncated_tail_recovered(snapshot_path):
+    ''' Tests a tail cut off mid-row is recovered up to the last whole row, checking only the tail'''
+    size = os.path.getsize(snapshot_path)
+    os.truncate(snapshot_path, size - 1000)
+
+    with patch('plugins.history.storage.snapshot.zlib.crc32', wraps=zlib.crc32) as mock_crc32:
+        damaged = recover_snapshot(snapshot_path)
+        # one segment checked, then the shortened last segment checksummed again
+        assert mock_crc32.call_count == 2
+
+    df = pd.read_csv(snapshot_path, dtype=str)
+    assert damaged == os.path.getsize(snapshot_path + '.damaged') < 20  # only the row cut in half
+    assert df['num1'].tolist() == [str(i) for i in range(len(df))]
+    assert os.path.getsize(snapshot_path) == size - 1000 - damaged
+    assert recover_snapshot(snapshot_path) == 0
+
+def test_corrupted_segment_cut_off(snapshot_path):
+    ''' Tests a corrupted byte in the last segment drops that segment'''
+    size = os.path.getsize(snapshot_path)
+    with open(snapshot_path, 'r+b') as snapshot_file:
+        snapshot_file.seek(size - 2)
+        snapshot_file.write(b'#')
+
+    assert recover_snapshot(snapshot_path) > 0
+    assert os.path.getsize(snapshot_path) <= size - 2
+    assert pd.read_csv(snapshot_path)['num1'].notna().all()
+
+def test_manage_history_recovers(snapshot_path, tmp_path):
+    ''' Tests startup keeps the intact rows of a damaged snapshot instead of starting empty'''
+    os.truncate(snapshot_path, os.path.getsize(snapshot_path) - 5)
+    with patch('app.App.setup_log'), patch('app.App.setup_env_vars') as mock_setup_env_vars:
+        mock_setup_env_vars.return_value = {'HIST_FILE_PATH': str(tmp_path)}
+        app = App()
+
+    app.manage_history()
+    history_df = data_store.hist_cold.to_frame()
+    # only the row the truncation cut in half is dropped
+    assert len(history_df) == ROWS - 1
+    assert history_df['num1'].tolist() == [str(i) for i in range(len(history_df))]
+    assert os.path.exists(snapshot_path + '.damaged')
+    assert data_store.hist_path == snapshot_path
+
+def test_compaction_writes_a_snapshot(tmp_path, small_segments):
+    ''' Tests rewriting and truncating the csv history leave a checksummed, fsynced snapshot'''
+    history = ChunkedCSV(str(tmp_path / 'calc_history.csv'))
+    history.append_frame(pd.DataFrame({'num1': ['1'] * 100, 'operand': ['+'] * 100, 'num2': ['1'] * 100, 'result': ['2'] * 100}))
+    history.fsync = True
+    with patch('plugins.history.storage.snapshot.os.fsync', wraps=os.fsync) as mock_fsync:
+        history.rewrite(history.iter_chunks())
+        # the csv, the manifest and the folder
+        assert mock_fsync.call_count == 3
+    assert read_manifest(history.path)['size'] == os.path.getsize(history.path)
+
+    os.truncate(history.path, os.path.getsize(history.path) - 3)
+    assert len(ChunkedCSV(history.path)) == 99
+    history.truncate()
+    assert read_manifest(history.path)['size'] == os.path.getsize(history.path)
@@ -0,0 +1,116 @@
+# pylint: disable=trailing-whitespace, missing-final-newline
+''' Tests the sqlite history engine'''
+import sqlite3
+from unittest.mock import patch
+import pandas as pd
+import pytest
+from app import App
+from plugins.history import HistoryCommand
+from plugins.history.storage import SQLiteHistory, HistoryEngine, convert, read_rows, COLUMNS
+import data_store
+
+ROWS = pd.DataFrame({
+    'num1': ['1', '10', '7'],
+    'operand': ['+', '/', '-'],
+    'num2': ['1', '3', '2'],
+    'result': ['2', '3.333333333333333333333333333', '5']
+})
+
+@pytest.fixture
+def sqlite_history(tmp_path):
+    ''' Fixture for a sqlite history file holding three rows'''
+    history = SQLiteHistory(str(tmp_path / 'calc_history.db'))
+    history.append_frame(ROWS)
+    yield history
+    history.close()
+
+@pytest.fixture
+def sqlite_mode(sqlite_history):
+    ''' Fixture that points the history plugin at the sqlite file'''
+    data_store.hist_cold = sqlite_history
+    data_store.hist_df = pd.DataFrame(columns=COLUMNS)
+    return sqlite_history
+
+def test_is_an_engine(sqlite_history):
+    ''' Tests the engine implements the storage interface'''
+    assert isinstance(sqlite_history, HistoryEngine)
+
+def test_rows_round_trip(sqlite_history):
+    ''' Tests values come back exactly, indexed by row number'''
+    assert len(sqlite_history) == 3
+    df = sqlite_history.rows(1, 2)
+    assert df.index.tolist() == [1]
+    assert df.iloc[0].to_dict() == ROWS.iloc[1].to_dict()
+
+def test_wal_and_indexes(sqlite_history):
+    ''' Tests the database runs in WAL mode with indexes on operand and result'''
+    connection = sqlite_history.connection
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    indexes = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'history_operand', 'history_result'} <= indexes
+
+def test_point_lookup_uses_primary_key(sqlite_history):
+    ''' Tests a row lookup is a primary key search, not a table scan'''
+    plan = sqlite_history.connection.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM history WHERE row >= ? AND row < ?", (1, 2)).fetchall()
+    assert 'SEARCH' in plan[0][-1]
+
+def test_failed_append_rolls_back(sqlite_history):
+    ''' Tests a batch that fails part way leaves no rows behind'''
+    # the second record reuses the first one's row number
+    duplicate = [(3, '1', '+', '1', '2'), (3, '1', '+', '1', '2')]
+    with patch.object(SQLiteHistory, '_records', return_value=duplicate):
+        with pytest.raises(sqlite3.IntegrityError):
+            sqlite_history.append_frame(ROWS.iloc[:2])
+    sqlite_history.open()
+    assert len(sqlite_history) == 3
+
+def test_reopen_and_rewrite(sqlite_history):
+    ''' Tests rows persist across connections and rewrite renumbers them'''
+    sqlite_history.close()
+    reopened = SQLiteHistory(sqlite_history.path)
+    assert reopened.to_frame()['result'].tolist() == ROWS['result'].tolist()
+
+    reopened.rewrite([ROWS.iloc[[0, 2]]])
+    assert len(reopened) == 2
+    assert reopened.rows(1, 2)['num1'].tolist() == ['7']
+    reopened.close()
+
+def test_convert_round_trip(sqlite_history, tmp_path):
+    ''' Tests converting sqlite -> csv -> binary -> sqlite keeps every row'''
+    csv_path = str(tmp_path / 'copy.csv')
+    bin_path = str(tmp_path / 'copy.bin')
+    db_path = str(tmp_path / 'copy.db')
+    assert convert(sqlite_history.path, csv_path) == 3
+    assert convert(csv_path, bin_path) == 3
+    assert convert(bin_path, db_path) == 3
+
+    copy = SQLiteHistory(db_path)
+    assert copy.to_frame().equals(sqlite_history.to_frame())
+    copy.close()
+
+def test_history_commands(capsys, sqlite_mode):
+    ''' Tests add, last, delete and compact against the sqlite file'''
+    history_command_instance = HistoryCommand()
+    history_command_instance.execute('add', '5', '*', '4', '20')
+    assert len(sqlite_mode) == 4
+
+    history_command_instance.execute('delete', '1')
+    history_command_instance.execute('last')
+    assert "20" in capsys.readouterr().out
+    assert read_rows(0, 4)['num1'].tolist() == ['1', '7', '5']
+
+    history_command_instance.execute('compact')
+    assert sqlite_mode.to_frame()['num1'].tolist() == ['1', '7', '5']
+
+def test_manage_history_sqlite(tmp_path, sqlite_history):
+    ''' Tests HIST_FILE_FORMAT=sqlite opens calc_history.db without reading it'''
+    with patch('app.App.setup_log'), patch('app.App.setup_env_vars') as mock_setup_env_vars:
+        mock_setup_env_vars.return_value = {'HIST_FILE_FORMAT': 'sqlite', 'HIST_FILE_PATH': str(tmp_path)}
+        app = App()
+
+    history_df = app.manage_history()
+    assert len(history_df) == 0
+    assert isinstance(data_store.hist_cold, SQLiteHistory)
+    assert len(data_store.hist_cold) == 3
+    data_store.hist_cold.close()
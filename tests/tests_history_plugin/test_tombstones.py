@@ -0,0 +1,101 @@
+# pylint: disable=trailing-whitespace, missing-final-newline
+''' Tests tombstoned history deletes and compaction'''
+import pandas as pd
+import pytest
+from plugins.history import HistoryCommand
+from plugins.history.storage import (Tombstones, ChunkedCSV, COLUMNS, read_rows, row_count,
+                                     live_count, last_row, delete_row, compact_rows)
+import data_store
+
+def make_rows(count, start=0):
+    ''' Builds count history rows numbered from start'''
+    values = [str(i) for i in range(start, start + count)]
+    return pd.DataFrame({'num1': values, 'operand': ['+'] * count, 'num2': values, 'result': values})
+
+@pytest.fixture
+def resident_rows():
+    ''' Fixture for a resident table of ten rows'''
+    data_store.hist_df = make_rows(10)
+    return data_store.hist_df
+
+def test_mark_and_lookup():
+    ''' Tests marking rows and the vectorized lookup'''
+    tombstones = Tombstones()
+    assert tombstones.mark(3)
+    assert not tombstones.mark(3)
+    assert tombstones.mark(5000)
+
+    assert len(tombstones) == 2
+    assert tombstones.deleted([2, 3, 5000, 99999]).tolist() == [False, True, True, False]
+    assert tombstones.rows().tolist() == [3, 5000]
+    assert tombstones.last_live(5001) == 4999
+
+def test_sidecar_reload(tmp_path):
+    ''' Tests deletes written to the sidecar survive a reload and clear empties it'''
+    path = str(tmp_path / 'calc_history.bin.deleted')
+    Tombstones(path).mark(7)
+    reloaded = Tombstones(path)
+    assert reloaded.is_deleted(7)
+
+    reloaded.clear()
+    assert len(Tombstones(path)) == 0
+
+def test_delete_never_compacts(resident_rows):
+    ''' Tests deleting most of the table still leaves every row number where it was'''
+    for row in range(9):
+        HistoryCommand().execute('delete', str(row))
+    assert row_count() == 10 and live_count() == 1
+    assert read_rows(9, 10)['num1'].tolist() == ['9']
+
+def test_delete_keeps_row_numbers(resident_rows):
+    ''' Tests a delete hides the row without renumbering the rows after it'''
+    delete_row(2)
+
+    assert row_count() == 10
+    assert live_count() == 9
+    assert read_rows(0, 4).index.tolist() == [0, 1, 3]
+    assert read_rows(3, 4)['num1'].tolist() == ['3']
+    with pytest.raises(KeyError):
+        delete_row(2)
+
+def test_last_skips_deleted(capsys, resident_rows):
+    ''' Tests history last shows the last live row'''
+    delete_row(9)
+    HistoryCommand().execute('last')
+    assert last_row() == 8
+    assert "8" in capsys.readouterr().out
+
+def test_compact_resident(resident_rows):
+    ''' Tests compaction removes deleted rows and renumbers the rest'''
+    delete_row(0)
+    delete_row(5)
+
+    assert compact_rows() == 2
+    assert len(data_store.hist_tombstones) == 0
+    assert data_store.hist_df.index.tolist() == list(range(8))
+    assert data_store.hist_df['num1'].tolist() == ['1', '2', '3', '4', '6', '7', '8', '9']
+
+def test_compact_streamed_csv(tmp_path):
+    ''' Tests compaction rewrites an on-disk csv a chunk at a time'''
+    path = str(tmp_path / 'calc_history.csv')
+    make_rows(10).to_csv(path, index=False)
+    data_store.hist_cold = ChunkedCSV(path, window=3, chunksize=4)
+    data_store.hist_df = make_rows(2, start=10)
+    data_store.hist_tombstones = Tombstones(path + '.deleted')
+
+    for row in [1, 8, 11]:
+        delete_row(row)
+    assert Tombstones(path + '.deleted').rows().tolist() == [1, 8, 11]
+
+    compact_rows()
+    assert len(data_store.hist_cold) == 8
+    assert pd.read_csv(path, dtype=str)['num1'].tolist() == ['0', '2', '3', '4', '5', '6', '7', '9']
+    assert data_store.hist_df['num1'].tolist() == ['10']
+    assert len(Tombstones(path + '.deleted')) == 0
+
+def test_compact_command(capsys, resident_rows):
+    ''' Tests history compact reports how many rows were removed'''
+    delete_row(1)
+    HistoryCommand().execute('compact')
+    assert "1 deleted rows removed" in capsys.readouterr().out
+    assert list(data_store.hist_df.columns) == COLUMNS